@@ -0,0 +1,300 @@
+"""Streaming export and import of history entries and password batches
+
+Three formats, all read and written a batch at a time with large buffers,
+so files of any size pass through in constant memory:
+
+* ``csv`` -- a header row, then password,timestamp,length,strength,label
+  (or just password, for generated batches). Text cells that a spreadsheet
+  would run as a formula (starting with = + - @, tab or carriage return)
+  are written with a leading ', as are cells already starting with one;
+  reading strips that one quote again;
+* ``ndjson`` -- one JSON object per line, as in the history file;
+* ``binary`` -- MAGIC, then one record per entry: a 5-byte header
+  (password bytes as u16, timestamp bytes as u8, label bytes as u8,
+  strength as u8, 0 when unknown) followed by those three UTF-8 strings.
+
+Records are dicts with the history's keys; a batch of generated passwords
+is exported as records holding just 'password'. Imported records are not
+trusted: validate_records() checks every field, drops the file's length
+and strength, and re-scores the batch in one score_many() pass.
+"""
+import csv
+import io
+import json
+import struct
+from datetime import datetime
+from functools import partial
+from itertools import islice
+
+from strength import score_many
+
+FORMATS = ('csv', 'ndjson', 'binary')
+# Formats guessed from file extensions when none is given
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.json': 'ndjson',
+    '.pwb': 'binary',
+    '.bin': 'binary',
+}
+
+FIELDS = ('password', 'timestamp', 'length', 'strength', 'label')
+# Columns of a batch of generated passwords, which have nothing else
+PASSWORD_FIELDS = ('password',)
+
+# First characters that make a spreadsheet treat a cell as a formula, plus
+# the escaping quote itself so that unescaping is unambiguous
+CSV_ESCAPED = ('=', '+', '-', '@', '\t', '\r', "'")
+
+MAGIC = b'PWB\x01'
+HEADER = struct.Struct('<HBBB')
+MAX_PASSWORD_BYTES = 0xFFFF
+MAX_FIELD_BYTES = 0xFF
+
+# Records per batch, and bytes per read or write of the underlying file
+BATCH_SIZE = 4096
+BUFFER_SIZE = 1 << 20
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# One encoder for every record; json.dumps() with options builds a new one per call
+_JSON_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+
+class ArchiveError(ValueError):
+    """Raised for a file that cannot be read or written in the requested format"""
+
+
+def format_for_path(path, default=None):
+    """Format implied by a file name's extension, or `default`"""
+    for extension, fmt in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return fmt
+    return default
+
+
+def password_records(batches):
+    """Turn batches of generated passwords into batches of records"""
+    for batch in batches:
+        yield [{'password': password} for password in batch]
+
+
+def _csv_cell(value):
+    """A value as a CSV cell that no spreadsheet will evaluate"""
+    if isinstance(value, str) and value.startswith(CSV_ESCAPED):
+        return "'" + value
+    return value
+
+
+def _csv_value(cell):
+    """Undo _csv_cell()"""
+    return cell[1:] if cell.startswith("'") else cell
+
+
+def _encode_csv(records, fields=FIELDS):
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator='\n')
+    writer.writerows([_csv_cell(record.get(field, '')) for field in fields] for record in records)
+    return text.getvalue().encode('utf-8')
+
+
+def _encode_ndjson(records):
+    encode = _JSON_ENCODER.encode
+    return ''.join([encode(record) + '\n' for record in records]).encode('utf-8')
+
+
+def _encode_binary(records):
+    parts = []
+    for record in records:
+        password = record['password'].encode('utf-8')
+        timestamp = record.get('timestamp', '').encode('utf-8')
+        label = record.get('label', '').encode('utf-8')
+        if (len(password) > MAX_PASSWORD_BYTES or len(timestamp) > MAX_FIELD_BYTES
+                or len(label) > MAX_FIELD_BYTES):
+            raise ArchiveError("Record too large for the binary format")
+        parts += [HEADER.pack(len(password), len(timestamp), len(label),
+                              record.get('strength') or 0),
+                  password, timestamp, label]
+    return b''.join(parts)
+
+
+_ENCODERS = {'csv': _encode_csv, 'ndjson': _encode_ndjson, 'binary': _encode_binary}
+
+
+def write_records(batches, stream, fmt, fields=FIELDS):
+    """Write batches of records to a binary stream; returns how many were written
+
+    Each batch is encoded in memory and written with a single call.
+    `fields` are the CSV columns; the other formats write what each record has.
+    """
+    if fmt not in _ENCODERS:
+        raise ArchiveError(f"Unknown format: {fmt}")
+    encode = _ENCODERS[fmt]
+    if fmt == 'csv':
+        encode = partial(_encode_csv, fields=fields)
+        stream.write((','.join(fields) + '\n').encode('utf-8'))
+    elif fmt == 'binary':
+        stream.write(MAGIC)
+    written = 0
+    for batch in batches:
+        if batch:
+            stream.write(encode(batch))
+            written += len(batch)
+    return written
+
+
+def _read_csv(stream, batch_size):
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    try:
+        rows = csv.reader(text)
+        header = next(rows, None)
+        if header is None:
+            return
+        if 'password' not in header:
+            raise ArchiveError("CSV header has no 'password' column")
+        while True:
+            batch = [{field: _csv_value(value) for field, value in zip(header, row) if value != ''}
+                     for row in islice(rows, batch_size)]
+            if not batch:
+                return
+            yield batch
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ArchiveError(f"Malformed CSV: {e}") from e
+    finally:
+        # Leave the underlying stream open for the caller
+        text.detach()
+
+
+def _read_ndjson(stream, batch_size):
+    lines = (line for line in stream if line.strip())
+    while True:
+        chunk = list(islice(lines, batch_size))
+        if not chunk:
+            return
+        batch = []
+        for line in chunk:
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                # Reported as an invalid record rather than ending the import
+                batch.append(None)
+        yield batch
+
+
+def _read_binary(stream, batch_size):
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ArchiveError("Not a binary password file")
+    size = HEADER.size
+    data = b''
+    offset = 0
+    batch = []
+    while True:
+        block = stream.read(BUFFER_SIZE)
+        if not block:
+            break
+        # Carry over the start of a record split between two reads
+        data = data[offset:] + block
+        offset = 0
+        end = len(data)
+        while offset + size <= end:
+            password_size, timestamp_size, label_size, strength = HEADER.unpack_from(data, offset)
+            start = offset + size
+            stop = start + password_size + timestamp_size + label_size
+            if stop > end:
+                break
+            try:
+                record = {'password': data[start:start + password_size].decode('utf-8')}
+                start += password_size
+                if timestamp_size:
+                    record['timestamp'] = data[start:start + timestamp_size].decode('utf-8')
+                start += timestamp_size
+                if label_size:
+                    record['label'] = data[start:stop].decode('utf-8')
+            except UnicodeDecodeError:
+                # Reported as an invalid record, like a malformed NDJSON line
+                record = None
+            else:
+                if strength:
+                    record['strength'] = strength
+            batch.append(record)
+            offset = stop
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if offset < len(data):
+        raise ArchiveError("Binary password file ends in a truncated record")
+    if batch:
+        yield batch
+
+
+_READERS = {'csv': _read_csv, 'ndjson': _read_ndjson, 'binary': _read_binary}
+
+
+def read_records(stream, fmt, batch_size=BATCH_SIZE):
+    """Yield batches of raw records from a binary stream
+
+    Malformed NDJSON lines and binary records that are not valid UTF-8 come
+    through as None, for validate_records() to count; structural damage (bad header, truncation) raises ArchiveError.
+    """
+    if fmt not in _READERS:
+        raise ArchiveError(f"Unknown format: {fmt}")
+    return _READERS[fmt](stream, batch_size)
+
+
+def _check_record(record, default_timestamp, label):
+    """Validated copy of one record (without length and strength), or an error message"""
+    if record is None:
+        return "malformed record (invalid JSON or UTF-8)"
+    if not isinstance(record, dict):
+        return "not an object"
+    password = record.get('password')
+    if not isinstance(password, str) or not password:
+        return "missing password"
+    if '\n' in password or '\r' in password:
+        return "password contains a line break"
+    if len(password.encode('utf-8')) > MAX_PASSWORD_BYTES:
+        return "password too long"
+    entry = {'password': password}
+
+    timestamp = record.get('timestamp') or default_timestamp
+    if not isinstance(timestamp, str):
+        return "timestamp is not a string"
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return f"invalid timestamp {timestamp!r}"
+    if len(timestamp) != 19 or timestamp[10] != ' ':
+        timestamp = parsed.strftime(TIMESTAMP_FORMAT)
+    entry['timestamp'] = timestamp
+
+    label = record.get('label') or label
+    if label:
+        if not isinstance(label, str) or len(label.encode('utf-8')) > MAX_FIELD_BYTES:
+            return "label is not a string of at most 255 bytes"
+        entry['label'] = label
+    return entry
+
+
+def validate_records(records, first_number=1, label=None, timestamp=None):
+    """Check a batch of imported records and re-score them together
+
+    Returns (entries, errors): entries ready for HistoryStore.append_many(),
+    with length and strength recomputed, and (record number, message) for
+    each record that was dropped. `label` fills in records without one;
+    `timestamp` (default: now) those without a time.
+    """
+    if timestamp is None:
+        timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+    entries = []
+    errors = []
+    for number, record in enumerate(records, first_number):
+        entry = _check_record(record, timestamp, label)
+        if isinstance(entry, str):
+            errors.append((number, entry))
+        else:
+            entries.append(entry)
+    for entry, result in zip(entries, score_many([entry['password'] for entry in entries])):
+        entry['length'] = result.length
+        entry['strength'] = result.score
+    return entries, errors
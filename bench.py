@@ -0,0 +1,507 @@
+"""Headless benchmarks for generation, scoring and history I/O
+
+Every benchmark produces one Measurement: a value, its unit and whether
+higher is better. A run is a flat mapping of benchmark names to
+measurements, written as JSON, so a run saved from one release can serve
+as the baseline for the next; compare() flags every benchmark that got
+worse by more than a threshold.
+
+Rates are the best of several timed rounds, which filters out noise from
+other processes. Latencies are the median of many single calls.
+
+The quality suite runs the statistical checks from quality.py on large
+samples, so a speed-up that skews the output shows up in the same run.
+Its p-values are not compared with the baseline (they are random by
+nature); any below QUALITY_ALPHA is reported by quality_failures().
+
+The memory suite traces allocations with tracemalloc while a bulk run
+writes its passwords to the null device, once through str batches and once
+through secure.py's SecretBuffer, and reports each path's peak in KiB.
+
+The startup suite imports each entry module in a fresh interpreter with
+`-X importtime`. Besides the usual baseline comparison, those results are
+held to the fixed limits in STARTUP_BUDGETS; see budget_failures().
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+from functools import partial
+from itertools import islice
+
+from generator import DEFAULT_BATCH_SIZE, NATURAL_SYLLABLE_TEMPLATES, PasswordGenerator
+from history import HistoryStore
+from passphrase import PassphraseGenerator
+from policy import policy_for_options
+from pool import PasswordPool
+from quality import DEFAULT_ALPHA, DEFAULT_SAMPLE_CHARS, check_generator
+from secure import SecretBuffer
+from strength import score_many, score_password
+from vault import HistoryCipher
+
+# Password lengths benchmarked for every option set
+LENGTHS = (4, 8, 12, 16, 24, 32, 64, 128)
+
+# Option sets benchmarked at every length, by name
+OPTION_SETS = {
+    'all': {},
+    'alnum': {'symbols': False},
+    'letters': {'numbers': False, 'symbols': False},
+    'digits': {'lowercase': False, 'uppercase': False, 'symbols': False},
+    'no-ambiguous': {'exclude_ambiguous': True},
+    'pronounceable': {'pronounceable': True},
+}
+
+# History sizes for the save/load benchmarks
+HISTORY_SIZES = (10, 1000, 100000)
+# Entries shown per page in the GUI
+HISTORY_PAGE_SIZE = 50
+
+# Passwords per generate_batch() call in the throughput benchmarks
+BATCH_SIZE = 1000
+# Each timed round runs for at least this long; the best of ROUNDS is kept
+MIN_TIME = 0.2
+ROUNDS = 3
+# Single calls timed for each latency benchmark, unless they take longer
+# than LATENCY_MAX_TIME in total (at least LATENCY_MIN_CALLS are always made)
+LATENCY_CALLS = 200
+LATENCY_MIN_CALLS = 5
+LATENCY_MAX_TIME = 2.0
+
+# Relative slowdown reported as a regression by default; sub-millisecond
+# latencies vary by about 10% between runs on an idle machine
+DEFAULT_THRESHOLD = 0.15
+
+# Statistical checks: sources sampled, characters per sample in a quick
+# run, and the p-value below which a check fails
+QUALITY_SOURCES = {
+    'all.len16': lambda: PasswordGenerator(length=16),
+    'digits.len8': lambda: PasswordGenerator(length=8, lowercase=False, uppercase=False,
+                                             symbols=False),
+    'no-ambiguous.len12': lambda: PasswordGenerator(length=12, exclude_ambiguous=True),
+    'pronounceable.len16': lambda: PasswordGenerator(length=16, pronounceable=True),
+    'pronounceable-natural.len16': lambda: PasswordGenerator(
+        length=16, pronounceable=True, syllable_templates=NATURAL_SYLLABLE_TEMPLATES),
+    'gui-policy.len16': lambda: policy_for_options(length=16),
+}
+QUICK_QUALITY_CHARS = 1000000
+QUALITY_ALPHA = DEFAULT_ALPHA
+
+# Passwords written per memory-suite run, in batches the size of the CLI's
+MEMORY_COUNT = 100000
+MEMORY_BATCH_SIZE = DEFAULT_BATCH_SIZE
+
+# Entry modules timed by the startup suite; headless ones must not load Tk
+STARTUP_MODULES = {
+    'main': True,
+    'generator': True,
+    'cli': True,
+    'gui': False,
+}
+# Fresh interpreters started per module; the median import time is kept
+STARTUP_RUNS = 7
+# Upper limits for startup results: milliseconds to import, and Tk modules
+# loaded by a headless entry point
+STARTUP_BUDGETS = {
+    'startup.main.import': 5,
+    'startup.generator.import': 25,
+    'startup.cli.import': 60,
+    'startup.gui.import': 100,
+    'startup.main.tk_modules': 0,
+    'startup.generator.tk_modules': 0,
+    'startup.cli.tk_modules': 0,
+}
+# Run in the child after the import: reports which Tk modules it pulled in
+_STARTUP_PROBE = ("import sys; print(' '.join(name for name in sys.modules "
+                  "if name.split('.')[0] in ('tkinter', '_tkinter')))")
+
+BENCH_FORMAT = 1
+
+
+class Measurement(namedtuple('Measurement', 'value unit higher_is_better')):
+    """One benchmark result"""
+
+    __slots__ = ()
+
+    def worse_than(self, baseline, threshold):
+        """Whether this result is more than `threshold` (a fraction) worse than baseline"""
+        if self.higher_is_better:
+            return self.value < baseline.value * (1 - threshold)
+        return self.value > baseline.value * (1 + threshold)
+
+
+def rate(func, items_per_call, min_time=MIN_TIME, rounds=ROUNDS):
+    """Best throughput of `func` in items per second"""
+    func()  # warm caches (tables, lru_caches) before timing
+    best = 0.0
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+        best = max(best, calls * items_per_call / elapsed)
+    return Measurement(best, 'items/s', True)
+
+
+def latency(func, calls=LATENCY_CALLS):
+    """Median time of one call to `func`, in milliseconds"""
+    func()
+    timings = []
+    total = 0.0
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+        total += timings[-1]
+        if total > LATENCY_MAX_TIME and len(timings) >= LATENCY_MIN_CALLS:
+            break
+    timings.sort()
+    return Measurement(timings[len(timings) // 2] * 1000, 'ms', False)
+
+
+def bench_generation(config):
+    """Passwords per second for every option set and length, plus single-call latency
+
+    Like every suite, yields (name, measure) pairs; see run().
+    """
+    for name, options in OPTION_SETS.items():
+        for length in LENGTHS:
+            generator = PasswordGenerator(length=length, **options)
+            yield (f'generate.{name}.len{length}',
+                   lambda: rate(lambda: generator.generate_batch(BATCH_SIZE), BATCH_SIZE,
+                                config['min_time']))
+
+    # What the GUI uses for plain passwords: at least one of every selected class
+    for length in LENGTHS:
+        policy = policy_for_options(length=length)
+        yield (f'generate.gui-policy.len{length}',
+               lambda: rate(lambda: policy.generate_batch(BATCH_SIZE), BATCH_SIZE,
+                            config['min_time']))
+
+    if config.get('wordlist'):
+        passphrases = PassphraseGenerator(config['wordlist'])
+        yield ('generate.passphrase.words6',
+               lambda: rate(lambda: passphrases.generate_batch(BATCH_SIZE), BATCH_SIZE,
+                            config['min_time']))
+
+    # Bytes straight into a reused SecretBuffer, as `generate --secure` does
+    generator = PasswordGenerator(length=16)
+    secret = SecretBuffer()
+    try:
+        yield ('generate.secure.len16',
+               lambda: rate(lambda: generator.generate_lines_into(secret, BATCH_SIZE).release(),
+                            BATCH_SIZE, config['min_time']))
+    finally:
+        secret.close()
+
+    # One password per call, as the Generate button asks for it
+    generator = policy_for_options(length=16)
+    yield 'generate.single.len16', lambda: latency(generator.generate)
+    pool = PasswordPool()
+    try:
+        pool.warm(generator)
+        yield 'generate.pooled.len16', lambda: latency(lambda: pool.take(generator))
+    finally:
+        pool.close()
+
+
+def bench_scoring(config):
+    """Strength scores per second, one at a time and streamed"""
+    passwords = PasswordGenerator(length=16).generate_batch(BATCH_SIZE)
+    passwords += PasswordGenerator(length=12, pronounceable=True).generate_batch(BATCH_SIZE)
+    yield ('score.single',
+           lambda: rate(lambda: list(map(score_password, passwords)), len(passwords),
+                        config['min_time']))
+    yield ('score.many',
+           lambda: rate(lambda: list(score_many(passwords)), len(passwords), config['min_time']))
+
+
+def _history_entries(count):
+    """Realistic history entries for populating a benchmark history"""
+    passwords = policy_for_options(length=16).generate_batch(count)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [{'password': password, 'timestamp': timestamp, 'length': len(password),
+             'strength': number % 5 + 1} for number, password in enumerate(passwords)]
+
+
+def _populate_history(path, entries, cipher):
+    """Write a benchmark history, unless an earlier measure already did"""
+    if not os.path.exists(path):
+        store = HistoryStore(path, retention=None, durable=False, cipher=cipher)
+        try:
+            for start in range(0, len(entries), 10000):
+                store.append_many(entries[start:start + 10000])
+        finally:
+            store.close()
+    return path
+
+
+def _open_history(path, cipher):
+    """Open a history and close it again"""
+    HistoryStore(path, retention=None, cipher=cipher).close()
+
+
+def bench_history(config):
+    """Save and load latency for histories of several sizes, plain and encrypted
+
+    Each history is written when the first of its measures runs, so
+    measures filtered out by name build nothing.
+    """
+    # Random keys: the cipher's cost per record, without the scrypt derivation
+    ciphers = {'plain': None, 'encrypted': HistoryCipher(os.urandom(32), os.urandom(32))}
+    for size in config['history_sizes']:
+        entries = []
+        for kind, cipher in ciphers.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'history.ndjson')
+                opened = []
+
+                def populated():
+                    if not entries:
+                        entries.extend(_history_entries(size))
+                    return _populate_history(path, entries, cipher)
+
+                def store():
+                    if not opened:
+                        opened.append(HistoryStore(populated(), retention=None, cipher=cipher))
+                    return opened[0]
+
+                prefix = f'history.{kind}.{size}'
+                calls = config['history_calls']
+                try:
+                    # Opening, the first page and a query are what a GUI start costs
+                    yield (f'{prefix}.open',
+                           lambda: latency(partial(_open_history, populated(), cipher), calls))
+                    yield (f'{prefix}.load_page',
+                           lambda: latency(partial(_first_page, store()), calls))
+                    yield (f'{prefix}.load_all',
+                           lambda: rate(partial(_count_entries, store()), size,
+                                        config['min_time'], 1))
+                    yield (f'{prefix}.query',
+                           lambda: latency(partial(store().query, min_strength=5), calls))
+                    # Saving one entry, fsync included, as the Save button does
+                    yield (f'{prefix}.save',
+                           lambda: latency(partial(_append_next, store(),
+                                                   iter(_history_entries(calls + 1))),
+                                           calls))
+                finally:
+                    for opened_store in opened:
+                        opened_store.close()
+
+
+def _first_page(store):
+    """Read the newest page of a history, as the GUI's history panel does"""
+    return list(islice(store.iter_newest_first(), HISTORY_PAGE_SIZE))
+
+
+def _count_entries(store):
+    """Stream (and decrypt) every entry of a history"""
+    return sum(1 for _ in store)
+
+
+def _append_next(store, entries):
+    """Save the next of an iterator of entries"""
+    store.append(next(entries))
+
+
+def bench_quality(config):
+    """Chi-square checks and entropy estimates for each quality source
+
+    One sample serves every check of a source, so each measure returns a
+    dict of results.
+    """
+    for source, factory in QUALITY_SOURCES.items():
+        def measure(source=source, factory=factory):
+            report = check_generator(factory(), config['quality_chars'])
+            prefix = f'quality.{source}'
+            results = {f'{prefix}.{test.name}': Measurement(test.p_value, 'p', True)
+                       for test in report.tests}
+            results[f'{prefix}.entropy_bits'] = Measurement(
+                report.entropy['password_bits'], 'bits', True)
+            return results
+        yield f'quality.{source}', measure
+
+
+def _write_plain(generator, count, sink):
+    """The usual bulk path: a list of str per batch, joined and encoded"""
+    for start in range(0, count, MEMORY_BATCH_SIZE):
+        batch = generator.generate_batch(min(MEMORY_BATCH_SIZE, count - start))
+        sink.write(('\n'.join(batch) + '\n').encode('utf-8'))
+
+
+def _write_secure(generator, count, sink):
+    """The secure bulk path: every batch laid out in one reused SecretBuffer"""
+    with SecretBuffer() as secret:
+        for start in range(0, count, MEMORY_BATCH_SIZE):
+            lines = generator.generate_lines_into(secret, min(MEMORY_BATCH_SIZE, count - start))
+            sink.write(lines)
+            lines.release()
+
+
+def _peak_kib(write, generator, count):
+    """Peak traced allocation, in KiB, while `write` sends `count` passwords to the null device"""
+    import tracemalloc  # only needed here; keeps `import bench` (and the CLI) quick
+    with open(os.devnull, 'wb', buffering=0) as sink:
+        write(generator, min(count, MEMORY_BATCH_SIZE), sink)  # warm caches
+        tracemalloc.start()
+        try:
+            write(generator, count, sink)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return Measurement(peak / 1024, 'KiB', False)
+
+
+def bench_memory(config):
+    """Peak memory of bulk generation through str batches and through a SecretBuffer
+
+    The SecretBuffer's own pages are a memory map, which tracemalloc does
+    not see; they are one batch in size and reused for every batch.
+    """
+    generator = PasswordGenerator(length=16)
+    for path, write in (('plain', _write_plain), ('secure', _write_secure)):
+        yield (f'memory.{path}.len16',
+               lambda write=write: _peak_kib(write, generator, config['memory_count']))
+
+
+def _import_time(module):
+    """Cumulative import time of `module` in a fresh interpreter (ms), and its Tk modules"""
+    import subprocess  # only needed here; keeps `import bench` (and the CLI) quick
+    # Bytecode may be written: an installed app starts from cached .pyc files
+    env = {key: value for key, value in os.environ.items()
+           if key != 'PYTHONDONTWRITEBYTECODE'}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}; {_STARTUP_PROBE}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        capture_output=True, text=True, check=True,
+    )
+    # Lines read "import time: self [us] | cumulative | name", nested imports indented
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].rstrip() == f' {module}':
+            return int(fields[1]) / 1000, result.stdout.split()
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def bench_startup(config):
+    """Cold import time of each entry point, and whether a headless one loads Tk"""
+    for module, headless in STARTUP_MODULES.items():
+        def measure(module=module, headless=headless):
+            _import_time(module)  # compiles anything not yet cached
+            runs = [_import_time(module) for _ in range(config['startup_runs'])]
+            timings = sorted(milliseconds for milliseconds, _ in runs)
+            results = {f'startup.{module}.import':
+                       Measurement(timings[len(timings) // 2], 'ms', False)}
+            if headless:
+                results[f'startup.{module}.tk_modules'] = Measurement(
+                    max(len(tk_modules) for _, tk_modules in runs), 'modules', False)
+            return results
+        yield f'startup.{module}', measure
+
+
+SUITES = {
+    'generate': bench_generation,
+    'score': bench_scoring,
+    'history': bench_history,
+    'quality': bench_quality,
+    'memory': bench_memory,
+    'startup': bench_startup,
+}
+
+
+def run(suites=None, quick=False, wordlist=None, only=None, progress=None,
+        quality_chars=None):
+    """Run the selected suites; returns {name: Measurement}
+
+    Suites yield (name, measure) pairs and each measure() runs right away,
+    while the suite's setup is still live. measure() returns a Measurement,
+    or a dict of them by name for checks that produce several at once.
+    `only` keeps benchmarks whose name contains that text; `progress` is
+    called with each (name, measurement) as it completes.
+    """
+    if quality_chars is None:
+        quality_chars = QUICK_QUALITY_CHARS if quick else DEFAULT_SAMPLE_CHARS
+    config = {
+        'min_time': MIN_TIME / 4 if quick else MIN_TIME,
+        'history_sizes': HISTORY_SIZES[:2] if quick else HISTORY_SIZES,
+        'history_calls': 20 if quick else 50,
+        'wordlist': wordlist,
+        'quality_chars': quality_chars,
+        'startup_runs': 3 if quick else STARTUP_RUNS,
+        'memory_count': MEMORY_COUNT // 10 if quick else MEMORY_COUNT,
+    }
+    results = {}
+    for suite in suites or SUITES:
+        for name, measure in SUITES[suite](config):
+            if only and only not in name:
+                continue
+            measured = measure()
+            if isinstance(measured, Measurement):
+                measured = {name: measured}
+            for name, measurement in measured.items():
+                results[name] = measurement
+                if progress is not None:
+                    progress(name, measurement)
+    return results
+
+
+def to_json(results):
+    """Serializable form of a run, with enough context to compare runs fairly"""
+    import platform  # only needed here; keeps `import bench` (and the CLI) quick
+    return {
+        'format': BENCH_FORMAT,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': {name: m._asdict() for name, m in results.items()},
+    }
+
+
+def load_results(path):
+    """Read the measurements of a run saved with to_json()"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('format') != BENCH_FORMAT:
+        raise ValueError(f"{path} is not a benchmark results file")
+    return {name: Measurement(**fields) for name, fields in data['results'].items()}
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Benchmarks worse than baseline by more than `threshold`, as (name, old, new)
+
+    p-values are skipped; see quality_failures().
+    """
+    return [(name, baseline[name], measurement)
+            for name, measurement in results.items()
+            if name in baseline and measurement.unit != 'p'
+            and measurement.worse_than(baseline[name], threshold)]
+
+
+def quality_failures(results, alpha=QUALITY_ALPHA):
+    """Statistical checks whose p-value is below `alpha`, as (name, measurement)"""
+    return [(name, measurement) for name, measurement in results.items()
+            if measurement.unit == 'p' and measurement.value < alpha]
+
+
+def budget_failures(results, budgets=STARTUP_BUDGETS):
+    """Results over their fixed budget, as (name, measurement, budget)"""
+    return [(name, measurement, budgets[name]) for name, measurement in results.items()
+            if name in budgets and measurement.value > budgets[name]]
+
+
+def format_measurement(measurement):
+    """Human-readable value and unit"""
+    if measurement.unit == 'items/s':
+        return f'{measurement.value:,.0f}/s'
+    if measurement.unit == 'p':
+        return f'p={measurement.value:.3g}'
+    if measurement.unit == 'modules':
+        return f'{measurement.value:.0f} modules'
+    return f'{measurement.value:.3f} {measurement.unit}'
@@ -0,0 +1,149 @@
+"""Offline breached-password checks against a local, memory-mapped corpus
+
+Two corpus layouts are supported, both sorted by SHA-1 hash:
+
+* the Have I Been Pwned "ordered by hash" text download, one
+  ``HASH:COUNT`` line per password;
+* a compact binary file of raw 20-byte SHA-1 digests (see build_binary_corpus),
+  recognised by the BINARY_SUFFIX extension.
+
+Either way the file is memory-mapped and binary-searched, so lookups touch
+only a handful of pages and the corpus never has to fit in RAM.
+"""
+import hashlib
+import mmap
+import os
+import tempfile
+
+BINARY_SUFFIX = '.sha1bin'
+RECORD_SIZE = 20
+HEX_SIZE = 2 * RECORD_SIZE
+
+# Environment variable the GUI reads the corpus location from
+BREACH_CORPUS_ENV = 'PASSWORD_BREACH_CORPUS'
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+class BreachCorpusError(Exception):
+    """Raised when a breach corpus cannot be opened or converted"""
+
+
+def password_hash(password):
+    """SHA-1 digest used by breach corpora"""
+    return hashlib.sha1(password.encode('utf-8')).digest()
+
+
+class BreachCorpus:
+    """Read-only, memory-mapped breach corpus"""
+
+    def __init__(self, path):
+        self.path = path
+        self.binary = path.endswith(BINARY_SUFFIX)
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        except (OSError, ValueError) as e:
+            raise BreachCorpusError(f"Could not open breach corpus {path}: {e}") from e
+        self.size = size
+
+        if self.binary and size % RECORD_SIZE:
+            self.close()
+            raise BreachCorpusError(f"{path} is not a whole number of {RECORD_SIZE}-byte records")
+
+    def __contains__(self, password):
+        return self.contains_hash(password_hash(password))
+
+    def contains_hash(self, digest):
+        """Look up a raw SHA-1 digest"""
+        if self.binary:
+            return self._search_binary(digest)
+        return self._search_text(digest.hex().upper().encode('ascii'))
+
+    def _search_binary(self, digest):
+        data = self._map
+        low, high = 0, self.size // RECORD_SIZE
+        while low < high:
+            middle = (low + high) // 2
+            start = middle * RECORD_SIZE
+            record = data[start:start + RECORD_SIZE]
+            if record < digest:
+                low = middle + 1
+            elif record > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+    def _search_text(self, key):
+        """Binary search over byte offsets, snapping each probe to a line start"""
+        data = self._map
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            start = data.rfind(b'\n', 0, middle) + 1
+            record = data[start:start + HEX_SIZE].upper()
+            if record < key:
+                end = data.find(b'\n', middle)
+                if end < 0:
+                    return False
+                low = end + 1
+            elif record > key:
+                high = start
+            else:
+                return True
+        return False
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+def open_default_corpus():
+    """Open the corpus named by BREACH_CORPUS_ENV, or return None if unset"""
+    path = os.environ.get(BREACH_CORPUS_ENV)
+    return BreachCorpus(path) if path else None
+
+
+def build_binary_corpus(text_path, binary_path):
+    """Convert a sorted HIBP text corpus into the compact binary layout
+
+    Streams the input, so it works on corpora far larger than memory.
+    Returns the number of records written.
+    """
+    if not binary_path.endswith(BINARY_SUFFIX):
+        raise BreachCorpusError(f"Binary corpus file names must end in {BINARY_SUFFIX}")
+
+    count = 0
+    previous = b''
+    # A uniquely named file next to the target, so concurrent builds cannot
+    # clobber each other and the final rename stays on one filesystem
+    directory = os.path.dirname(os.path.abspath(binary_path))
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='.breach-', suffix='.tmp', dir=directory)
+    except OSError as e:
+        raise BreachCorpusError(f"Could not convert {text_path}: {e}") from e
+    try:
+        with os.fdopen(fd, 'wb', buffering=WRITE_BUFFER_SIZE) as out, open(text_path, 'rb') as source:
+            for line in source:
+                hex_digest = line[:HEX_SIZE]
+                if not hex_digest.strip():
+                    continue
+                try:
+                    digest = bytes.fromhex(hex_digest.decode('ascii'))
+                except ValueError as e:
+                    raise BreachCorpusError(f"Bad corpus line {count + 1}: {line[:60]!r}") from e
+                if digest <= previous:
+                    raise BreachCorpusError("Corpus must be sorted by hash "
+                                            "(use the 'ordered by hash' download)")
+                out.write(digest)
+                previous = digest
+                count += 1
+        os.replace(tmp_path, binary_path)
+    except OSError as e:
+        raise BreachCorpusError(f"Could not convert {text_path}: {e}") from e
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return count
@@ -0,0 +1,926 @@
+"""Command-line entry points for headless password generation"""
+import argparse
+import getpass
+import json
+import os
+import sys
+from datetime import datetime
+from itertools import islice, tee
+
+from generator import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_SYLLABLE_TEMPLATES,
+    NATURAL_SYLLABLE_TEMPLATES,
+    PasswordGenerator,
+)
+from history import (
+    DEFAULT_HISTORY_PATH,
+    DEFAULT_RETENTION,
+    LEGACY_HISTORY_PATH,
+    RETENTION_ENV,
+    HistoryError,
+    HistoryStore,
+    default_retention,
+    write_atomic,
+)
+import metrics
+from passphrase import (
+    CAPITALIZE_MODES,
+    DEFAULT_SEPARATOR,
+    DEFAULT_WORDS,
+    WORDLIST_ENV,
+    PassphraseGenerator,
+    WordListError,
+    default_wordlist_path,
+    load_wordlist,
+)
+from policy import PasswordPolicy, load_policy
+from strength import score_many
+
+# Buffer size for output streams; large writes keep syscalls off the hot path
+WRITE_BUFFER_SIZE = 1 << 20
+
+FORMATS = ('text', 'ndjson')
+# Formats and suites of archive.py and bench.py, which are only imported
+# by the commands that use them
+ARCHIVE_FORMATS = ('csv', 'ndjson', 'binary')
+BENCH_SUITES = ('generate', 'score', 'history', 'quality', 'memory', 'startup')
+# `generate` can also write the export formats that only archive.py handles
+GENERATE_FORMATS = FORMATS + ('csv', 'binary')
+# Invalid records listed individually by `import`; the rest are only counted
+MAX_REPORTED_ERRORS = 10
+
+
+def format_batch(batch, fmt):
+    """Render a batch of passwords as one block of output text"""
+    if fmt == 'ndjson':
+        lines = ['{"password": %s}' % json.dumps(password) for password in batch]
+    else:
+        lines = batch
+    return '\n'.join(lines) + '\n'
+
+
+def write_passwords(batches, stream, fmt='text'):
+    """Write batches of passwords to a stream as they are produced"""
+    written = 0
+    for batch in batches:
+        if batch:
+            stream.write(format_batch(batch, fmt))
+            written += len(batch)
+    return written
+
+
+def write_secret_lines(generator, count, batch_size, stream):
+    """Generate passwords a batch at a time into one SecretBuffer and write them out
+
+    `stream` should be unbuffered, so that the buffer's lines are the only
+    copy of the passwords in this process.
+    """
+    from secure import SecretBuffer
+
+    written = 0
+    with SecretBuffer() as secret:
+        while written < count:
+            size = min(batch_size, count - written)
+            lines = generator.generate_lines_into(secret, size)
+            try:
+                sent = 0
+                while sent < len(lines):
+                    sent += stream.write(lines[sent:])
+            finally:
+                lines.release()
+            written += size
+    return written
+
+
+def read_passwords(stream):
+    """Yield passwords from a stream, one per line"""
+    for line in stream:
+        yield line.rstrip('\r\n')
+
+
+def open_input(path, binary=False):
+    """Open the input file, or a large-buffered view of stdin for '-'"""
+    if binary:
+        if path in (None, '-'):
+            return open(sys.stdin.fileno(), 'rb', buffering=WRITE_BUFFER_SIZE, closefd=False)
+        return open(path, 'rb', buffering=WRITE_BUFFER_SIZE)
+    if path in (None, '-'):
+        return open(sys.stdin.fileno(), 'r', buffering=WRITE_BUFFER_SIZE,
+                    encoding='utf-8', errors='surrogateescape', closefd=False)
+    return open(path, 'r', buffering=WRITE_BUFFER_SIZE, encoding='utf-8',
+                errors='surrogateescape')
+
+
+def open_output(path, binary=False, buffered=True):
+    """Open the output file, or a large-buffered view of stdout for '-'
+
+    With `buffered` false (binary only) writes go straight to the file.
+    """
+    if binary:
+        buffering = WRITE_BUFFER_SIZE if buffered else 0
+        if path in (None, '-'):
+            return open(sys.stdout.fileno(), 'wb', buffering=buffering, closefd=False)
+        return open(path, 'wb', buffering=buffering)
+    if path in (None, '-'):
+        return open(sys.stdout.fileno(), 'w', buffering=WRITE_BUFFER_SIZE,
+                    encoding='utf-8', closefd=False)
+    return open(path, 'w', buffering=WRITE_BUFFER_SIZE, encoding='utf-8')
+
+
+def parse_templates(value):
+    """Parse a --syllables value into a tuple of syllable templates"""
+    if value == 'natural':
+        return NATURAL_SYLLABLE_TEMPLATES
+    return tuple(t.strip().upper() for t in value.split(',') if t.strip())
+
+
+def add_option_arguments(parser):
+    """Add the password option flags shared by the generation commands"""
+    parser.add_argument('--length', '-l', type=int, default=16,
+                        help='password length (default: 16)')
+    parser.add_argument('--no-lowercase', dest='lowercase', action='store_false',
+                        help='exclude lowercase letters')
+    parser.add_argument('--no-uppercase', dest='uppercase', action='store_false',
+                        help='exclude uppercase letters')
+    parser.add_argument('--no-numbers', dest='numbers', action='store_false',
+                        help='exclude numbers')
+    parser.add_argument('--no-symbols', dest='symbols', action='store_false',
+                        help='exclude symbols')
+    parser.add_argument('--exclude-ambiguous', action='store_true',
+                        help='exclude ambiguous characters (0, O, 1, l, I)')
+    parser.add_argument('--pronounceable', action='store_true',
+                        help='generate pronounceable passwords')
+    parser.add_argument('--syllables', type=parse_templates,
+                        default=DEFAULT_SYLLABLE_TEMPLATES, metavar='TEMPLATES',
+                        help="comma-separated syllable shapes for --pronounceable, "
+                             "e.g. 'CV,CVC,VC', or 'natural' (default: CV)")
+
+
+def add_metrics_arguments(parser):
+    """Add the flags that collect timing metrics and dump them on exit"""
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="collect timings and counters and write them to FILE on exit "
+                             "('-' for stderr)")
+    parser.add_argument('--metrics-format', choices=metrics.FORMATS, default='prometheus',
+                        help='format of the --metrics dump (default: prometheus)')
+
+
+def options_from_args(args):
+    """Collect PasswordGenerator keyword arguments from parsed options"""
+    return {
+        'length': args.length,
+        'lowercase': args.lowercase,
+        'uppercase': args.uppercase,
+        'numbers': args.numbers,
+        'symbols': args.symbols,
+        'exclude_ambiguous': args.exclude_ambiguous,
+        'pronounceable': args.pronounceable,
+        'syllable_templates': args.syllables
+    }
+
+
+def passphrase_options_from_args(args):
+    """Collect PassphraseGenerator keyword arguments from parsed options"""
+    wordlist = args.wordlist or default_wordlist_path()
+    if not wordlist:
+        raise WordListError(f"--passphrase needs --wordlist FILE or {WORDLIST_ENV} set")
+    return {
+        'wordlist': wordlist,
+        'words': args.words,
+        'separator': args.separator,
+        'capitalize': args.capitalize,
+        'digits': args.digits
+    }
+
+
+def source_from_args(args):
+    """Pick the generator class for `generate` and its keyword arguments"""
+    if args.policy:
+        return PasswordPolicy, load_policy(args.policy, args.policy_name).settings
+    if args.passphrase:
+        return PassphraseGenerator, passphrase_options_from_args(args)
+    return PasswordGenerator, options_from_args(args)
+
+
+def build_parser():
+    """Build the command-line argument parser"""
+    parser = argparse.ArgumentParser(
+        prog='main.py',
+        description='Generate secure passwords. Run without arguments to open the GUI.'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help='stream generated passwords')
+    add_option_arguments(generate)
+    generate.add_argument('--policy', metavar='FILE',
+                          help='generate passwords conforming to a JSON policy file; '
+                               'its settings replace the character options above')
+    generate.add_argument('--policy-name', metavar='NAME',
+                          help='policy to use from a file that defines several')
+    generate.add_argument('--passphrase', action='store_true',
+                          help='generate diceware-style passphrases from a wordlist')
+    generate.add_argument('--wordlist', metavar='FILE',
+                          help=f'wordlist for --passphrase, EFF/diceware or one word per line '
+                               f'(default: ${WORDLIST_ENV})')
+    generate.add_argument('--words', type=int, default=DEFAULT_WORDS,
+                          help=f'words per passphrase (default: {DEFAULT_WORDS})')
+    generate.add_argument('--separator', default=DEFAULT_SEPARATOR,
+                          help=f"text between passphrase words (default: '{DEFAULT_SEPARATOR}')")
+    generate.add_argument('--capitalize', choices=CAPITALIZE_MODES, default='none',
+                          help='capitalize no words, every word, or words at random (default: none)')
+    generate.add_argument('--digits', type=int, default=0,
+                          help='random digits appended to random passphrase words (default: 0)')
+    generate.add_argument('--count', '-n', type=int, default=1,
+                          help='number of passwords to generate (default: 1)')
+    generate.add_argument('--format', '-f', choices=GENERATE_FORMATS, default='text',
+                          help='output format (default: text)')
+    generate.add_argument('--output', '-o', default='-',
+                          help="output file, or '-' for stdout (default)")
+    generate.add_argument('--batch-size', type=int, default=None,
+                          help='passwords per CSPRNG read (default: '
+                               f'{DEFAULT_BATCH_SIZE}, or sized automatically with --workers)')
+    generate.add_argument('--workers', '-j', type=int, default=1,
+                          help='worker processes; 0 uses every core (default: 1)')
+    generate.add_argument('--unordered', action='store_true',
+                          help='emit batches as workers finish them instead of in order')
+    generate.add_argument('--unique', action='store_true',
+                          help='never emit a password issued before; every emitted '
+                               'password is recorded in the reuse index')
+    generate.add_argument('--history', default=DEFAULT_HISTORY_PATH,
+                          help=f'history whose reuse index --unique uses (default: {DEFAULT_HISTORY_PATH})')
+    generate.add_argument('--bloom-capacity', type=int, metavar='N',
+                          help='keep the reuse index in a Bloom filter sized for N passwords '
+                               'instead of an exact set (less memory, rare false rejects)')
+    generate.add_argument('--passphrase-env', metavar='VAR',
+                          help='read the master passphrase from this environment variable')
+    generate.add_argument('--breach-corpus', metavar='PATH',
+                          help='replace any password found in this local breach corpus')
+    generate.add_argument('--secure', action='store_true',
+                          help='generate random passwords as bytes into a buffer that is '
+                               'zeroed after writing, never creating a str per password '
+                               '(text output only)')
+    add_metrics_arguments(generate)
+    generate.set_defaults(handler=run_generate)
+
+    score = subparsers.add_parser('score', help='score passwords read one per line')
+    score.add_argument('--input', '-i', default='-',
+                       help="input file, or '-' for stdin (default)")
+    score.add_argument('--output', '-o', default='-',
+                       help="output file, or '-' for stdout (default)")
+    score.add_argument('--format', '-f', choices=FORMATS, default='text',
+                       help='output format (default: text)')
+    score.add_argument('--breach-corpus', metavar='PATH',
+                       help='flag passwords found in this local breach corpus (scored 1)')
+    add_metrics_arguments(score)
+    score.set_defaults(handler=run_score)
+
+    breach_index = subparsers.add_parser(
+        'breach-index', help='convert a sorted HIBP text corpus to the compact binary layout')
+    breach_index.add_argument('input', help="HIBP 'ordered by hash' SHA-1 text file")
+    breach_index.add_argument('output', help='binary corpus to write (must end in .sha1bin)')
+    breach_index.set_defaults(handler=run_breach_index)
+
+    history = subparsers.add_parser('history', help='search the saved password history')
+    history.add_argument('--history', default=DEFAULT_HISTORY_PATH,
+                         help=f'history file (default: {DEFAULT_HISTORY_PATH})')
+    history.add_argument('--since', type=parse_datetime,
+                         help="only entries at or after this time ('YYYY-MM-DD[ HH:MM:SS]')")
+    history.add_argument('--until', type=parse_datetime,
+                         help='only entries at or before this time')
+    history.add_argument('--min-length', type=int)
+    history.add_argument('--max-length', type=int)
+    history.add_argument('--min-strength', type=int)
+    history.add_argument('--max-strength', type=int)
+    history.add_argument('--label', help='only entries with this label')
+    history.add_argument('--show-passwords', action='store_true',
+                         help='include the passwords (asks for the master passphrase '
+                              'if the history is encrypted)')
+    history.add_argument('--passphrase-env', metavar='VAR',
+                         help='read the master passphrase from this environment variable')
+    history.add_argument('--output', '-o', default='-',
+                         help="output file, or '-' for stdout (default)")
+    history.add_argument('--format', '-f', choices=FORMATS, default='text',
+                         help='output format (default: text)')
+    legacy = history.add_mutually_exclusive_group()
+    legacy.add_argument('--migrate-legacy', action='store_true',
+                        help=f'copy the entries of an old {LEGACY_HISTORY_PATH} into the '
+                             'encrypted history, keeping the old file')
+    legacy.add_argument('--shred-legacy', action='store_true',
+                        help=f'overwrite and delete the old {LEGACY_HISTORY_PATH} once '
+                             'every entry in it was migrated')
+    add_metrics_arguments(history)
+    history.set_defaults(handler=run_history)
+
+    export = subparsers.add_parser('export', help='export the saved history as CSV, NDJSON '
+                                                  'or binary')
+    export.add_argument('output', help="file to write, or '-' for stdout")
+    export.add_argument('--format', '-f', choices=ARCHIVE_FORMATS,
+                        help='file format (default: from the file extension, else ndjson)')
+    export.add_argument('--history', default=DEFAULT_HISTORY_PATH,
+                        help=f'history file (default: {DEFAULT_HISTORY_PATH})')
+    export.add_argument('--passphrase-env', metavar='VAR',
+                        help='read the master passphrase from this environment variable')
+    add_metrics_arguments(export)
+    export.set_defaults(handler=run_export)
+
+    import_ = subparsers.add_parser('import', help='add entries from a CSV, NDJSON or binary '
+                                                   'file to the history')
+    import_.add_argument('input', help="file to read, or '-' for stdin")
+    import_.add_argument('--format', '-f', choices=ARCHIVE_FORMATS,
+                         help='file format (default: from the file extension, else ndjson)')
+    import_.add_argument('--history', default=DEFAULT_HISTORY_PATH,
+                         help=f'history file (default: {DEFAULT_HISTORY_PATH})')
+    import_.add_argument('--passphrase-env', metavar='VAR',
+                         help='read the master passphrase from this environment variable')
+    import_.add_argument('--label', help='label for imported entries that have none')
+    add_retention_argument(import_)
+    import_.add_argument('--dry-run', action='store_true',
+                         help='validate and count the entries without saving them')
+    add_metrics_arguments(import_)
+    import_.set_defaults(handler=run_import)
+
+    serve = subparsers.add_parser('serve', help='serve generation, scoring and history '
+                                                'saves as a local JSON service')
+    # Defaults come from server.py and pool.py, which are only imported to serve
+    serve.add_argument('--host', help='address to listen on (default: 127.0.0.1)')
+    serve.add_argument('--port', '-p', type=int, help='port to listen on (default: 8765)')
+    serve.add_argument('--unix', metavar='PATH',
+                       help='listen on this Unix socket (owner-only, no token) '
+                            'instead of a TCP port')
+    serve.add_argument('--token-file', metavar='FILE',
+                       help='where to write the access token TCP clients must send as '
+                            "'Authorization: Bearer TOKEN' (default: password_service.token)")
+    serve.add_argument('--history', default=DEFAULT_HISTORY_PATH,
+                       help=f'history that /history saves to (default: {DEFAULT_HISTORY_PATH})')
+    serve.add_argument('--no-history', action='store_true',
+                       help='disable /history and the reuse check on generated passwords')
+    add_retention_argument(serve)
+    serve.add_argument('--passphrase-env', metavar='VAR',
+                       help='read the master passphrase from this environment variable')
+    serve.add_argument('--breach-corpus', metavar='PATH',
+                       help='replace breached generated passwords and flag them when scoring')
+    serve.add_argument('--wordlist', metavar='FILE',
+                       help=f'wordlist for passphrase requests (default: ${WORDLIST_ENV})')
+    serve.add_argument('--pool-size', type=int,
+                       help='ready-made passwords kept per option set (default: 256)')
+    serve.add_argument('--threads', type=int, default=None,
+                       help='threads for large generation and scoring requests')
+    # With --metrics the service also answers GET /metrics
+    add_metrics_arguments(serve)
+    serve.set_defaults(handler=run_serve)
+
+    benchmark = subparsers.add_parser('bench', help='benchmark generation, scoring and '
+                                                    'history I/O')
+    # Defaults come from bench.py, which is only imported to benchmark
+    benchmark.add_argument('--suite', action='append', choices=BENCH_SUITES,
+                           help='suite to run; repeat for several (default: all)')
+    benchmark.add_argument('--only', metavar='TEXT',
+                           help='run only benchmarks whose name contains TEXT')
+    benchmark.add_argument('--quick', action='store_true',
+                           help='shorter timings and histories up to 1k entries')
+    benchmark.add_argument('--wordlist', metavar='FILE',
+                           help=f'also benchmark passphrases (default: ${WORDLIST_ENV})')
+    benchmark.add_argument('--output', '-o', metavar='FILE',
+                           help="write the results as JSON to FILE ('-' for stdout)")
+    benchmark.add_argument('--baseline', metavar='FILE',
+                           help='results from an earlier run to compare against; exits '
+                                'with status 1 if anything regressed')
+    benchmark.add_argument('--quality-chars', type=int, metavar='N',
+                           help='characters sampled per source by the quality suite '
+                                '(default: 10000000, 1000000 with --quick)')
+    benchmark.add_argument('--threshold', type=float,
+                           help='slowdown counted as a regression, as a fraction '
+                                '(default: 0.15)')
+    benchmark.set_defaults(handler=run_bench)
+
+    return parser
+
+
+def filter_batches(batches, generator, rejects, flush=None):
+    """Replace passwords any of the `rejects` predicates flag, batch by batch"""
+    def reject(password):
+        return any(predicate(password) for predicate in rejects)
+
+    for batch in batches:
+        batch = generator.replace_rejected(batch, reject)
+        if flush is not None:
+            flush()
+        yield batch
+
+
+def open_reuse_index(args):
+    """Open the reuse index belonging to the --history file"""
+    from reuse import SEEN_SUFFIX, ReuseIndex, reuse_key
+
+    cipher = unlock_cipher(args.history, args.passphrase_env)
+    return ReuseIndex(args.history + SEEN_SUFFIX, reuse_key(args.history, cipher),
+                      bloom_capacity=args.bloom_capacity)
+
+
+def open_breach_corpus(path, parser):
+    """Open a --breach-corpus file, exiting with a usage error if it is not one"""
+    from breach import BreachCorpus, BreachCorpusError
+
+    try:
+        return BreachCorpus(path)
+    except BreachCorpusError as e:
+        parser.error(str(e))
+
+
+def run_generate(args, parser):
+    """Handle the `generate` command"""
+    if args.count < 0:
+        parser.error("--count must not be negative")
+    if args.batch_size is not None and args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.policy_name and not args.policy:
+        parser.error("--policy-name requires --policy")
+    if sum(map(bool, (args.policy, args.passphrase, args.pronounceable))) > 1:
+        parser.error("--policy, --passphrase and --pronounceable are mutually exclusive")
+    if args.secure:
+        return run_generate_secure(args, parser)
+
+    rejects = []
+    index = None
+    corpus = None
+    try:
+        factory, options = source_from_args(args)
+        generator = factory(**options)
+        if args.workers == 1:
+            batches = generator.iter_batches(args.count, args.batch_size or DEFAULT_BATCH_SIZE)
+        else:
+            from parallel import iter_parallel_batches
+            batches = iter_parallel_batches(options, args.count,
+                                            workers=args.workers,
+                                            chunk_size=args.batch_size,
+                                            ordered=not args.unordered,
+                                            factory=factory)
+        if args.breach_corpus:
+            corpus = open_breach_corpus(args.breach_corpus, parser)
+            rejects.append(corpus.__contains__)
+        if args.unique:
+            index = open_reuse_index(args)
+            # Claiming must come last so only emitted passwords are recorded
+            rejects.append(lambda password: not index.claim(password))
+    except (ValueError, HistoryError, OSError) as e:
+        parser.error(str(e))
+
+    if rejects:
+        batches = filter_batches(batches, generator, rejects,
+                                 index.flush if index is not None else None)
+    try:
+        if args.format in FORMATS:
+            with open_output(args.output) as stream:
+                write_passwords(batches, stream, args.format)
+        else:
+            import archive
+            with open_output(args.output, binary=True) as stream:
+                archive.write_records(archive.password_records(batches), stream, args.format,
+                                      archive.PASSWORD_FIELDS)
+    except ValueError as e:
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+    finally:
+        if index is not None:
+            index.close()
+        if corpus is not None:
+            corpus.close()
+    return 0
+
+
+def run_generate_secure(args, parser):
+    """Handle `generate --secure`: random passwords, as text, through a SecretBuffer"""
+    conflicts = [flag for flag, value in (
+        ('--policy', args.policy), ('--passphrase', args.passphrase),
+        ('--pronounceable', args.pronounceable), ('--unique', args.unique),
+        ('--breach-corpus', args.breach_corpus), ('--workers', args.workers != 1),
+        ('--format', args.format != 'text'),
+    ) if value]
+    if conflicts:
+        parser.error(f"--secure writes random passwords as text only; "
+                     f"it cannot be combined with {', '.join(conflicts)}")
+    try:
+        generator = PasswordGenerator(**options_from_args(args))
+        stream = open_output(args.output, binary=True, buffered=False)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    with stream:
+        write_secret_lines(generator, args.count, args.batch_size or DEFAULT_BATCH_SIZE, stream)
+    return 0
+
+
+def format_scores(results, fmt, breached=None):
+    """Render strength results (without the passwords) as output lines
+
+    `breached`, if given, yields one flag per result; breached passwords
+    are scored 1 whatever their composition.
+    """
+    for number, result in enumerate(results, 1):
+        flag = next(breached) if breached is not None else False
+        if flag:
+            result = result._replace(score=1)
+        if fmt == 'ndjson':
+            fields = result._asdict()
+            fields['entropy_bits'] = round(result.entropy_bits, 2)
+            if breached is not None:
+                fields['breached'] = flag
+            yield json.dumps({'line': number, **fields}) + '\n'
+        elif breached is not None:
+            yield '%d\t%d\t%.2f\t%s\n' % (number, result.score, result.entropy_bits,
+                                          'breached' if flag else '')
+        else:
+            yield '%d\t%d\t%.2f\n' % (number, result.score, result.entropy_bits)
+
+
+def run_score(args, parser):
+    """Handle the `score` command"""
+    corpus = open_breach_corpus(args.breach_corpus, parser) if args.breach_corpus else None
+
+    with open_input(args.input) as source, open_output(args.output) as stream:
+        passwords = read_passwords(source)
+        breached = None
+        if corpus is not None:
+            # Both consumers advance in lockstep, so tee only buffers one item
+            passwords, checked = tee(passwords)
+            breached = map(corpus.__contains__, checked)
+        stream.writelines(format_scores(score_many(passwords), args.format, breached))
+    if corpus is not None:
+        corpus.close()
+    return 0
+
+
+def run_breach_index(args, parser):
+    """Handle the `breach-index` command"""
+    from breach import BreachCorpusError, build_binary_corpus
+
+    try:
+        count = build_binary_corpus(args.input, args.output)
+    except BreachCorpusError as e:
+        parser.error(str(e))
+    print(f"Wrote {count} records to {args.output}", file=sys.stderr)
+    return 0
+
+
+def parse_datetime(value):
+    """Parse a --since/--until value"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date/time: {value!r}")
+
+
+def unlock_cipher(history_path, passphrase_env=None):
+    """Unlock the history's cipher, or return None if it is not encrypted"""
+    from vault import HistoryCipher, VaultError, key_path
+
+    path = key_path(history_path)
+    if not os.path.exists(path):
+        return None
+    if passphrase_env:
+        passphrase = os.environ.get(passphrase_env)
+        if passphrase is None:
+            raise VaultError(f"Environment variable {passphrase_env} is not set")
+    else:
+        passphrase = getpass.getpass('Master passphrase: ')
+    return HistoryCipher.unlock(passphrase, path)
+
+
+def add_retention_argument(parser):
+    """Add --retention to a command that saves to the history"""
+    parser.add_argument('--retention', type=int, metavar='N',
+                        help='keep only the newest N entries when the history is compacted; '
+                             f'0 keeps everything (default: ${RETENTION_ENV}, '
+                             f'else {DEFAULT_RETENTION})')
+
+
+def history_retention(args):
+    """Retention for a saving command, from --retention or the environment"""
+    if args.retention is None:
+        return default_retention()
+    if args.retention < 0:
+        raise HistoryError("--retention must not be negative")
+    return args.retention or None
+
+
+def open_history(path, cipher=None, **options):
+    """Open a HistoryStore, pointing out an old plaintext history that is still around"""
+    store = HistoryStore(path, cipher=cipher, **options)
+    if store.legacy_path:
+        print(f"Note: the old plaintext history {store.legacy_path} is still there; see "
+              "`history --migrate-legacy` and `--shred-legacy`", file=sys.stderr)
+    return store
+
+
+def run_legacy_history(args, parser):
+    """Migrate or remove the old plaintext history for `history`"""
+    from reuse import SEEN_SUFFIX, ReuseIndex, reuse_key
+    from vault import VaultError
+
+    try:
+        cipher = unlock_cipher(args.history, args.passphrase_env)
+        if cipher is None:
+            parser.error("the history is not encrypted; set a master passphrase in the GUI "
+                         "before migrating the old history")
+        store = HistoryStore(args.history, retention=None, cipher=cipher)
+    except (VaultError, HistoryError) as e:
+        parser.error(str(e))
+
+    index = None
+    try:
+        if args.shred_legacy:
+            print(f"Overwrote and deleted {store.shred_legacy()}", file=sys.stderr)
+            return 0
+        migrated = store.migrate_legacy()
+        index = ReuseIndex(args.history + SEEN_SUFFIX, reuse_key(args.history, cipher))
+        if index.stale:
+            index.rebuild(entry['password'] for entry in store if 'password' in entry)
+        else:
+            index.add_many(entry['password'] for entry in migrated)
+    except HistoryError as e:
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+    finally:
+        if index is not None:
+            index.close()
+        store.close()
+    print(f"Added {len(migrated)} entries from {store.legacy_path}. It still holds them in "
+          "plaintext; check them with `history --show-passwords`, then run "
+          "`history --shred-legacy`", file=sys.stderr)
+    return 0
+
+
+def format_entries(entries, fmt):
+    """Render history entries as output lines"""
+    for entry in entries:
+        if fmt == 'ndjson':
+            yield json.dumps(entry) + '\n'
+        else:
+            fields = [entry.get('timestamp', ''), str(entry.get('length', '')),
+                      str(entry.get('strength', '')), entry.get('label', '')]
+            if 'password' in entry:
+                fields.append(entry['password'])
+            yield '\t'.join(fields) + '\n'
+
+
+def run_history(args, parser):
+    """Handle the `history` command"""
+    if args.migrate_legacy or args.shred_legacy:
+        return run_legacy_history(args, parser)
+    from vault import VaultError
+
+    try:
+        cipher = unlock_cipher(args.history, args.passphrase_env) if args.show_passwords else None
+        store = open_history(args.history, retention=None, cipher=cipher)
+    except (VaultError, HistoryError) as e:
+        parser.error(str(e))
+
+    try:
+        entries = store.query(args.since, args.until, args.min_length, args.max_length,
+                              args.min_strength, args.max_strength, args.label)
+    finally:
+        store.close()
+    for entry in entries:
+        entry.pop('secret', None)
+        if not args.show_passwords:
+            entry.pop('password', None)
+
+    with open_output(args.output) as stream:
+        stream.writelines(format_entries(entries, args.format))
+    return 0
+
+
+def archive_format(args, path):
+    """Format from --format, else from the file extension, else NDJSON"""
+    import archive
+    return args.format or archive.format_for_path(path, 'ndjson')
+
+
+def run_export(args, parser):
+    """Handle the `export` command"""
+    import archive
+    from vault import VaultError
+
+    try:
+        cipher = unlock_cipher(args.history, args.passphrase_env)
+        store = open_history(args.history, retention=None, cipher=cipher)
+    except (VaultError, HistoryError) as e:
+        parser.error(str(e))
+
+    entries = iter(store)
+    batches = iter(lambda: list(islice(entries, archive.BATCH_SIZE)), [])
+    try:
+        with open_output(args.output, binary=True) as stream:
+            count = archive.write_records(batches, stream, archive_format(args, args.output))
+    except (OSError, HistoryError, ValueError) as e:
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+    finally:
+        store.close()
+    print(f"Exported {count} entries", file=sys.stderr)
+    return 0
+
+
+def run_import(args, parser):
+    """Handle the `import` command"""
+    import archive
+    from reuse import SEEN_SUFFIX, ReuseIndex, reuse_key
+    from vault import VaultError
+
+    store = index = None
+    try:
+        source = open_input(args.input, binary=True)
+        if not args.dry_run:
+            retention = history_retention(args)
+            cipher = unlock_cipher(args.history, args.passphrase_env)
+            store = open_history(args.history, retention=retention, cipher=cipher)
+            index = ReuseIndex(args.history + SEEN_SUFFIX, reuse_key(args.history, cipher))
+            if index.stale:
+                index.rebuild(entry['password'] for entry in store if 'password' in entry)
+    except (OSError, VaultError, HistoryError) as e:
+        parser.error(str(e))
+
+    imported = reused = invalid = 0
+    number = 1
+    failed = False
+    try:
+        with source:
+            for batch in archive.read_records(source, archive_format(args, args.input)):
+                entries, errors = archive.validate_records(batch, number, args.label)
+                number += len(batch)
+                for record_number, message in errors[:max(0, MAX_REPORTED_ERRORS - invalid)]:
+                    print(f"Record {record_number}: {message}", file=sys.stderr)
+                invalid += len(errors)
+                if index is not None:
+                    # Claimed as we go, so repeats within the file are caught too
+                    fresh = [entry for entry in entries if index.claim(entry['password'])]
+                    reused += len(entries) - len(fresh)
+                    entries = fresh
+                if store is not None:
+                    store.append_many(entries)
+                    index.flush()
+                imported += len(entries)
+    except (OSError, HistoryError, ValueError) as e:
+        failed = True
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+    finally:
+        if index is not None:
+            # Claims for a batch that was never saved must not be recorded
+            index.close(flush=not failed)
+        if store is not None:
+            store.close()
+
+    verb = 'Would import' if args.dry_run else 'Imported'
+    print(f"{verb} {imported} entries ({reused} already in history, {invalid} invalid)",
+          file=sys.stderr)
+    if store is not None and store.retention is not None and imported > store.retention:
+        print(f"Note: the history keeps only the newest {store.retention} entries",
+              file=sys.stderr)
+    return 0
+
+
+def run_serve(args, parser):
+    """Handle the `serve` command"""
+    import asyncio
+    from pool import DEFAULT_POOL_SIZE, PasswordPool
+    from reuse import SEEN_SUFFIX, ReuseIndex, reuse_key
+    from server import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TOKEN_PATH, PasswordService, new_token
+
+    pool_size = DEFAULT_POOL_SIZE if args.pool_size is None else args.pool_size
+    if pool_size < 1:
+        parser.error("--pool-size must be at least 1")
+    if args.threads is not None and args.threads < 1:
+        parser.error("--threads must be at least 1")
+
+    store = index = corpus = None
+    try:
+        wordlist = args.wordlist or default_wordlist_path()
+        if wordlist:
+            wordlist = load_wordlist(wordlist)
+        if args.breach_corpus:
+            corpus = open_breach_corpus(args.breach_corpus, parser)
+        if not args.no_history:
+            retention = history_retention(args)
+            cipher = unlock_cipher(args.history, args.passphrase_env)
+            store = open_history(args.history, retention=retention, cipher=cipher)
+            index = ReuseIndex(args.history + SEEN_SUFFIX, reuse_key(args.history, cipher))
+            if index.stale:
+                index.rebuild(entry['password'] for entry in store if 'password' in entry)
+    except (ValueError, HistoryError, OSError) as e:
+        parser.error(str(e))
+
+    token = None
+    token_file = args.token_file or DEFAULT_TOKEN_PATH
+    if not args.unix:
+        token = new_token()
+        try:
+            # Written through a temporary file, which is created owner-only
+            write_atomic(token_file, [token.encode('ascii')])
+        except OSError as e:
+            parser.error(f"Could not write token file {token_file}: {e}")
+    service = PasswordService(store, index, corpus, wordlist,
+                              PasswordPool(pool_size), args.threads, token)
+
+    bound = []
+
+    def ready(server):
+        bound.append(server)
+        where = args.unix or '%s:%d' % server.sockets[0].getsockname()[:2]
+        print(f"Serving on {where}", file=sys.stderr)
+        if token is not None:
+            print(f"Access token in {token_file}", file=sys.stderr)
+
+    try:
+        port = DEFAULT_PORT if args.port is None else args.port
+        asyncio.run(service.serve(args.host or DEFAULT_HOST, port, args.unix, ready))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+    finally:
+        service.close()
+        for resource in (index, store, corpus):
+            if resource is not None:
+                resource.close()
+        # Remove the socket file only if this process created it
+        if args.unix and bound and os.path.exists(args.unix):
+            os.unlink(args.unix)
+        if token is not None and os.path.exists(token_file):
+            os.unlink(token_file)
+    return 0
+
+
+def run_bench(args, parser):
+    """Handle the `bench` command"""
+    import bench
+
+    threshold = bench.DEFAULT_THRESHOLD if args.threshold is None else args.threshold
+    if threshold < 0:
+        parser.error("--threshold must not be negative")
+    if args.quality_chars is not None and args.quality_chars < 1:
+        parser.error("--quality-chars must be at least 1")
+    baseline = None
+    try:
+        if args.baseline:
+            baseline = bench.load_results(args.baseline)
+        wordlist = args.wordlist or default_wordlist_path()
+        if wordlist:
+            wordlist = load_wordlist(wordlist)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    def progress(name, measurement):
+        line = f'{name:56} {bench.format_measurement(measurement):>16}'
+        if baseline is not None and name in baseline and measurement.unit != 'p':
+            old = baseline[name].value
+            change = (measurement.value - old) / old * 100 if old else 0.0
+            flag = '  REGRESSION' if measurement.worse_than(baseline[name], threshold) else ''
+            line += f'  {change:+6.1f}%{flag}'
+        print(line, file=sys.stderr)
+
+    results = bench.run(args.suite, args.quick, wordlist, args.only, progress,
+                        args.quality_chars)
+    if args.output:
+        with open_output(args.output) as stream:
+            json.dump(bench.to_json(results), stream, indent=2)
+            stream.write('\n')
+
+    failed = False
+    for name, measurement in bench.quality_failures(results):
+        print(f"Quality failure: {name}: {bench.format_measurement(measurement)}",
+              file=sys.stderr)
+        failed = True
+    for name, measurement, budget in bench.budget_failures(results):
+        print(f"Over budget: {name}: {bench.format_measurement(measurement)} "
+              f"(budget {budget} {measurement.unit})", file=sys.stderr)
+        failed = True
+    if baseline is not None:
+        for name, old, new in bench.compare(results, baseline, threshold):
+            print(f"Regression: {name}: {bench.format_measurement(old)} -> "
+                  f"{bench.format_measurement(new)}", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    """Run the command-line interface"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    metrics_path = getattr(args, 'metrics', None)
+    if metrics_path:
+        metrics.enable()
+    try:
+        return args.handler(args, parser)
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into `head`); stop quietly and
+        # keep the interpreter from complaining when it flushes stdout
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 0
+    finally:
+        if metrics_path:
+            try:
+                metrics.dump(metrics_path, args.metrics_format)
+            except OSError as e:
+                print(f"{parser.prog}: could not write metrics: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""Clipboard copies off the UI thread, with automatic clearing
+
+A ClipboardManager picks a backend once, on its first copy, and reuses it:
+pyperclip if installed, then a clipboard command on the PATH (wl-copy,
+xclip, xsel, pbcopy), then an in-process fallback such as TkBackend.
+Copies run on a background worker, except with backends that must stay on
+the caller's thread (Tk), which are fast anyway since they never start a
+process.
+
+After `clear_after` seconds the clipboard is emptied, but only if it still
+holds what was copied: the manager keeps a keyed hash of the value, not
+the value itself, and compares the clipboard's current text against it.
+Copying again restarts the countdown.
+
+Every copy is timed into the 'clipboard.copy' metric and its duration is
+passed to the caller's on_done callback. MemoryBackend stands in for a
+real clipboard in headless use and tests.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+import metrics
+from worker import BackgroundWorker
+
+# Seconds until a copied password is cleared; 0 keeps it
+DEFAULT_CLEAR_SECONDS = 30
+CLEAR_ENV = 'PASSWORD_CLIPBOARD_CLEAR'
+
+# Clipboard commands tried in order: (name, copy command, paste command,
+# environment variable that must be set for it to work, if any)
+COMMANDS = (
+    ('wl-clipboard', ['wl-copy'], ['wl-paste', '--no-newline'], 'WAYLAND_DISPLAY'),
+    ('xclip', ['xclip', '-selection', 'clipboard'],
+     ['xclip', '-selection', 'clipboard', '-o'], 'DISPLAY'),
+    ('xsel', ['xsel', '--clipboard', '--input'], ['xsel', '--clipboard', '--output'], 'DISPLAY'),
+    ('pbcopy', ['pbcopy'], ['pbpaste'], None),
+)
+# Seconds a clipboard command may take before the copy fails
+COMMAND_TIMEOUT = 5
+
+
+class ClipboardError(Exception):
+    """Raised when the clipboard cannot be written or read"""
+
+
+class PyperclipBackend:
+    """The pyperclip package, which picks its own platform mechanism once"""
+
+    name = 'pyperclip'
+    thread_safe = True
+
+    def __init__(self, pyperclip):
+        self._pyperclip = pyperclip
+
+    def copy(self, text):
+        try:
+            self._pyperclip.copy(text)
+        except self._pyperclip.PyperclipException as e:
+            raise ClipboardError(str(e)) from e
+
+    def paste(self):
+        try:
+            return self._pyperclip.paste()
+        except self._pyperclip.PyperclipException as e:
+            raise ClipboardError(str(e)) from e
+
+
+class CommandBackend:
+    """A clipboard command such as xclip, run once per copy or paste"""
+
+    thread_safe = True
+
+    def __init__(self, name, copy_args, paste_args):
+        # Imported only for this backend; it is a noticeable part of GUI startup
+        import subprocess
+        self._subprocess = subprocess
+        self.name = name
+        self.copy_args = copy_args
+        self.paste_args = paste_args
+
+    def copy(self, text):
+        # Output is discarded rather than captured: xclip and wl-copy leave a
+        # child running to serve the selection, which would hold a pipe open
+        subprocess = self._subprocess
+        try:
+            subprocess.run(self.copy_args, input=text.encode('utf-8'), check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           timeout=COMMAND_TIMEOUT)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise ClipboardError(f"{self.name} failed: {e}") from e
+
+    def paste(self):
+        subprocess = self._subprocess
+        try:
+            result = subprocess.run(self.paste_args, capture_output=True, check=True,
+                                    timeout=COMMAND_TIMEOUT)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise ClipboardError(f"{self.name} failed: {e}") from e
+        return result.stdout.decode('utf-8', 'replace')
+
+
+class TkBackend:
+    """The Tk clipboard; only usable from the thread running the Tk event loop"""
+
+    name = 'tk'
+    thread_safe = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def copy(self, text):
+        self.root.clipboard_clear()
+        self.root.clipboard_append(text)
+
+    def paste(self):
+        try:
+            return self.root.clipboard_get()
+        except Exception:
+            # TclError: the clipboard is empty or holds something other than text
+            return ''
+
+
+class MemoryBackend:
+    """An in-memory clipboard for headless use and tests
+
+    `delay` seconds are slept in every copy to mimic a slow backend.
+    """
+
+    name = 'memory'
+    thread_safe = True
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.text = ''
+        self.copies = 0
+
+    def copy(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        self.text = text
+        self.copies += 1
+
+    def paste(self):
+        return self.text
+
+
+def detect_backend(fallback=None):
+    """The first usable backend: pyperclip, a clipboard command, then `fallback`"""
+    try:
+        import pyperclip
+    except ImportError:
+        pass
+    else:
+        return PyperclipBackend(pyperclip)
+    for name, copy_args, paste_args, needs in COMMANDS:
+        if (needs is None or os.environ.get(needs)) and shutil.which(copy_args[0]):
+            return CommandBackend(name, copy_args, paste_args)
+    if fallback is None:
+        raise ClipboardError("No clipboard available; install pyperclip, xclip or xsel")
+    return fallback
+
+
+def default_clear_seconds():
+    """Auto-clear delay from CLEAR_ENV, or DEFAULT_CLEAR_SECONDS"""
+    value = os.environ.get(CLEAR_ENV)
+    if not value:
+        return DEFAULT_CLEAR_SECONDS
+    try:
+        seconds = float(value)
+    except ValueError:
+        raise ClipboardError(f"{CLEAR_ENV} must be a number of seconds") from None
+    if seconds < 0:
+        raise ClipboardError(f"{CLEAR_ENV} must not be negative")
+    return seconds
+
+
+class ClipboardManager:
+    """Copies on a background worker and clears copied secrets after a delay
+
+    Callbacks run from dispatch(), which the owner calls from its own thread
+    (the GUI polls it alongside its main worker), or straight away with a
+    backend that is not thread-safe. `schedule(seconds, func)`
+    arranges for func to run later on that thread; by default a timer
+    thread is used. `fallback` is the backend used when no other is found.
+    """
+
+    def __init__(self, backend=None, fallback=None, clear_after=DEFAULT_CLEAR_SECONDS,
+                 schedule=None):
+        self.backend = backend
+        self.fallback = fallback
+        self.clear_after = clear_after
+        self._schedule = schedule or self._schedule_timer
+        self._worker = BackgroundWorker('clipboard')
+        # Keyed so the digest reveals nothing about a short password
+        self._key = os.urandom(32)
+        self._copied = None
+        self._generation = 0
+        self._timers = []
+
+    def _digest(self, text):
+        return hashlib.blake2b(text.encode('utf-8'), key=self._key).digest()
+
+    def _schedule_timer(self, seconds, func):
+        timer = threading.Timer(seconds, func)
+        timer.daemon = True
+        timer.start()
+        self._timers = [t for t in self._timers if t.is_alive()] + [timer]
+
+    def _run(self, task, on_done, on_error):
+        """Run a backend task on the worker, or right here if the backend needs it"""
+        if self.backend.thread_safe:
+            return self._worker.submit(lambda job: task(), on_done, on_error)
+        try:
+            result = task()
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(e)
+        else:
+            if on_done is not None:
+                on_done(result)
+        return None
+
+    def copy(self, text, on_done=None, on_error=None):
+        """Put `text` on the clipboard; on_done(seconds taken) runs from dispatch()"""
+        if self.backend is None:
+            self.backend = detect_backend(self.fallback)
+        self._generation += 1
+        generation = self._generation
+        digest = self._digest(text)
+
+        def task():
+            started = metrics.now()
+            with metrics.timer('clipboard.copy'):
+                self.backend.copy(text)
+            self._copied = digest
+            return metrics.now() - started
+
+        job = self._run(task, on_done, on_error)
+        if self.clear_after:
+            self._schedule(self.clear_after, lambda: self._expire(generation))
+        return job
+
+    def _expire(self, generation):
+        """Clear the clipboard when this copy's delay is up, unless a newer copy owns it"""
+        if generation == self._generation:
+            self._run(self._clear_if_ours, None, lambda e: None)
+
+    def _clear_if_ours(self):
+        """Empty the clipboard if it still holds the last copied value"""
+        copied, self._copied = self._copied, None
+        if copied is None:
+            return False
+        if self._digest(self.backend.paste()) != copied:
+            return False
+        with metrics.timer('clipboard.clear'):
+            self.backend.copy('')
+        return True
+
+    def holds_copy(self):
+        """Whether the clipboard still holds the last copied value (reads the clipboard)"""
+        return (self._copied is not None and self.backend is not None
+                and self._digest(self.backend.paste()) == self._copied)
+
+    def dispatch(self):
+        """Run callbacks for finished copies; returns how many ran"""
+        return self._worker.dispatch()
+
+    def close(self, clear=True):
+        """Stop the worker, first clearing a copy still waiting to be auto-cleared if `clear`"""
+        for timer in self._timers:
+            timer.cancel()
+        self._generation += 1
+        if clear and self.clear_after and self.backend is not None:
+            if self.backend.thread_safe:
+                # Queued behind any copy still running, which sets what is checked
+                self._worker.submit(lambda job: self._clear_if_ours(), on_error=lambda e: None)
+            elif self._copied is not None:
+                try:
+                    self._clear_if_ours()
+                except Exception:
+                    # The clipboard may be gone already, e.g. with the Tk window
+                    pass
+        self._worker.close()
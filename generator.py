@@ -0,0 +1,349 @@
+"""Headless password generation engine used by the GUI and batch tools"""
+import os
+import string
+from array import array
+from functools import lru_cache
+from itertools import product
+
+import metrics
+from secure import urandom_into, wipe
+
+SYMBOLS = "!@#$%^&*()_+-=[]{}|;:,.<>?"
+AMBIGUOUS = "0O1lI"
+
+# Character sets used by pronounceable passwords
+CONSONANTS = "bcdfghjklmnpqrstvwxyz"
+VOWELS = "aeiou"
+PRONOUNCEABLE_NUMBERS = "0123456789"
+PRONOUNCEABLE_SYMBOLS = "!@#$%"
+
+# Syllable shapes for pronounceable passwords ('C' consonant, 'V' vowel).
+# The default alternates consonants and vowels; the natural set reads more
+# like real words.
+DEFAULT_SYLLABLE_TEMPLATES = ("CV",)
+NATURAL_SYLLABLE_TEMPLATES = ("CV", "CVC", "VC", "CVV")
+
+MIN_LENGTH = 1
+MAX_LENGTH = 4096
+
+# Passwords generated per CSPRNG read when streaming large jobs
+DEFAULT_BATCH_SIZE = 10000
+
+# Largest block of random bytes drawn at once by secure generation
+SECURE_DRAW_SIZE = 1 << 16
+
+# Consecutive top-up rounds without one accepted password before giving up
+MAX_REJECT_ROUNDS = 100
+
+
+@lru_cache(maxsize=None)
+def build_alphabet(lowercase=True, uppercase=True, numbers=True, symbols=True,
+                   exclude_ambiguous=False):
+    """Build the character set for a combination of options (cached)"""
+    chars = ""
+
+    if lowercase:
+        chars += string.ascii_lowercase
+    if uppercase:
+        chars += string.ascii_uppercase
+    if numbers:
+        chars += string.digits
+    if symbols:
+        chars += SYMBOLS
+
+    if exclude_ambiguous:
+        chars = ''.join(c for c in chars if c not in AMBIGUOUS)
+
+    return chars
+
+
+@lru_cache(maxsize=None)
+def _index_tables(size):
+    """Build the byte translation tables that map random bytes to range(size)"""
+    if not 0 < size <= 256:
+        raise ValueError("Size must be between 1 and 256")
+
+    # Bytes at or above `limit` would favour small values (modulo bias),
+    # so they are rejected instead of mapped
+    limit = 256 - 256 % size
+    table = bytes(b % size if b < limit else 0 for b in range(256))
+    rejected = bytes(range(limit, 256))
+    return table, rejected, limit
+
+
+@lru_cache(maxsize=None)
+def _sampling_tables(alphabet):
+    """Build the byte translation tables used to sample from an alphabet"""
+    table, rejected, limit = _index_tables(len(alphabet))
+    codes = alphabet.encode('ascii')
+    return bytes(codes[i] for i in table), rejected, limit
+
+
+@lru_cache(maxsize=None)
+def _capitalize_tables():
+    """Build tables mapping random bytes to a 30% chance of a 0x20 case offset"""
+    # 250 is the largest multiple of 10 below 256; the remainder is rejected
+    table = bytes(0x20 if b < 250 and b % 10 < 3 else 0 for b in range(256))
+    return table, bytes(range(250, 256)), 250
+
+
+def _draw(tables, k):
+    """Read random bytes and translate them through rejection tables to `k` bytes"""
+    table, rejected, limit = tables
+    chunks = []
+    remaining = k
+
+    while remaining > 0:
+        # Over-read by the expected rejection rate so one pass is usually enough
+        block = os.urandom(remaining * 256 // limit + 64)
+        chunk = block.translate(table, rejected)[:remaining]
+        chunks.append(chunk)
+        remaining -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def _draw_into(tables, out):
+    """Fill the bytearray `out` like _draw(), wiping every intermediate buffer
+
+    Random bytes are read at most SECURE_DRAW_SIZE at a time, so the
+    scratch stays small however large `out` is.
+    """
+    table, rejected, limit = tables
+    filled = 0
+    while filled < len(out):
+        raw = bytearray(min((len(out) - filled) * 256 // limit + 64, SECURE_DRAW_SIZE))
+        urandom_into(raw)
+        chunk = raw.translate(table, rejected)
+        wipe(raw)
+        taken = min(len(chunk), len(out) - filled)
+        out[filled:filled + taken] = memoryview(chunk)[:taken]
+        wipe(chunk)
+        filled += taken
+
+
+def sample(alphabet, k):
+    """Draw `k` characters uniformly from an ASCII alphabet using the OS CSPRNG
+
+    Random bytes are read in one large block and mapped onto the alphabet
+    with `bytes.translate`, rejecting the biased tail of the byte range.
+    """
+    return _draw(_sampling_tables(alphabet), k).decode('ascii')
+
+
+def random_indices(size, k):
+    """Draw `k` integers uniformly from range(size) using the OS CSPRNG"""
+    if size <= 256:
+        return _draw(_index_tables(size), k)
+    if size > 0x10000:
+        raise ValueError("Size must be at most 65536")
+
+    # Two bytes per value; same rejection scheme as the single-byte tables
+    limit = 0x10000 - 0x10000 % size
+    indices = []
+    while len(indices) < k:
+        needed = k - len(indices)
+        words = array('H', os.urandom(2 * (needed * 0x10000 // limit + 16)))
+        indices.extend(w % size for w in words if w < limit)
+    del indices[k:]
+    return indices
+
+
+@lru_cache(maxsize=None)
+def build_syllable_tables(templates=DEFAULT_SYLLABLE_TEMPLATES):
+    """Expand syllable templates ('C' consonant, 'V' vowel) into syllable tables"""
+    if not templates:
+        raise ValueError("At least one syllable template is required")
+
+    letters = {'C': CONSONANTS, 'V': VOWELS}
+    tables = []
+    for template in templates:
+        if not template or set(template) - set(letters):
+            raise ValueError(f"Invalid syllable template: {template!r}")
+        syllables = [''.join(parts) for parts in product(*(letters[c] for c in template))]
+        if len(syllables) > 0x10000:
+            raise ValueError(f"Syllable template too long: {template!r}")
+        tables.append(tuple(syllables))
+    return tuple(tables)
+
+
+def _draw_syllables(tables, n):
+    """Draw `n` syllables: a template uniformly, then a syllable from its table"""
+    if len(tables) == 1:
+        table = tables[0]
+        return list(map(table.__getitem__, random_indices(len(table), n)))
+
+    choices = random_indices(len(tables), n)
+    streams = [
+        map(table.__getitem__, random_indices(len(table), choices.count(t)))
+        for t, table in enumerate(tables)
+    ]
+    return [next(streams[t]) for t in choices]
+
+
+class BatchGenerator:
+    """Batch, streaming and rejection helpers shared by password sources
+
+    Subclasses implement _generate_batch(count).
+    """
+
+    def generate(self, reject=None):
+        """Generate a single password"""
+        return self.generate_batch(1, reject)[0]
+
+    def generate_batch(self, count, reject=None):
+        """Generate a list of `count` passwords
+
+        If `reject` is given, passwords for which it returns true (e.g. ones
+        issued before) are replaced with fresh ones.
+        """
+        started = metrics.now() if metrics.enabled else 0.0
+        passwords = self._generate_batch(count)
+        if reject is not None:
+            passwords = self.replace_rejected(passwords, reject)
+        if started:
+            metrics.record('generate', started, count)
+        return passwords
+
+    def replace_rejected(self, passwords, reject):
+        """Drop the passwords `reject` flags and top the list back up"""
+        kept = [password for password in passwords if not reject(password)]
+        fruitless = 0
+        while len(kept) < len(passwords):
+            before = len(kept)
+            kept.extend(password for password in self._generate_batch(len(passwords) - before)
+                        if not reject(password))
+            fruitless = fruitless + 1 if len(kept) == before else 0
+            if fruitless >= MAX_REJECT_ROUNDS:
+                raise ValueError("Could not generate enough acceptable passwords; "
+                                 "try a longer length or more character types")
+        return kept
+
+    def iter_batches(self, count, batch_size=DEFAULT_BATCH_SIZE, reject=None):
+        """Yield `count` passwords as successive lists of at most `batch_size`"""
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+
+        remaining = count
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            yield self.generate_batch(size, reject)
+            remaining -= size
+
+
+class PasswordGenerator(BatchGenerator):
+    """Generate passwords for one fixed set of options, without any GUI"""
+
+    def __init__(self, length=16, lowercase=True, uppercase=True, numbers=True,
+                 symbols=True, exclude_ambiguous=False, pronounceable=False,
+                 syllable_templates=DEFAULT_SYLLABLE_TEMPLATES):
+        if not MIN_LENGTH <= length <= MAX_LENGTH:
+            raise ValueError(f"Length must be between {MIN_LENGTH} and {MAX_LENGTH}")
+
+        self.length = length
+        self.lowercase = lowercase
+        self.uppercase = uppercase
+        self.numbers = numbers
+        self.symbols = symbols
+        self.exclude_ambiguous = exclude_ambiguous
+        self.pronounceable = pronounceable
+        self.syllable_templates = tuple(syllable_templates)
+
+        # The alphabet is built once per option set and reused for every batch
+        self.alphabet = build_alphabet(lowercase, uppercase, numbers, symbols,
+                                       exclude_ambiguous)
+        if not self.alphabet:
+            raise ValueError("Please select at least one character type!")
+
+        if pronounceable:
+            self.syllable_tables = build_syllable_tables(self.syllable_templates)
+
+    @property
+    def options(self):
+        """Option tuple identifying this generator's output"""
+        return (self.lowercase, self.uppercase, self.numbers, self.symbols,
+                self.exclude_ambiguous, self.pronounceable, self.length)
+
+    def _generate_batch(self, count):
+        """Generate `count` passwords without any filtering"""
+        if count < 0:
+            raise ValueError("Count must not be negative")
+
+        if self.pronounceable:
+            return self._generate_pronounceable_batch(count)
+
+        # Draw every character of the batch from one CSPRNG buffer, then slice it up
+        length = self.length
+        flat = sample(self.alphabet, count * length)
+        return [flat[i:i + length] for i in range(0, count * length, length)]
+
+    def generate_lines_into(self, secret, count):
+        """Generate `count` passwords as newline-terminated lines in a SecretBuffer
+
+        Returns a memoryview of the lines, valid until the buffer is used
+        again. No str is created: characters are drawn into a scratch
+        bytearray, laid out a column at a time with strided copies (no
+        per-password objects), and the scratch is wiped. Supports random
+        passwords only; pronounceable ones are built from str syllables.
+        """
+        if count < 0:
+            raise ValueError("Count must not be negative")
+        if self.pronounceable:
+            raise ValueError("Secure generation supports random passwords only")
+
+        length = self.length
+        stride = length + 1
+        lines = secret.reserve(count * stride)
+        flat = bytearray(count * length)
+        started = metrics.now() if metrics.enabled else 0.0
+        try:
+            _draw_into(_sampling_tables(self.alphabet), flat)
+            columns = memoryview(flat)
+            for column in range(length):
+                lines[column::stride] = columns[column::length]
+            columns.release()
+        finally:
+            wipe(flat)
+        lines[length::stride] = b'\n' * count
+        if started:
+            metrics.record('generate.secure', started, count)
+        return lines
+
+    def _generate_pronounceable_batch(self, count):
+        """Generate a batch of pronounceable passwords
+
+        Syllables are drawn from precomputed tables, then the whole batch is
+        capitalized and given its digit/symbol substitutions in one buffer.
+        """
+        length = self.length
+        tables = self.syllable_tables
+        total = count * length
+
+        # Enough syllables per password even if every one is the shortest shape
+        per_password = -(-length // min(len(t[0]) for t in tables))
+        syllables = _draw_syllables(tables, count * per_password)
+        buffer = bytearray(''.join([
+            ''.join(syllables[i:i + per_password])[:length]
+            for i in range(0, count * per_password, per_password)
+        ]), 'ascii')
+
+        # Capitalize ~30% of letters: every byte is a lowercase letter here, so
+        # subtracting a 0/0x20 mask as one big integer never borrows
+        if self.uppercase and total:
+            mask = _draw(_capitalize_tables(), total)
+            buffer[:] = (int.from_bytes(buffer, 'big') - int.from_bytes(mask, 'big')).to_bytes(total, 'big')
+
+        # Add a number and a symbol at random positions
+        substitutions = []
+        if self.numbers and length > 4:
+            substitutions.append(PRONOUNCEABLE_NUMBERS.encode('ascii'))
+        if self.symbols and length > 6:
+            substitutions.append(PRONOUNCEABLE_SYMBOLS.encode('ascii'))
+        for chars in substitutions:
+            positions = random_indices(length, count)
+            picks = random_indices(len(chars), count)
+            for start, pos, pick in zip(range(0, total, length), positions, picks):
+                buffer[start + pos] = chars[pick]
+
+        flat = buffer.decode('ascii')
+        return [flat[i:i + length] for i in range(0, total, length)]
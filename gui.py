@@ -0,0 +1,1076 @@
+"""Tk user interface; started by main.py when it is run without a command"""
+import tkinter as tk
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import os
+from datetime import datetime
+from itertools import islice
+
+from breach import BreachCorpusError, open_default_corpus
+from clipboard import (
+    DEFAULT_CLEAR_SECONDS,
+    ClipboardError,
+    ClipboardManager,
+    TkBackend,
+    default_clear_seconds,
+)
+from generator import PasswordGenerator
+from history import DEFAULT_HISTORY_PATH, HistoryError, HistoryStore, default_retention
+import metrics
+from passphrase import PassphraseGenerator, default_wordlist_path
+from policy import policy_for_options
+from pool import PasswordPool
+from reuse import SEEN_SUFFIX, ReuseIndex, reuse_key
+from secure import secure_mode_enabled
+from strength import generator_strength, score_password
+from vault import HistoryCipher, VaultError, key_path
+from worker import BackgroundWorker
+
+# History entries loaded into the listbox at a time; older pages load on scroll
+HISTORY_PAGE_SIZE = 50
+# Load the next page once the view is scrolled past this fraction
+HISTORY_PREFETCH_AT = 0.9
+
+# How often the UI picks up results from the background worker
+WORKER_POLL_MS = 30
+# "Generate N" limits; passwords are produced and written in batches of this size
+BULK_MAX_COUNT = 1000000
+BULK_BATCH_SIZE = 1000
+# Ready-made passwords kept per option set, so "Generate" returns at once
+POOL_SIZE = 32
+POOL_OPTION_SETS = 4
+# History row shown in place of the password in secure mode
+MASKED_PASSWORD = '••••••••'
+# How often an open stats panel is refreshed
+STATS_REFRESH_MS = 1000
+
+# Color schemes for the two themes
+THEMES = {
+    'dark': {
+        'bg': '#1a1a2e',
+        'secondary_bg': '#16213e',
+        'accent': '#e94560',
+        'text': '#ffffff',
+        'secondary_text': '#a0a0a0',
+        'success': '#0f3460',
+        'button_bg': '#0f3460',
+        'button_hover': '#e94560'
+    },
+    'light': {
+        'bg': '#f8f9fa',
+        'secondary_bg': '#ffffff',
+        'accent': '#e94560',
+        'text': '#2c3e50',
+        'secondary_text': '#6c757d',
+        'success': '#28a745',
+        'button_bg': '#007bff',
+        'button_hover': '#0056b3'
+    }
+}
+
+# Font descriptions; Tk resolves them when a widget first uses them
+TITLE_FONT = ("Helvetica", 24, "bold")
+SUBTITLE_FONT = ("Helvetica", 12)
+BUTTON_FONT = ("Helvetica", 11, "bold")
+PASSWORD_FONT = ("Courier", 14, "bold")
+
+class HistoryLocked(Exception):
+    """Raised when the user declines to unlock an encrypted history"""
+
+
+class ModernPasswordGenerator:
+    def __init__(self):
+        self.root = tk.Tk()
+        self.root.title("✨ Amazing Password Generator ✨")
+        self.root.geometry("800x600")
+        self.root.configure(bg='#1a1a2e')
+        self.root.resizable(False, False)
+        
+        # Initialize variables
+        self.dark_mode = tk.BooleanVar(value=True)
+        self.password_history = []  # loaded entries, newest first, one per listbox row
+        self.history_cursor = None
+        self.history_page_pending = False
+        self.current_strength = None
+        # The displayed password; copy and save use it rather than reading
+        # a new str back out of the Tk variable each time
+        self.current_password = None
+        # Secure mode keeps no ready-made or history passwords in memory
+        self.secure_mode = secure_mode_enabled()
+        self.bulk_job = None
+        self.stats_window = None
+        # Timings for the stats panel are opt-in: from startup with METRICS_ENV,
+        # otherwise from when the panel is first opened
+        if metrics.requested():
+            metrics.enable()
+        # Generation, scoring and history writes run here, off the Tk event loop
+        self.worker = BackgroundWorker()
+        # Bulk runs get their own thread so Generate and saves never queue
+        # behind them; they only read the reuse index and breach corpus
+        self.bulk_worker = BackgroundWorker(name='bulk-worker')
+        self.password_pool = PasswordPool(POOL_SIZE, max_option_sets=POOL_OPTION_SETS)
+        self.clipboard = self.create_clipboard()
+        self.history_store = None
+        self.reuse_index = None
+        self.breach_corpus = None
+        self.wordlist_path = default_wordlist_path()
+        
+        # Configure styles
+        self.setup_styles()
+        
+        # Create main interface
+        self.create_interface()
+        
+        # Load initial theme
+        self.toggle_theme()
+        
+        self.root.after(WORKER_POLL_MS, self.poll_worker)
+        # The rest waits until the window is on screen: the first idle pass
+        # lays out and draws it, then the zero-delay timer runs finish_startup
+        self.root.after_idle(self.root.after, 0, self.finish_startup)
+    
+    def finish_startup(self):
+        """Open the breach corpus, add the history panel and load history after first paint"""
+        self.breach_corpus = self.open_breach_corpus()
+        self.create_history_section(self.main_frame)
+        self.load_history()
+    
+    def setup_styles(self):
+        """Setup custom styles for modern look"""
+        self.style = ttk.Style()
+        self.style.theme_use('clam')
+        self.themes = THEMES
+        self.title_font = TITLE_FONT
+        self.subtitle_font = SUBTITLE_FONT
+        self.button_font = BUTTON_FONT
+        self.password_font = PASSWORD_FONT
+    
+    def create_interface(self):
+        """Create the beautiful main interface"""
+        # Main container with padding
+        main_frame = tk.Frame(self.root, bg=self.root['bg'])
+        main_frame.pack(expand=True, fill='both', padx=30, pady=20)
+        self.main_frame = main_frame
+        
+        # Header
+        self.create_header(main_frame)
+        
+        # Password options section
+        self.create_options_section(main_frame)
+        
+        # Password length section
+        self.create_length_section(main_frame)
+        
+        # Generated password section
+        self.create_password_section(main_frame)
+        
+        # Action buttons
+        self.create_action_buttons(main_frame)
+        
+        # Password strength indicator
+        self.create_strength_indicator(main_frame)
+        
+        # The history section is added by finish_startup()
+    
+    def create_header(self, parent):
+        """Create beautiful header with title and theme toggle"""
+        header_frame = tk.Frame(parent, bg=parent['bg'])
+        header_frame.pack(fill='x', pady=(0, 30))
+        
+        # Title
+        title_label = tk.Label(
+            header_frame,
+            text="🔐 Amazing Password Generator",
+            font=self.title_font,
+            bg=parent['bg'],
+            fg='#ffffff'
+        )
+        title_label.pack(side='left')
+        
+        # Theme toggle button
+        self.theme_btn = tk.Button(
+            header_frame,
+            text="🌙" if self.dark_mode.get() else "☀️",
+            font=("Helvetica", 16),
+            bg='#e94560',
+            fg='white',
+            border=0,
+            pady=8,
+            padx=15,
+            cursor='hand2',
+            command=self.toggle_theme
+        )
+        self.theme_btn.pack(side='right')
+        
+        # Stats panel button
+        tk.Button(
+            header_frame,
+            text="📊",
+            font=("Helvetica", 16),
+            bg='#0f3460',
+            fg='white',
+            border=0,
+            pady=8,
+            padx=15,
+            cursor='hand2',
+            command=self.show_stats
+        ).pack(side='right', padx=(0, 10))
+        
+        # Subtitle
+        subtitle_label = tk.Label(
+            parent,
+            text="Generate secure, customizable passwords with beautiful design",
+            font=self.subtitle_font,
+            bg=parent['bg'],
+            fg='#a0a0a0'
+        )
+        subtitle_label.pack(anchor='w', pady=(0, 20))
+    
+    def create_options_section(self, parent):
+        """Create password options with beautiful checkboxes"""
+        options_frame = tk.LabelFrame(
+            parent,
+            text="Password Options",
+            font=self.subtitle_font,
+            bg=parent['bg'],
+            fg='#ffffff',
+            bd=2,
+            relief='groove'
+        )
+        options_frame.pack(fill='x', pady=(0, 20))
+        
+        # Create a grid for options
+        options_grid = tk.Frame(options_frame, bg=options_frame['bg'])
+        options_grid.pack(padx=20, pady=15)
+        
+        # Initialize option variables
+        self.include_lowercase = tk.BooleanVar(value=True)
+        self.include_uppercase = tk.BooleanVar(value=True)
+        self.include_numbers = tk.BooleanVar(value=True)
+        self.include_symbols = tk.BooleanVar(value=True)
+        self.exclude_ambiguous = tk.BooleanVar(value=False)
+        self.pronounceable = tk.BooleanVar(value=False)
+        self.passphrase = tk.BooleanVar(value=False)
+        
+        # Create styled checkboxes
+        options = [
+            ("🔤 Lowercase Letters", self.include_lowercase),
+            ("🔠 Uppercase Letters", self.include_uppercase),
+            ("🔢 Numbers", self.include_numbers),
+            ("🔣 Symbols", self.include_symbols),
+            ("❌ Exclude Ambiguous (0,O,l,1)", self.exclude_ambiguous),
+            ("🗣️ Pronounceable", self.pronounceable)
+        ]
+        # Passphrases need a wordlist, configured through the environment
+        if self.wordlist_path:
+            options.append(("📖 Passphrase (6 words)", self.passphrase))
+        
+        for i, (text, var) in enumerate(options):
+            cb = tk.Checkbutton(
+                options_grid,
+                text=text,
+                variable=var,
+                font=("Helvetica", 10),
+                bg=options_grid['bg'],
+                fg='#ffffff',
+                selectcolor='#e94560',
+                activebackground=options_grid['bg'],
+                activeforeground='#ffffff',
+                cursor='hand2'
+            )
+            cb.grid(row=i//2, column=i%2, sticky='w', padx=10, pady=5)
+    
+    def create_length_section(self, parent):
+        """Create password length section with slider"""
+        length_frame = tk.LabelFrame(
+            parent,
+            text="Password Length",
+            font=self.subtitle_font,
+            bg=parent['bg'],
+            fg='#ffffff',
+            bd=2,
+            relief='groove'
+        )
+        length_frame.pack(fill='x', pady=(0, 20))
+        
+        length_container = tk.Frame(length_frame, bg=length_frame['bg'])
+        length_container.pack(padx=20, pady=15)
+        
+        # Length slider
+        self.length_var = tk.IntVar(value=16)
+        self.length_label = tk.Label(
+            length_container,
+            text=f"Length: {self.length_var.get()} characters",
+            font=("Helvetica", 11),
+            bg=length_container['bg'],
+            fg='#ffffff'
+        )
+        self.length_label.pack(anchor='w')
+        
+        self.length_scale = tk.Scale(
+            length_container,
+            from_=4,
+            to=128,
+            orient='horizontal',
+            variable=self.length_var,
+            bg='#0f3460',
+            fg='#ffffff',
+            troughcolor='#16213e',
+            activebackground='#e94560',
+            highlightthickness=0,
+            command=self.update_length_label
+        )
+        self.length_scale.pack(fill='x', pady=(5, 0))
+    
+    def create_password_section(self, parent):
+        """Create generated password display section"""
+        password_frame = tk.LabelFrame(
+            parent,
+            text="Generated Password",
+            font=self.subtitle_font,
+            bg=parent['bg'],
+            fg='#ffffff',
+            bd=2,
+            relief='groove'
+        )
+        password_frame.pack(fill='x', pady=(0, 20))
+        
+        password_container = tk.Frame(password_frame, bg=password_frame['bg'])
+        password_container.pack(padx=20, pady=15, fill='x')
+        
+        # Password display with copy button
+        password_display_frame = tk.Frame(password_container, bg=password_container['bg'])
+        password_display_frame.pack(fill='x')
+        
+        self.password_var = tk.StringVar(value="Click 'Generate' to create a password")
+        self.password_entry = tk.Entry(
+            password_display_frame,
+            textvariable=self.password_var,
+            font=self.password_font,
+            bg='#16213e',
+            fg='#ffffff',
+            insertbackground='#ffffff',
+            relief='flat',
+            bd=10,
+            state='readonly'
+        )
+        self.password_entry.pack(side='left', fill='x', expand=True, padx=(0, 10))
+        
+        self.copy_btn = tk.Button(
+            password_display_frame,
+            text="📋 Copy",
+            font=self.button_font,
+            bg='#e94560',
+            fg='white',
+            border=0,
+            pady=10,
+            padx=20,
+            cursor='hand2',
+            command=self.copy_password
+        )
+        self.copy_btn.pack(side='right')
+    
+    def create_action_buttons(self, parent):
+        """Create main action buttons"""
+        button_frame = tk.Frame(parent, bg=parent['bg'])
+        button_frame.pack(fill='x', pady=(0, 20))
+        
+        # Generate button (main CTA)
+        self.generate_btn = tk.Button(
+            button_frame,
+            text="✨ Generate Amazing Password",
+            font=("Helvetica", 14, "bold"),
+            bg='#e94560',
+            fg='white',
+            border=0,
+            pady=15,
+            cursor='hand2',
+            command=self.generate_password
+        )
+        self.generate_btn.pack(fill='x', pady=(0, 10))
+        
+        # Secondary buttons row
+        secondary_frame = tk.Frame(button_frame, bg=button_frame['bg'])
+        secondary_frame.pack(fill='x')
+        
+        self.clear_btn = tk.Button(
+            secondary_frame,
+            text="🗑️ Clear",
+            font=self.button_font,
+            bg='#6c757d',
+            fg='white',
+            border=0,
+            pady=8,
+            padx=20,
+            cursor='hand2',
+            command=self.clear_password
+        )
+        self.clear_btn.pack(side='left', padx=(0, 10))
+        
+        self.save_btn = tk.Button(
+            secondary_frame,
+            text="💾 Save to History",
+            font=self.button_font,
+            bg='#28a745',
+            fg='white',
+            border=0,
+            pady=8,
+            padx=20,
+            cursor='hand2',
+            command=self.save_to_history
+        )
+        self.save_btn.pack(side='left')
+        
+        # Bulk generation row: count, start/cancel button and progress bar
+        bulk_frame = tk.Frame(button_frame, bg=button_frame['bg'])
+        bulk_frame.pack(fill='x', pady=(10, 0))
+        
+        self.bulk_count_var = tk.IntVar(value=1000)
+        tk.Spinbox(
+            bulk_frame,
+            from_=1,
+            to=BULK_MAX_COUNT,
+            increment=1000,
+            textvariable=self.bulk_count_var,
+            width=9,
+            font=self.button_font
+        ).pack(side='left', padx=(0, 10))
+        
+        self.bulk_btn = tk.Button(
+            bulk_frame,
+            text="📦 Generate N to File",
+            font=self.button_font,
+            bg='#0f3460',
+            fg='white',
+            border=0,
+            pady=8,
+            padx=20,
+            cursor='hand2',
+            command=self.generate_bulk
+        )
+        self.bulk_btn.pack(side='left', padx=(0, 10))
+        
+        self.bulk_progress = ttk.Progressbar(bulk_frame, mode='determinate', maximum=1)
+        self.bulk_progress.pack(side='left', fill='x', expand=True)
+    
+    def create_strength_indicator(self, parent):
+        """Create password strength indicator"""
+        strength_frame = tk.Frame(parent, bg=parent['bg'])
+        strength_frame.pack(fill='x', pady=(0, 20))
+        
+        strength_label = tk.Label(
+            strength_frame,
+            text="Password Strength:",
+            font=("Helvetica", 10),
+            bg=parent['bg'],
+            fg='#ffffff'
+        )
+        strength_label.pack(anchor='w')
+        
+        # Strength indicator bars
+        self.strength_bars_frame = tk.Frame(strength_frame, bg=parent['bg'])
+        self.strength_bars_frame.pack(fill='x', pady=(5, 0))
+        
+        self.strength_bars = []
+        for i in range(5):
+            bar = tk.Frame(
+                self.strength_bars_frame,
+                bg='#16213e',
+                height=8,
+                width=100
+            )
+            bar.pack(side='left', fill='x', expand=True, padx=(0, 2 if i < 4 else 0))
+            self.strength_bars.append(bar)
+        
+        self.strength_text = tk.Label(
+            strength_frame,
+            text="",
+            font=("Helvetica", 9),
+            bg=parent['bg'],
+            fg='#a0a0a0'
+        )
+        self.strength_text.pack(anchor='w', pady=(5, 0))
+    
+    def create_history_section(self, parent):
+        """Create password history section"""
+        history_frame = tk.LabelFrame(
+            parent,
+            text="Password History",
+            font=self.subtitle_font,
+            bg=parent['bg'],
+            fg='#ffffff',
+            bd=2,
+            relief='groove'
+        )
+        history_frame.pack(fill='both', expand=True)
+        
+        # History listbox with scrollbar
+        history_container = tk.Frame(history_frame, bg=history_frame['bg'])
+        history_container.pack(fill='both', expand=True, padx=20, pady=15)
+        
+        self.history_listbox = tk.Listbox(
+            history_container,
+            bg='#16213e',
+            fg='#ffffff',
+            selectbackground='#e94560',
+            font=("Courier", 10),
+            relief='flat',
+            bd=5
+        )
+        self.history_listbox.pack(side='left', fill='both', expand=True)
+        
+        scrollbar = tk.Scrollbar(history_container, bg='#0f3460')
+        scrollbar.pack(side='right', fill='y')
+        
+        self.history_scrollbar = scrollbar
+        self.history_listbox.config(yscrollcommand=self.on_history_scroll)
+        scrollbar.config(command=self.history_listbox.yview)
+        
+        # Bind double-click to copy
+        self.history_listbox.bind('<Double-1>', self.copy_from_history)
+    
+    def generate_password(self):
+        """Generate a new password with selected options"""
+        try:
+            generator = self.create_generator()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        
+        def task(job):
+            # Never offer a password that is already in the history or breached
+            if self.secure_mode:
+                password = generator.generate_batch(1, self.is_rejected)[0]
+            else:
+                password = self.password_pool.take(generator, reject=self.is_rejected)
+            # Strength is known from the options, no need to scan the password
+            return password, generator_strength(generator), self.is_breached(password)
+        
+        self.worker.submit(task, on_done=self.show_generated, on_error=self.show_error)
+        self.animate_generation()
+    
+    def show_generated(self, result):
+        """Display a password produced by the background worker"""
+        password, strength, breached = result
+        self.current_password = password
+        self.password_var.set(password)
+        self.update_strength_indicator(password, strength, breached)
+    
+    def show_error(self, error):
+        """Report an error raised by a background job"""
+        messagebox.showerror("Error", str(error))
+    
+    def poll_worker(self):
+        """Run callbacks for finished background jobs, then poll again"""
+        try:
+            self.worker.dispatch()
+            self.bulk_worker.dispatch()
+            self.clipboard.dispatch()
+        finally:
+            self.root.after(WORKER_POLL_MS, self.poll_worker)
+    
+    def generate_bulk(self):
+        """Generate N passwords into a file in the background, or cancel a running run"""
+        if self.bulk_job is not None:
+            self.bulk_job.cancel()
+            return
+        try:
+            count = self.bulk_count_var.get()
+            if not 1 <= count <= BULK_MAX_COUNT:
+                raise ValueError(f"Count must be between 1 and {BULK_MAX_COUNT:,}")
+            generator = self.create_generator()
+        except (tk.TclError, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        
+        path = filedialog.asksaveasfilename(
+            parent=self.root,
+            title=f"Save {count:,} passwords",
+            defaultextension='.txt',
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        def batches(job):
+            done = 0
+            for batch in generator.iter_batches(count, BULK_BATCH_SIZE, reject=self.is_rejected):
+                if job.cancelled:
+                    return
+                yield batch
+                done += len(batch)
+                job.progress(done, count)
+        
+        def task(job):
+            from cli import open_output, write_passwords
+            with open_output(path) as stream:
+                return path, write_passwords(batches(job), stream)
+        
+        self.bulk_progress.config(value=0)
+        self.bulk_btn.config(text="✖ Cancel")
+        self.bulk_job = self.bulk_worker.submit(task, on_done=self.bulk_finished,
+                                                on_error=self.bulk_failed,
+                                                on_progress=self.show_bulk_progress)
+    
+    def show_bulk_progress(self, done, total):
+        """Advance the bulk generation progress bar"""
+        self.bulk_progress.config(value=done / total)
+    
+    def bulk_finished(self, result):
+        """Report the outcome of a bulk generation run"""
+        path, written = result
+        self.reset_bulk()
+        messagebox.showinfo("Generate N", f"Saved {written:,} passwords to {path}")
+    
+    def bulk_failed(self, error):
+        """Report a bulk generation run that raised an error"""
+        self.reset_bulk()
+        self.show_error(error)
+    
+    def reset_bulk(self):
+        """Return the bulk controls to their idle state"""
+        self.bulk_job = None
+        self.bulk_btn.config(text="📦 Generate N to File")
+        self.bulk_progress.config(value=0)
+    
+    def open_breach_corpus(self):
+        """Open the local breach corpus configured via the environment, if any"""
+        try:
+            return open_default_corpus()
+        except BreachCorpusError as e:
+            messagebox.showwarning("Breach Check", f"{e}\nBreach checking is disabled.")
+            return None
+    
+    def is_breached(self, password):
+        """Check a password against the local breach corpus"""
+        return self.breach_corpus is not None and password in self.breach_corpus
+    
+    def is_rejected(self, password):
+        """Check whether a freshly generated password must be replaced"""
+        return self.is_reused(password) or self.is_breached(password)
+    
+    def is_reused(self, password):
+        """Check whether a password was saved to history before"""
+        return self.reuse_index is not None and password in self.reuse_index
+    
+    def get_options(self):
+        """Collect the selected generation options"""
+        return {
+            'length': self.length_var.get(),
+            'lowercase': self.include_lowercase.get(),
+            'uppercase': self.include_uppercase.get(),
+            'numbers': self.include_numbers.get(),
+            'symbols': self.include_symbols.get(),
+            'exclude_ambiguous': self.exclude_ambiguous.get(),
+            'pronounceable': self.pronounceable.get()
+        }
+    
+    def create_generator(self, **overrides):
+        """Create a headless generator for the currently selected options"""
+        options = self.get_options()
+        options.update(overrides)
+        if self.passphrase.get() and not overrides:
+            return self.create_passphrase_generator(options)
+        if options.pop('pronounceable'):
+            return PasswordGenerator(pronounceable=True, **options)
+        # Random passwords always contain every selected character type
+        return policy_for_options(**options)
+    
+    def create_passphrase_generator(self, options):
+        """Create a passphrase generator; the character options pick the extras"""
+        return PassphraseGenerator(
+            self.wordlist_path,
+            capitalize='random' if options['uppercase'] else 'none',
+            digits=1 if options['numbers'] else 0
+        )
+    
+    def update_strength_indicator(self, password, strength=None, breached=None):
+        """Update password strength indicator"""
+        if strength is None:
+            strength = score_password(password)
+        if breached is None:
+            breached = self.is_breached(password)
+        if breached:
+            strength = strength._replace(score=1)
+        self.current_strength = strength
+        score = strength.score
+        
+        # Reset all bars
+        for bar in self.strength_bars:
+            bar.config(bg='#16213e')
+        
+        # Color bars based on strength
+        colors = ['#dc3545', '#fd7e14', '#ffc107', '#28a745', '#20c997']
+        strength_texts = ['Very Weak', 'Weak', 'Fair', 'Good', 'Excellent']
+        
+        for i in range(min(score, 5)):
+            self.strength_bars[i].config(bg=colors[i])
+        
+        self.strength_text.config(
+            text=f"{strength_texts[min(score-1, 4)] if score > 0 else 'Very Weak'} "
+                 f"({len(password)} characters, {strength.entropy_bits:.0f} bits)"
+                 f"{' - found in a breach corpus!' if breached else ''}"
+        )
+    
+    def animate_generation(self):
+        """Add a subtle animation effect when generating"""
+        original_text = self.generate_btn['text']
+        self.generate_btn.config(text="✨ Generating...", bg='#28a745')
+        self.root.after(500, lambda: self.generate_btn.config(
+            text=original_text, bg='#e94560'
+        ))
+    
+    def copy_password(self):
+        """Copy password to clipboard with feedback"""
+        password = self.current_password
+        if password:
+            # Feedback follows the copy, which may finish on the clipboard's own thread
+            self.clipboard.copy(password, on_done=self.show_copied, on_error=self.show_error)
+    
+    def show_copied(self, seconds):
+        """Flash the copy button once a copy has finished"""
+        self.copy_btn.config(text="✅ Copied!", bg='#28a745')
+        self.root.after(1500, lambda: self.copy_btn.config(
+            text="📋 Copy", bg='#e94560'
+        ))
+    
+    def create_clipboard(self):
+        """Clipboard manager clearing copies after $PASSWORD_CLIPBOARD_CLEAR seconds"""
+        try:
+            clear_after = default_clear_seconds()
+        except ClipboardError as e:
+            messagebox.showwarning("Clipboard", f"{e}\nUsing {DEFAULT_CLEAR_SECONDS} seconds.")
+            clear_after = DEFAULT_CLEAR_SECONDS
+        # Clears are timed by the Tk event loop, so they are safe for the Tk backend too
+        return ClipboardManager(
+            fallback=TkBackend(self.root),
+            clear_after=clear_after,
+            schedule=lambda seconds, func: self.root.after(int(seconds * 1000), func)
+        )
+    
+    def clear_password(self):
+        """Clear the generated password"""
+        self.current_password = None
+        self.password_var.set("Click 'Generate' to create a password")
+        for bar in self.strength_bars:
+            bar.config(bg='#16213e')
+        self.strength_text.config(text="")
+        self.current_strength = None
+    
+    def save_to_history(self):
+        """Save current password to history"""
+        password = self.current_password
+        if password:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            strength = self.current_strength
+            
+            def task(job):
+                if self.is_reused(password):
+                    return None
+                entry = {
+                    'password': password,
+                    'timestamp': timestamp,
+                    'length': len(password),
+                    'strength': (strength or score_password(password)).score
+                }
+                return entry if self.save_history(entry) else False
+            
+            self.worker.submit(task, on_done=self.show_saved, on_error=self.show_error)
+    
+    def show_saved(self, entry):
+        """Show a history entry saved by the background worker"""
+        if entry is None:
+            messagebox.showinfo("History", "This password is already in your history.")
+            return
+        if not entry:
+            return
+        # Only the new row is added; the rest of the view is untouched
+        self.password_history.insert(0, self.history_row_entry(entry))
+        self.history_listbox.insert(0, self.format_history_row(entry))
+        
+        # Show feedback
+        original_text = self.save_btn['text']
+        self.save_btn.config(text="✅ Saved!", bg='#28a745')
+        self.root.after(1500, lambda: self.save_btn.config(
+            text=original_text, bg='#28a745'
+        ))
+    
+    def copy_from_history(self, event):
+        """Copy selected password from history"""
+        selection = self.history_listbox.curselection()
+        if not selection:
+            return
+        index = selection[0]
+        
+        def copy(password):
+            self.clipboard.copy(
+                password,
+                on_done=lambda seconds: messagebox.showinfo(
+                    "Copied", "Password copied to clipboard!"),
+                on_error=self.show_error
+            )
+        
+        if 'password' in self.password_history[index]:
+            copy(self.password_history[index]['password'])
+        elif self.secure_mode and self.history_store is not None:
+            # Secure mode: read this one password back from the file when asked
+            store = self.history_store
+            self.worker.submit(
+                lambda job: next(islice(store.iter_newest_first(), index, None))['password'],
+                on_done=copy, on_error=self.show_error
+            )
+    
+    def load_history(self):
+        """Unlock the history, then open it on the background worker and show it"""
+        self.history_store = None
+        self.reuse_index = None
+        self.password_history = []
+        try:
+            cipher, created = self.unlock_history()
+        except HistoryLocked:
+            return
+        
+        def task(job):
+            # Saves queue behind this job, so none can see a half-open history
+            store = HistoryStore(retention=default_retention(), cipher=cipher)
+            try:
+                if created:
+                    store.encrypt_existing()
+                index = ReuseIndex(DEFAULT_HISTORY_PATH + SEEN_SUFFIX,
+                                   reuse_key(DEFAULT_HISTORY_PATH, cipher))
+            except BaseException:
+                store.close()
+                raise
+            try:
+                if index.stale:
+                    index.rebuild(entry['password'] for entry in store if 'password' in entry)
+            except BaseException:
+                index.close()
+                store.close()
+                raise
+            self.history_store = store
+            self.reuse_index = index
+            # Only an encrypted history can take in the old plaintext one
+            return store.legacy_path if cipher is not None else None
+        
+        def on_done(legacy):
+            self.load_history_display()
+            if legacy:
+                self.offer_legacy_migration(legacy)
+        
+        def on_error(error):
+            if not isinstance(error, (HistoryError, OSError)):
+                raise error
+            messagebox.showwarning("History", f"{error}\nPassword history is disabled.")
+        
+        self.worker.submit(task, on_done=on_done, on_error=on_error)
+    
+    def offer_legacy_migration(self, legacy):
+        """Offer to copy the old plaintext history in, then to delete it once that worked"""
+        if not messagebox.askyesno(
+                "History",
+                f"Found your old history file {legacy}.\n"
+                "Add its passwords to your encrypted history?"):
+            return
+        store = self.history_store
+        index = self.reuse_index
+        
+        def migrate(job):
+            migrated = store.migrate_legacy()
+            index.add_many(entry['password'] for entry in migrated)
+            return len(migrated)
+        
+        def on_migrated(count):
+            self.load_history_display()
+            if not messagebox.askyesno(
+                    "History",
+                    f"Added {count} passwords from {legacy}.\n"
+                    "It still holds every password in plaintext. "
+                    "Overwrite and delete it now?"):
+                return
+            self.worker.submit(lambda job: store.shred_legacy(),
+                               on_done=lambda path: messagebox.showinfo(
+                                   "History", f"{path} was overwritten and deleted."),
+                               on_error=self.show_history_error)
+        
+        self.worker.submit(migrate, on_done=on_migrated, on_error=self.show_history_error)
+    
+    def show_history_error(self, error):
+        """Report a failed history operation that leaves the history usable"""
+        if not isinstance(error, (HistoryError, OSError)):
+            raise error
+        messagebox.showwarning("History", str(error))
+    
+    def unlock_history(self):
+        """Ask for the master passphrase; returns (cipher or None, newly created)"""
+        path = key_path(DEFAULT_HISTORY_PATH)
+        if not os.path.exists(path):
+            passphrase = simpledialog.askstring(
+                "Encrypt History",
+                "Choose a master passphrase to encrypt your password history\n"
+                "(Cancel keeps the history unencrypted):",
+                show='*', parent=self.root
+            )
+            if not passphrase:
+                return None, False
+            return HistoryCipher.create(passphrase, path), True
+        
+        while True:
+            passphrase = simpledialog.askstring(
+                "Unlock History", "Master passphrase:", show='*', parent=self.root
+            )
+            if passphrase is None:
+                raise HistoryLocked()
+            try:
+                return HistoryCipher.unlock(passphrase, path), False
+            except VaultError as e:
+                messagebox.showerror("Error", str(e))
+    
+    def save_history(self, entry):
+        """Append one entry to the history file; returns False if history is disabled
+
+        Runs on the background worker; a HistoryError reaches the job's on_error.
+        """
+        if self.history_store is None:
+            return False
+        self.history_store.append(entry)
+        if self.reuse_index is not None:
+            self.reuse_index.add(entry['password'])
+        return True
+    
+    def load_history_display(self):
+        """Show the newest page of history; older pages load on scroll"""
+        self.history_listbox.delete(0, tk.END)
+        self.password_history = []
+        self.history_cursor = None
+        self.history_page_pending = False
+        if self.history_store is not None:
+            self.history_cursor = self.history_store.iter_newest_first()
+        self.load_history_page()
+    
+    def load_history_page(self):
+        """Read the next page of older entries on the worker, then append it to the listbox"""
+        cursor = self.history_cursor
+        if cursor is None or self.history_page_pending:
+            return
+        self.history_page_pending = True
+        
+        def task(job):
+            started = metrics.now() if metrics.enabled else 0.0
+            page = list(islice(cursor, HISTORY_PAGE_SIZE))
+            if started:
+                metrics.record('history.load_page', started, len(page))
+            return page
+        
+        def on_done(page):
+            # The display was reset while this page was being read
+            if cursor is not self.history_cursor:
+                return
+            self.history_page_pending = False
+            if len(page) < HISTORY_PAGE_SIZE:
+                self.history_cursor = None
+            self.history_listbox.insert(tk.END, *map(self.format_history_row, page))
+            self.password_history.extend(map(self.history_row_entry, page))
+        
+        def on_error(error):
+            if cursor is self.history_cursor:
+                self.history_cursor = None
+                self.history_page_pending = False
+            self.show_history_error(error)
+        
+        self.worker.submit(task, on_done=on_done, on_error=on_error)
+    
+    def history_row_entry(self, entry):
+        """The part of a history entry kept for its row; no password in secure mode"""
+        if not self.secure_mode:
+            return entry
+        return {key: value for key, value in entry.items() if key != 'password'}
+    
+    def format_history_row(self, entry):
+        """Format one history entry as a listbox row"""
+        if self.secure_mode:
+            return f"{entry['timestamp']} | {MASKED_PASSWORD}"
+        password = entry.get('password', '')
+        return f"{entry['timestamp']} | {password[:20]}{'...' if len(password) > 20 else ''}"
+    
+    def on_history_scroll(self, first, last):
+        """Update the scrollbar and fetch older history near the bottom"""
+        self.history_scrollbar.set(first, last)
+        if (self.history_cursor is not None and not self.history_page_pending
+                and float(last) >= HISTORY_PREFETCH_AT):
+            self.load_history_page()
+    
+    def show_stats(self):
+        """Open (or raise) the panel of timings collected this session"""
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+        metrics.enable()
+        self.stats_window = tk.Toplevel(self.root)
+        self.stats_window.title("Performance Stats")
+        self.stats_window.configure(bg=self.root['bg'])
+        self.stats_text = tk.Text(
+            self.stats_window,
+            bg='#16213e',
+            fg='#ffffff',
+            font=("Courier", 10),
+            width=78,
+            height=16,
+            relief='flat',
+            bd=10
+        )
+        self.stats_text.pack(fill='both', expand=True)
+        self.refresh_stats()
+    
+    def refresh_stats(self):
+        """Redraw the stats panel while it is open"""
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            self.stats_window = None
+            return
+        lines = [f"{'operation':22} {'calls':>7} {'items':>9} {'mean ms':>9} "
+                 f"{'p50 ms':>8} {'p99 ms':>8}"]
+        for name, calls, items, mean, p50, p99 in metrics.summary_rows():
+            lines.append(f"{name:22} {calls:>7} {items:>9} {mean:>9.3f} {p50:>8.3f} {p99:>8.3f}")
+        if len(lines) == 1:
+            lines.append("Nothing timed yet.")
+        self.stats_text.config(state='normal')
+        self.stats_text.delete('1.0', tk.END)
+        self.stats_text.insert('1.0', '\n'.join(lines))
+        self.stats_text.config(state='disabled')
+        self.root.after(STATS_REFRESH_MS, self.refresh_stats)
+    
+    def update_length_label(self, value):
+        """Update length label when slider moves"""
+        self.length_label.config(text=f"Length: {value} characters")
+    
+    def toggle_theme(self):
+        """Toggle between dark and light themes"""
+        current_theme = 'light' if self.dark_mode.get() else 'dark'
+        colors = self.themes[current_theme]
+        
+        # Update main window
+        self.root.configure(bg=colors['bg'])
+        
+        # Update theme button
+        self.theme_btn.config(text="☀️" if current_theme == 'dark' else "🌙")
+        
+        # Toggle the variable
+        self.dark_mode.set(not self.dark_mode.get())
+    
+    def run(self):
+        """Start the application"""
+        try:
+            self.root.mainloop()
+        finally:
+            # Let a pending history write finish before closing the files
+            if self.bulk_job is not None:
+                self.bulk_job.cancel()
+            self.bulk_worker.close()
+            self.worker.close()
+            self.clipboard.close()
+            self.password_pool.close()
+            if self.history_store is not None:
+                self.history_store.close()
+            if self.reuse_index is not None:
+                self.reuse_index.close()
+            if self.breach_corpus is not None:
+                self.breach_corpus.close()
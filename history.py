@@ -0,0 +1,499 @@
+"""Append-only password history store"""
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import chain
+
+from history_index import INDEX_SUFFIX, HistoryIndex
+import metrics
+
+DEFAULT_HISTORY_PATH = 'password_history.ndjson'
+LEGACY_HISTORY_PATH = 'password_history.json'
+
+# Records kept after compaction; None keeps everything. The GUI, import
+# and serve take it from RETENTION_ENV when set, where 0 keeps everything
+DEFAULT_RETENTION = 10000
+RETENTION_ENV = 'PASSWORD_HISTORY_RETENTION'
+
+READ_BLOCK_SIZE = 1 << 16
+
+# An encrypted password in the format from before record metadata was
+# authenticated; the three characters make sure a 'v2.' prefix is not cut off
+_LEGACY_SECRET = re.compile(rb'"secret":"(?!v2\.)[^"]{3}')
+
+
+class HistoryError(Exception):
+    """Raised when the history file cannot be read or written"""
+
+
+@contextmanager
+def atomic_writer(path):
+    """Open a temporary file that replaces `path` when the block exits without error"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.history-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_atomic(path, data_blocks):
+    """Write a file via a temporary file and rename, so readers never see half of it"""
+    with atomic_writer(path) as f:
+        for block in data_blocks:
+            f.write(block)
+
+
+def _read_blocks(f, end):
+    """Read a file from the start up to offset `end`, a block at a time"""
+    f.seek(0)
+    while end > 0:
+        block = f.read(min(READ_BLOCK_SIZE, end))
+        if not block:
+            return
+        end -= len(block)
+        yield block
+
+
+def _after_newlines(block, n, start=0):
+    """Offset just past the n-th newline in a block, counting from `start`"""
+    for _ in range(n):
+        start = block.index(b'\n', start) + 1
+    return start
+
+
+def _line_range(f, skip, count, end):
+    """Yield `count` complete lines after the first `skip` lines, without reading them all in"""
+    for block in _read_blocks(f, end):
+        start = 0
+        if skip:
+            newlines = block.count(b'\n')
+            if newlines < skip:
+                skip -= newlines
+                continue
+            start = _after_newlines(block, skip)
+            skip = 0
+        newlines = block.count(b'\n', start)
+        if newlines >= count:
+            yield block[start:_after_newlines(block, count, start)]
+            return
+        count -= newlines
+        yield block[start:]
+
+
+def default_retention():
+    """Retention from RETENTION_ENV (0 keeps everything), or DEFAULT_RETENTION"""
+    value = os.environ.get(RETENTION_ENV)
+    if not value:
+        return DEFAULT_RETENTION
+    try:
+        records = int(value)
+    except ValueError:
+        raise HistoryError(f"{RETENTION_ENV} must be a number of records") from None
+    if records < 0:
+        raise HistoryError(f"{RETENTION_ENV} must not be negative")
+    return records or None
+
+
+def associated_data(entry):
+    """A record's fields other than the password, as bound to its encrypted password"""
+    fields = {key: value for key, value in entry.items() if key not in ('password', 'secret')}
+    return json.dumps(fields, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def shred(path):
+    """Overwrite a file with zeros, sync it to disk and delete it"""
+    with open(path, 'r+b') as f:
+        remaining = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        while remaining > 0:
+            remaining -= f.write(bytes(min(remaining, READ_BLOCK_SIZE)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.unlink(path)
+
+
+class HistoryStore:
+    """Password history kept as one JSON record per line
+
+    Saving appends a single line, so it costs the same however long the
+    history is. When the file grows well past `retention` records, it is
+    compacted on a background thread and swapped in with an atomic rename;
+    a failed background compaction is reported on stderr and kept in
+    `compaction_error`, and the history carries on uncompacted.
+
+    With a `cipher` (see vault.HistoryCipher) each record's password is
+    stored encrypted under 'secret'; the other fields stay readable so the
+    history can be listed, counted and queried without decrypting it, and
+    are authenticated along with the password. A history still holding
+    secrets in the older unbound format is rewritten when it is opened.
+
+    With `indexed` the timestamp, length, strength and label of every record
+    are kept in a sidecar index (see history_index), loaded on the first
+    query() and maintained incrementally from then on.
+
+    A plaintext history in the old single-document format is never touched
+    on open; `legacy_path` names it if it exists. migrate_legacy() copies it
+    into an encrypted history, and shred_legacy() removes it once the user
+    confirms and every entry in it has been migrated.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, retention=DEFAULT_RETENTION,
+                 durable=True, cipher=None, indexed=True):
+        if retention is not None and retention < 1:
+            raise ValueError("Retention must be at least 1")
+
+        self.path = path
+        self.retention = retention
+        self.durable = durable
+        self.cipher = cipher
+        self.index = HistoryIndex(path + INDEX_SUFFIX) if indexed else None
+        self._lock = threading.Lock()
+        self._compactor = None
+        self.compaction_error = None
+
+        try:
+            with metrics.timer('history.open'):
+                self._file = open(path, 'ab+')
+                self._count = self._count_records()
+        except OSError as e:
+            raise HistoryError(f"Could not open history file {path}: {e}") from e
+        if self.cipher is not None and self._legacy_secrets:
+            try:
+                self.encrypt_existing()
+            except BaseException:
+                self._file.close()
+                raise
+
+    def _encode(self, entry):
+        """Serialize one history entry as an NDJSON line"""
+        if self.cipher is not None and 'password' in entry:
+            entry = dict(entry)
+            password = entry.pop('password')
+            entry['secret'] = self.cipher.encrypt(password, associated_data(entry))
+        return (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+
+    def _decode_lines(self, lines, allow_legacy=False):
+        """Parse NDJSON lines, skipping blank or torn ones (e.g. after a crash)"""
+        entries = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if self.cipher is not None and 'secret' in entry:
+                try:
+                    secret = entry.pop('secret')
+                    entry['password'] = self.cipher.decrypt(secret, associated_data(entry),
+                                                            allow_legacy)
+                except ValueError as e:
+                    raise HistoryError(f"Could not decrypt history record: {e}") from e
+            entries.append(entry)
+        return entries
+
+    @property
+    def legacy_path(self):
+        """The old single-document history next to this one, or None if there is none"""
+        path = os.path.join(os.path.dirname(self.path), LEGACY_HISTORY_PATH)
+        return path if os.path.exists(path) else None
+
+    def _read_legacy(self):
+        """Entries of the old history file"""
+        legacy = self.legacy_path
+        if legacy is None:
+            raise HistoryError("There is no old history file")
+        try:
+            with open(legacy, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            raise HistoryError(f"Could not read old history file {legacy}: {e}") from e
+        if not isinstance(entries, list):
+            raise HistoryError(f"{legacy} is not an old-format history")
+        return [entry for entry in entries if isinstance(entry, dict) and 'password' in entry]
+
+    def _unmigrated(self, entries):
+        """Old history entries not yet in this history"""
+        saved = {(entry.get('timestamp'), entry.get('password')) for entry in self}
+        return [entry for entry in entries
+                if (entry.get('timestamp'), entry.get('password')) not in saved]
+
+    def migrate_legacy(self):
+        """Copy the old history's entries, encrypted, ahead of the current records
+
+        Only an encrypted history takes them, so the passwords do not just
+        move from one plaintext file to another. Entries migrated before are
+        skipped and the old file is left in place (see shred_legacy()).
+        Returns the entries copied, so callers can record their passwords
+        in the reuse index.
+        """
+        if self.cipher is None:
+            raise HistoryError("The old history can only be migrated into an encrypted history")
+        entries = self._unmigrated(self._read_legacy())
+        if not entries:
+            return entries
+        with self._lock:
+            self._file.flush()
+            try:
+                with open(self.path, 'rb') as f:
+                    write_atomic(self.path, chain(map(self._encode, entries), f))
+                self._reopen()
+            except OSError as e:
+                raise HistoryError(f"Could not rewrite history file {self.path}: {e}") from e
+            self._count = self._count_records()
+        return entries
+
+    def shred_legacy(self):
+        """Overwrite and delete the old history once every entry in it was migrated
+
+        Returns the path of the removed file.
+        """
+        if self.cipher is None:
+            raise HistoryError("The old history can only be removed once it is encrypted")
+        legacy = self.legacy_path
+        if self._unmigrated(self._read_legacy()):
+            raise HistoryError(f"{legacy} holds entries that were not migrated yet")
+        try:
+            shred(legacy)
+        except OSError as e:
+            raise HistoryError(f"Could not remove old history file {legacy}: {e}") from e
+        return legacy
+
+    def _count_records(self):
+        """Count complete records by counting newlines, without parsing JSON
+
+        Also notes whether any record holds a secret in the legacy format.
+        """
+        self._file.seek(0)
+        count = 0
+        last = b'\n'
+        carry = b''
+        self._legacy_secrets = False
+        for block in iter(lambda: self._file.read(READ_BLOCK_SIZE), b''):
+            count += block.count(b'\n')
+            last = block[-1:]
+            if not self._legacy_secrets:
+                # The carried bytes catch a marker split across two blocks
+                self._legacy_secrets = _LEGACY_SECRET.search(carry + block) is not None
+                carry = block[-16:]
+        # A torn final line from a crash gets terminated by the next append
+        self._needs_newline = last != b'\n'
+        return count
+
+    def __len__(self):
+        return self._count
+
+    def append(self, entry):
+        """Append one entry to the history"""
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """Append several entries with a single write"""
+        entries = list(entries)
+        started = metrics.now() if metrics.enabled else 0.0
+        lines = list(map(self._encode, entries))
+        data = b''.join(lines)
+        if not data:
+            return
+        with self._lock:
+            if self._needs_newline:
+                data = b'\n' + data
+                self._needs_newline = False
+            try:
+                offset = self._file.seek(0, os.SEEK_END) + len(data) - sum(map(len, lines))
+                self._file.write(data)
+                self._file.flush()
+                if self.durable:
+                    os.fsync(self._file.fileno())
+                if self.index is not None and self.index.loaded:
+                    self.index.append(offset, zip(lines, entries))
+            except OSError as e:
+                raise HistoryError(f"Could not write history file {self.path}: {e}") from e
+            self._count += data.count(b'\n')
+        if started:
+            metrics.record('history.save', started, len(entries))
+        self._maybe_compact()
+
+    def tail(self, n):
+        """Return the last `n` entries, oldest first, reading only the end of the file"""
+        if n <= 0:
+            return []
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            position = self._file.tell()
+            data = b''
+            # Read backwards until we hold n complete lines (or the whole file)
+            while position > 0 and data.count(b'\n') <= n:
+                size = min(READ_BLOCK_SIZE, position)
+                position -= size
+                self._file.seek(position)
+                data = self._file.read(size) + data
+        lines = data.split(b'\n')
+        if position > 0:
+            lines = lines[1:]  # first line may be partial
+        return self._decode_lines(lines)[-n:]
+
+    def iter_newest_first(self):
+        """Iterate over entries newest first, reading the file backwards lazily
+
+        Only the blocks needed for the entries actually consumed are read, so
+        paging through the start of a huge history stays cheap. The iterator
+        works on its own file handle and sees the history as of its creation.
+        """
+        with self._lock:
+            self._file.flush()
+            f = open(self.path, 'rb')
+            end = f.seek(0, os.SEEK_END)
+        with f:
+            position = end
+            remainder = b''
+            while position > 0:
+                size = min(READ_BLOCK_SIZE, position)
+                position -= size
+                f.seek(position)
+                lines = (f.read(size) + remainder).split(b'\n')
+                # The first piece may continue in the previous block
+                remainder = lines.pop(0) if position > 0 else b''
+                yield from reversed(self._decode_lines(lines))
+            if remainder:
+                yield from self._decode_lines([remainder])
+
+    def __iter__(self):
+        """Iterate over every entry, oldest first, streaming (and decrypting) from disk"""
+        with open(self.path, 'rb') as f:
+            for line in f:
+                yield from self._decode_lines([line])
+
+    def encrypt_existing(self):
+        """Rewrite the file so that every stored password is encrypted and bound to its record"""
+        if self.cipher is None:
+            raise HistoryError("No cipher configured")
+        with self._lock:
+            self._file.flush()
+            with open(self.path, 'rb') as f:
+                lines = list(f)
+            try:
+                entries = self._decode_lines(lines, allow_legacy=True)
+                write_atomic(self.path, map(self._encode, entries))
+                self._reopen()
+            except OSError as e:
+                raise HistoryError(f"Could not rewrite history file {self.path}: {e}") from e
+            self._count = self._count_records()
+
+    def _reopen(self):
+        """Reopen the file after it was replaced; offsets in the index are stale"""
+        self._file.close()
+        self._file = open(self.path, 'ab+')
+        if self.index is not None:
+            self.index.reset()
+
+    def query(self, since=None, until=None, min_length=None, max_length=None,
+              min_strength=None, max_strength=None, label=None):
+        """Return the entries matching every given (inclusive) bound, oldest first
+
+        `since`/`until` are datetimes or epoch seconds. Matching uses only the
+        index; just the matching records are read (and decrypted) from disk.
+        """
+        if self.index is None:
+            raise HistoryError("History index is disabled")
+        if isinstance(since, datetime):
+            since = since.timestamp()
+        if isinstance(until, datetime):
+            until = until.timestamp()
+        started = metrics.now() if metrics.enabled else 0.0
+
+        with self._lock:
+            try:
+                if not self.index.loaded:
+                    self._file.flush()
+                    self.index.load(self._file)
+                numbers = self.index.select(since, until, min_length, max_length,
+                                            min_strength, max_strength, label)
+                lines = []
+                for number in numbers:
+                    self._file.seek(self.index.offsets[number])
+                    lines.append(self._file.read(self.index.sizes[number]))
+            except OSError as e:
+                raise HistoryError(f"Could not query history file {self.path}: {e}") from e
+
+        entries = self._decode_lines(lines)
+        if label is not None:
+            # The index stores a checksum of the label; confirm the real value
+            entries = [entry for entry in entries if entry.get('label') == label]
+        if started:
+            metrics.record('history.query', started, len(entries))
+        return entries
+
+    def _maybe_compact(self):
+        """Start a background compaction once the file holds too many records"""
+        if self.retention is None:
+            return
+        slack = max(self.retention // 4, 100)
+        if self._count <= self.retention + slack:
+            return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact_in_background)
+        self._compactor.start()
+
+    def _compact_in_background(self):
+        """Compact on the background thread, reporting failures instead of raising"""
+        try:
+            self.compact()
+        except Exception as e:
+            self.compaction_error = e
+            print(f"password history: compaction failed: {e}", file=sys.stderr)
+
+    def compact(self):
+        """Rewrite the file with only the newest `retention` records
+
+        The kept records are streamed into a temporary file without the
+        lock; records appended meanwhile are copied across under the lock,
+        which is held until the new file has been renamed into place.
+        """
+        if self.retention is None:
+            return
+        with self._lock:
+            self._file.flush()
+            snapshot = self._file.seek(0, os.SEEK_END)
+
+        locked = False
+        try:
+            with open(self.path, 'rb') as f, atomic_writer(self.path) as out:
+                total = sum(block.count(b'\n') for block in _read_blocks(f, snapshot))
+                kept = min(total, self.retention)
+                for block in _line_range(f, total - kept, kept, snapshot):
+                    out.write(block)
+                self._lock.acquire()
+                locked = True
+                self._file.seek(snapshot)
+                appended = self._file.read()
+                out.write(appended)
+            self._reopen()
+            self._count = kept + appended.count(b'\n')
+        except OSError as e:
+            raise HistoryError(f"Could not compact history file {self.path}: {e}") from e
+        finally:
+            if locked:
+                self._lock.release()
+
+    def close(self):
+        """Wait for any running compaction and close the file"""
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,203 @@
+"""Sidecar index over history metadata for fast filtered queries"""
+import json
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+INDEX_SUFFIX = '.idx'
+
+# offset, size, timestamp, length, strength, label checksum
+_RECORD = struct.Struct('<QIdHBxI')
+
+
+def parse_timestamp(value):
+    """Turn a history timestamp ('YYYY-MM-DD HH:MM:SS') into epoch seconds"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def label_key(label):
+    """Checksum used to index a label (0 means no label)"""
+    return zlib.crc32(label.encode('utf-8')) or 1 if label else 0
+
+
+def index_fields(entry):
+    """Extract the indexed metadata from a history entry"""
+    return (
+        parse_timestamp(entry.get('timestamp')),
+        max(0, min(int(entry.get('length') or 0), 0xFFFF)),
+        max(0, min(int(entry.get('strength') or 0), 0xFF)),
+        label_key(entry.get('label')),
+    )
+
+
+class HistoryIndex:
+    """Fixed-width index of (offset, timestamp, length, strength, label) per record
+
+    The index lives next to the history file and only ever grows at the end,
+    like the history itself. When it lags behind the history (e.g. after a
+    crash, or because it was not loaded while records were saved) the missing
+    records are indexed from the history's tail on the next load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.loaded = False
+        self._clear()
+
+    def _clear(self):
+        self.offsets = array('Q')
+        self.sizes = array('I')
+        self.timestamps = array('d')
+        self.lengths = array('H')
+        self.strengths = array('B')
+        self.labels = array('I')
+        self.by_length = {}
+        self.by_strength = {}
+        self.timestamps_sorted = True
+        self.end = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def reset(self):
+        """Forget the index (e.g. after the history file was rewritten)"""
+        self._clear()
+        self.loaded = False
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def load(self, data_file):
+        """Read the index file, then index any history records it is missing"""
+        self._clear()
+        data_size = data_file.seek(0, os.SEEK_END)
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = b''
+        # Drop a torn trailing record
+        raw = raw[:len(raw) - len(raw) % _RECORD.size]
+
+        self._add_many(_RECORD.iter_unpack(raw))
+        if self.end > data_size:
+            # The history was rewritten behind our back; start over
+            self.reset()
+            raw = b''
+
+        with open(self.path, 'ab') as f:
+            if len(raw) != f.tell():
+                f.truncate(len(raw))
+            f.write(self.catch_up(data_file))
+        self.loaded = True
+
+    def catch_up(self, data_file):
+        """Index history lines past self.end; returns the packed new records"""
+        data_file.seek(self.end)
+        packed = []
+        offset = self.end
+        for line in data_file:
+            if not line.endswith(b'\n'):
+                break  # torn final line; indexed once it is completed
+            size = len(line)
+            try:
+                entry = json.loads(line)
+                fields = index_fields(entry)
+            except (ValueError, TypeError, AttributeError):
+                fields = None
+            if fields is not None:
+                packed.append(self._add(offset, size, *fields))
+            offset += size
+            self.end = offset
+        return b''.join(packed)
+
+    def append(self, offset, lines_and_entries):
+        """Index freshly appended history lines and persist their records"""
+        packed = []
+        for line, entry in lines_and_entries:
+            packed.append(self._add(offset, len(line), *index_fields(entry)))
+            offset += len(line)
+        with open(self.path, 'ab') as f:
+            f.write(b''.join(packed))
+
+    def _add(self, offset, size, timestamp, length, strength, label):
+        """Add one record to the in-memory arrays and posting lists"""
+        number = len(self.offsets)
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            self.timestamps_sorted = False
+        self.offsets.append(offset)
+        self.sizes.append(size)
+        self.timestamps.append(timestamp)
+        self.lengths.append(length)
+        self.strengths.append(strength)
+        self.labels.append(label)
+        self.by_length.setdefault(length, array('I')).append(number)
+        self.by_strength.setdefault(strength, array('I')).append(number)
+        self.end = max(self.end, offset + size)
+        return _RECORD.pack(offset, size, timestamp, length, strength, label)
+
+    def _add_many(self, records):
+        """Bulk version of _add for records read back from the index file"""
+        offsets, sizes, timestamps = self.offsets, self.sizes, self.timestamps
+        lengths, strengths, labels = self.lengths, self.strengths, self.labels
+        by_length, by_strength = self.by_length, self.by_strength
+        number = len(offsets)
+        previous = timestamps[-1] if timestamps else float('-inf')
+        for offset, size, timestamp, length, strength, label in records:
+            if timestamp < previous:
+                self.timestamps_sorted = False
+            previous = timestamp
+            offsets.append(offset)
+            sizes.append(size)
+            timestamps.append(timestamp)
+            lengths.append(length)
+            strengths.append(strength)
+            labels.append(label)
+            by_length.setdefault(length, array('I')).append(number)
+            by_strength.setdefault(strength, array('I')).append(number)
+            number += 1
+        if offsets:
+            self.end = max(self.end, offsets[-1] + sizes[-1])
+
+    def _postings(self, postings, low, high, start, stop):
+        """Record numbers in [start, stop) whose value lies within [low, high]"""
+        found = set()
+        for value, numbers in postings.items():
+            if (low is None or value >= low) and (high is None or value <= high):
+                found.update(numbers[bisect_left(numbers, start):bisect_left(numbers, stop)])
+        return found
+
+    def select(self, since=None, until=None, min_length=None, max_length=None,
+               min_strength=None, max_strength=None, label=None):
+        """Record numbers (oldest first) matching every given inclusive bound"""
+        start, stop = 0, len(self.offsets)
+        if self.timestamps_sorted:
+            if since is not None:
+                start = bisect_left(self.timestamps, since)
+            if until is not None:
+                stop = bisect_right(self.timestamps, until)
+
+        numbers = None
+        if min_strength is not None or max_strength is not None:
+            numbers = self._postings(self.by_strength, min_strength, max_strength, start, stop)
+        if min_length is not None or max_length is not None:
+            by_length = self._postings(self.by_length, min_length, max_length, start, stop)
+            numbers = by_length if numbers is None else numbers & by_length
+        numbers = range(start, stop) if numbers is None else sorted(numbers)
+
+        if not self.timestamps_sorted and (since is not None or until is not None):
+            timestamps = self.timestamps
+            numbers = [n for n in numbers
+                       if (since is None or timestamps[n] >= since)
+                       and (until is None or timestamps[n] <= until)]
+        if label is not None:
+            key, labels = label_key(label), self.labels
+            numbers = [n for n in numbers if labels[n] == key]
+        return numbers
@@ -0,0 +1,232 @@
+"""Process-wide timers, counters and latency histograms
+
+Metrics are off until enable() is called, and while they are off the
+instrumented code pays for one attribute check. Hot paths follow this
+pattern, timing only when metrics are on:
+
+    started = metrics.now() if metrics.enabled else 0.0
+    ...
+    if started:
+        metrics.record('generate', started, count)
+
+Colder paths (history opens, clipboard copies) use the timer() context
+manager instead. Every timed operation feeds a histogram of its latency
+and a counter of the items it handled, both keyed by a dotted name.
+
+snapshot() returns everything at once; to_json() and to_prometheus() turn
+it into a dump for files, the local service's /metrics endpoint or the
+GUI's stats panel.
+"""
+import json
+import os
+import sys
+import threading
+from bisect import bisect_left
+from time import perf_counter as now
+
+# Histogram bucket upper bounds in seconds, 1 µs to 10 s; the last bucket is +Inf
+BUCKETS = (
+    0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005,
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Prefix of every exported Prometheus metric name
+PROMETHEUS_PREFIX = 'password_generator_'
+
+# Dump formats accepted by dump()
+FORMATS = ('prometheus', 'json')
+
+# Set to 1 to collect metrics in the GUI from startup
+METRICS_ENV = 'PASSWORD_METRICS'
+
+enabled = False
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+class Histogram:
+    """Latency observations counted into fixed buckets"""
+
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (seconds)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+def requested():
+    """Whether METRICS_ENV asks for metrics"""
+    return os.environ.get(METRICS_ENV, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def enable():
+    """Start collecting metrics"""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Stop collecting; what was collected so far is kept"""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Forget everything collected so far"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def count(name, amount=1):
+    """Add to a counter"""
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def record(name, started, items=1):
+    """Record one operation that began at `started` (a now() value) and handled `items`"""
+    if not enabled:
+        return
+    elapsed = now() - started
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(elapsed)
+        _counters[name] = _counters.get(name, 0) + items
+
+
+class _Timer:
+    """Context manager recording the time spent in its block"""
+
+    __slots__ = ('name', 'items', 'started')
+
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.started = now()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.started, self.items)
+
+
+class _NullTimer:
+    """Stand-in for _Timer while metrics are off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name, items=1):
+    """Context manager timing its block into the `name` histogram"""
+    return _Timer(name, items) if enabled else _NULL_TIMER
+
+
+def snapshot():
+    """Copy of everything collected: {'counters': {...}, 'histograms': {...}}"""
+    with _lock:
+        histograms = {}
+        for name, histogram in _histograms.items():
+            histograms[name] = {
+                'count': histogram.count,
+                'sum': histogram.sum,
+                'p50': histogram.quantile(0.5),
+                'p99': histogram.quantile(0.99),
+                'buckets': list(histogram.counts),
+            }
+        return {'counters': dict(_counters), 'histograms': histograms}
+
+
+def to_json(snap=None):
+    """Metrics as a JSON document"""
+    snap = snapshot() if snap is None else snap
+    bounds = list(BUCKETS) + ['+Inf']
+    # JSON has no infinity; a quantile past the last bound is written as '+Inf'
+    histograms = {name: {key: '+Inf' if value == float('inf') else value
+                         for key, value in dict(histogram, bounds=bounds).items()}
+                  for name, histogram in snap['histograms'].items()}
+    return json.dumps({'counters': snap['counters'], 'histograms': histograms}, indent=2)
+
+
+def _prometheus_name(name):
+    return PROMETHEUS_PREFIX + name.replace('.', '_').replace('-', '_')
+
+
+def to_prometheus(snap=None):
+    """Metrics in the Prometheus text exposition format"""
+    snap = snapshot() if snap is None else snap
+    lines = []
+    for name, total in sorted(snap['counters'].items()):
+        metric = _prometheus_name(name) + '_total'
+        lines += [f'# TYPE {metric} counter', f'{metric} {total}']
+    for name, histogram in sorted(snap['histograms'].items()):
+        metric = _prometheus_name(name) + '_seconds'
+        lines.append(f'# TYPE {metric} histogram')
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ('+Inf',), histogram['buckets']):
+            cumulative += bucket
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f'{metric}_sum {histogram["sum"]!r}', f'{metric}_count {histogram["count"]}']
+    return '\n'.join(lines) + '\n'
+
+
+def dump(path, fmt='prometheus'):
+    """Write every metric to `path` as Prometheus text or JSON
+
+    '-' writes to stderr, keeping stdout free for the command's own output.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown metrics format: {fmt}")
+    text = to_prometheus() if fmt == 'prometheus' else to_json() + '\n'
+    if path == '-':
+        sys.stderr.write(text)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def summary_rows(snap=None):
+    """(name, calls, items, mean ms, p50 ms, p99 ms) per timed operation, for display"""
+    snap = snapshot() if snap is None else snap
+    rows = []
+    for name, histogram in sorted(snap['histograms'].items()):
+        calls = histogram['count']
+        mean = histogram['sum'] / calls * 1000 if calls else 0.0
+        rows.append((name, calls, snap['counters'].get(name, calls), mean,
+                     histogram['p50'] * 1000, histogram['p99'] * 1000))
+    return rows
@@ -0,0 +1,92 @@
+"""Multi-process password generation on top of PasswordGenerator or PasswordPolicy"""
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+
+from generator import PasswordGenerator
+
+# Aim for roughly this many characters per chunk so pickling overhead stays small
+TARGET_CHUNK_CHARS = 1 << 20
+MAX_CHUNK_SIZE = 100000
+# Chunks kept in flight per worker; bounds memory for very large counts
+CHUNKS_IN_FLIGHT = 4
+
+
+def resolve_workers(workers):
+    """Turn a --workers value into a process count (0 or None means all cores)"""
+    if not workers:
+        return os.cpu_count() or 1
+    if workers < 0:
+        raise ValueError("Workers must not be negative")
+    return workers
+
+
+def auto_chunk_size(count, length, workers):
+    """Pick a chunk size that spreads work evenly without tiny IPC round trips"""
+    by_size = max(1, TARGET_CHUNK_CHARS // length)
+    by_spread = max(1, count // (workers * CHUNKS_IN_FLIGHT))
+    return max(1, min(by_size, by_spread, MAX_CHUNK_SIZE))
+
+
+@lru_cache(maxsize=32)
+def _worker_generator(factory, options):
+    """Build (once per worker process) the generator for an option dict"""
+    return factory(**dict(options))
+
+
+def _generate_chunk(factory, options, size):
+    """Worker entry point: generate one chunk of passwords
+
+    Every worker reads straight from the OS CSPRNG, so no RNG state is
+    shared or copied between processes.
+    """
+    return _worker_generator(factory, options).generate_batch(size)
+
+
+def iter_parallel_batches(options, count, workers=None, chunk_size=None, ordered=True,
+                          factory=PasswordGenerator):
+    """Yield batches of `count` passwords generated across a process pool
+
+    `options` are keyword arguments for `factory` (PasswordGenerator, or
+    PasswordPolicy with a policy's settings). With `ordered=False` batches
+    are yielded as soon as any worker finishes them.
+    """
+    workers = resolve_workers(workers)
+    # Validate the options up front so errors surface in the caller's process
+    generator = factory(**options)
+
+    if chunk_size is None:
+        chunk_size = auto_chunk_size(count, generator.length, workers)
+    elif chunk_size < 1:
+        raise ValueError("Chunk size must be at least 1")
+
+    if workers == 1:
+        return generator.iter_batches(count, chunk_size)
+    return _iter_pool(factory, tuple(sorted(options.items())), count, workers, chunk_size, ordered)
+
+
+def _iter_pool(factory, key, count, workers, chunk_size, ordered):
+    """Drive the process pool, keeping a bounded number of chunks in flight"""
+    sizes = (min(chunk_size, count - start) for start in range(0, count, chunk_size))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        def submit_next():
+            size = next(sizes, None)
+            if size is not None:
+                pending.append(executor.submit(_generate_chunk, factory, key, size))
+
+        for _ in range(workers * CHUNKS_IN_FLIGHT):
+            submit_next()
+
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            submit_next()
+            yield future.result()
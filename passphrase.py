@@ -0,0 +1,148 @@
+"""Diceware-style passphrases built from a wordlist
+
+Wordlists are read once per file and kept in memory as a tuple of words
+(an array of references to shared strings), so generating large batches
+never touches the file again. Both the EFF/diceware layout ("11111 word")
+and plain one-word-per-line files are accepted.
+"""
+import math
+import os
+from functools import lru_cache
+
+from generator import BatchGenerator, random_indices, sample
+
+# Environment variable the GUI and CLI read the default wordlist location from
+WORDLIST_ENV = 'PASSWORD_WORDLIST'
+
+DEFAULT_WORDS = 6
+DEFAULT_SEPARATOR = '-'
+CAPITALIZE_MODES = ('none', 'first', 'random')
+
+# random_indices draws from at most this many values in one go
+MAX_WORDLIST_SIZE = 0x10000
+DIGITS = '0123456789'
+
+
+class WordListError(ValueError):
+    """Raised when a wordlist cannot be read or is unusable"""
+
+
+class WordList:
+    """An immutable, deduplicated list of words"""
+
+    def __init__(self, words, path=None):
+        self.path = path
+        self.words = tuple(dict.fromkeys(words))
+        if len(self.words) < 2:
+            raise WordListError(f"Wordlist {path or ''} needs at least two distinct words")
+        if 2 * len(self.words) > MAX_WORDLIST_SIZE:
+            raise WordListError(f"Wordlists are limited to {MAX_WORDLIST_SIZE // 2} words")
+        # Capitalized twins, so random capitalization is one draw from both halves
+        self.words_and_capitalized = self.words + tuple(w[:1].upper() + w[1:] for w in self.words)
+        self.average_length = sum(map(len, self.words)) / len(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+
+def parse_wordlist(lines):
+    """Extract words from diceware ("11111<tab>word") or one-word-per-line text"""
+    words = []
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+        if len(fields) == 2 and fields[0].isdigit():
+            fields = fields[1:]
+        words.append(' '.join(fields))
+    return words
+
+
+@lru_cache(maxsize=8)
+def _load_wordlist(path, mtime, size):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return WordList(parse_wordlist(f), path)
+    except (OSError, UnicodeDecodeError) as e:
+        raise WordListError(f"Could not read wordlist {path}: {e}") from e
+
+
+def load_wordlist(path):
+    """Load a wordlist, reusing the cached copy while the file is unchanged"""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise WordListError(f"Could not read wordlist {path}: {e}") from e
+    return _load_wordlist(path, stat.st_mtime_ns, stat.st_size)
+
+
+def default_wordlist_path():
+    """Wordlist named by WORDLIST_ENV, or None if unset"""
+    return os.environ.get(WORDLIST_ENV) or None
+
+
+class PassphraseGenerator(BatchGenerator):
+    """Generate passphrases of `words` words drawn uniformly from a wordlist
+
+    `capitalize` is 'none', 'first' (every word capitalized) or 'random'
+    (each word capitalized with probability 1/2, one extra bit per word).
+    `digits` random digits are appended to randomly chosen words.
+    """
+
+    def __init__(self, wordlist, words=DEFAULT_WORDS, separator=DEFAULT_SEPARATOR,
+                 capitalize='none', digits=0):
+        if isinstance(wordlist, str):
+            wordlist = load_wordlist(wordlist)
+        if words < 1:
+            raise ValueError("A passphrase needs at least one word")
+        if capitalize not in CAPITALIZE_MODES:
+            raise ValueError(f"Capitalize must be one of {', '.join(CAPITALIZE_MODES)}")
+        if digits < 0:
+            raise ValueError("Digits must not be negative")
+
+        self.wordlist = wordlist
+        self.words = words
+        self.separator = separator
+        self.capitalize = capitalize
+        self.digits = digits
+
+        if capitalize == 'random':
+            self._table = wordlist.words_and_capitalized
+        elif capitalize == 'first':
+            self._table = wordlist.words_and_capitalized[len(wordlist):]
+        else:
+            self._table = wordlist.words
+        # Typical passphrase size in characters, used to size parallel chunks
+        self.length = max(1, round(words * (wordlist.average_length + len(separator)) + digits))
+
+    @property
+    def options(self):
+        """Option tuple identifying this generator's output"""
+        return (self.wordlist.path, self.words, self.separator, self.capitalize, self.digits)
+
+    def entropy_bits(self):
+        """Entropy of one passphrase in bits, from the wordlist size"""
+        # Words that capitalize to themselves (or to another entry) add nothing
+        bits = self.words * math.log2(len(set(self._table)))
+        bits += self.digits * (math.log2(len(DIGITS)) + math.log2(self.words))
+        return bits
+
+    def _generate_batch(self, count):
+        """Generate `count` passphrases"""
+        if count < 0:
+            raise ValueError("Count must not be negative")
+
+        words = self.words
+        table = self._table
+        chosen = list(map(table.__getitem__, random_indices(len(table), count * words)))
+
+        for _ in range(self.digits):
+            slots = random_indices(words, count)
+            picks = sample(DIGITS, count)
+            for start, slot, digit in zip(range(0, count * words, words), slots, picks):
+                chosen[start + slot] += digit
+
+        separator = self.separator
+        return [separator.join(chosen[i:i + words]) for i in range(0, count * words, words)]
+
@@ -0,0 +1,446 @@
+"""Declarative password policies compiled into fast, conforming generators
+
+A policy names the character classes a target system accepts, how many of
+each a password needs, and which patterns it forbids. It is compiled once
+into alphabets, translation tables and a regular expression, and then
+generates conforming passwords by construction:
+
+* every character is drawn uniformly from the allowed alphabet in one
+  CSPRNG read for the whole batch;
+* passwords short of a class minimum get that many characters of the class
+  written over distinct random positions;
+* forbidden runs (repeats, sequences) are found with one regex scan over the
+  batch and the offending characters redrawn from the same class.
+
+Policy files are JSON, either one policy object or a ``"policies"`` mapping
+of names (e.g. one per target system) to policy objects.
+"""
+import json
+import math
+import os
+import random
+import string
+from functools import lru_cache
+from itertools import combinations
+
+from generator import (
+    AMBIGUOUS,
+    MAX_LENGTH,
+    MIN_LENGTH,
+    SYMBOLS,
+    BatchGenerator,
+    random_indices,
+    sample,
+)
+
+# Character classes in the order they are combined into the alphabet
+CLASSES = ('lowercase', 'uppercase', 'numbers', 'symbols')
+
+# Runs that count as sequences for no_sequences (checked forwards and backwards)
+SEQUENCES = (string.ascii_lowercase, string.ascii_uppercase, string.digits)
+
+# Placeholders for required characters while a batch is assembled; none of
+# them can occur in a password
+CLASS_MARKERS = '\x01\x02\x03\x04'
+SLOT_MARKER = '\xff'
+
+# Largest slot/ordering table drawn from with a single random index
+MAX_TABLE_SIZE = 0x10000
+
+_LOW_BITS = bytes(b & 0x3F for b in range(256))
+
+# Redraws per password before a contradictory policy is reported
+MAX_REPAIR_ROUNDS = 1000
+
+_system_random = random.SystemRandom()
+
+
+class PolicyError(ValueError):
+    """Raised for an invalid policy or an unreadable policy file"""
+
+
+def _scatter(template, marker, chars):
+    """Replace each `marker` in `template` with the next character of `chars`"""
+    pieces = template.split(marker)
+    # Interleave with slice assignments so the loop stays in C
+    joined = [''] * (2 * len(pieces) - 1)
+    joined[::2] = pieces
+    joined[1::2] = chars
+    return ''.join(joined)
+
+
+@lru_cache(maxsize=32)
+def _slot_patterns(length, k):
+    """Every choice of `k` of `length` positions, as masks with 0xFF on the chosen ones
+
+    Returns None when there are too many to tabulate.
+    """
+    if math.comb(length, k) > MAX_TABLE_SIZE:
+        return None
+    patterns = []
+    for positions in combinations(range(length), k):
+        mask = bytearray(length)
+        for position in positions:
+            mask[position] = 0xFF
+        patterns.append(bytes(mask))
+    return tuple(patterns)
+
+
+@lru_cache(maxsize=32)
+def _orderings(labels):
+    """Every distinct ordering of the characters in `labels`, or None if too many"""
+    counts = {label: labels.count(label) for label in dict.fromkeys(labels)}
+    total = math.factorial(len(labels))
+    for n in counts.values():
+        total //= math.factorial(n)
+    if total > MAX_TABLE_SIZE:
+        return None
+
+    def extend(prefix):
+        if len(prefix) == len(labels):
+            yield prefix
+            return
+        for label, n in counts.items():
+            if n:
+                counts[label] -= 1
+                yield from extend(prefix + label)
+                counts[label] += 1
+
+    return tuple(ordering.encode('latin-1') for ordering in extend(''))
+
+
+@lru_cache(maxsize=32)
+def _required_table(alphabets):
+    """Byte table decoding (class number << 6 | six random bits) into a character
+
+    Values that would bias a class towards its first characters decode to the
+    class's marker instead, so they can be redrawn.
+    """
+    table = bytearray(256)
+    for i, alphabet in enumerate(alphabets):
+        limit = 64 - 64 % len(alphabet)
+        for value in range(64):
+            if value < limit:
+                table[i << 6 | value] = ord(alphabet[value % len(alphabet)])
+            else:
+                table[i << 6 | value] = ord(CLASS_MARKERS[i])
+    return bytes(table)
+
+
+@lru_cache(maxsize=None)
+def _neighbour_tables():
+    """Byte tables mapping each sequence character to its successor and predecessor
+
+    Characters without one map to 0xFF, which never occurs in a password.
+    """
+    successor = bytearray(b'\xff' * 256)
+    predecessor = bytearray(b'\xff' * 256)
+    for sequence in SEQUENCES:
+        codes = sequence.encode('ascii')
+        for a, b in zip(codes, codes[1:]):
+            successor[a] = b
+            predecessor[b] = a
+    return bytes(successor), bytes(predecessor)
+
+
+class PasswordPolicy(BatchGenerator):
+    """A compiled password policy that generates conforming passwords
+
+    Each class is enabled with True, disabled with False, or (for symbols)
+    given as a string holding a custom set. `min_<class>` is the least
+    number of characters of that class; `forbidden` characters never appear;
+    `max_repeats` limits runs of one character; `no_sequences` forbids runs
+    like 'abc' or '321' of `sequence_length` characters.
+    """
+
+    def __init__(self, length=16, lowercase=True, uppercase=True, numbers=True,
+                 symbols=True, min_lowercase=0, min_uppercase=0, min_numbers=0,
+                 min_symbols=0, forbidden='', exclude_ambiguous=False, max_repeats=None,
+                 no_sequences=False, sequence_length=3, name=None):
+        if not isinstance(length, int) or not MIN_LENGTH <= length <= MAX_LENGTH:
+            raise PolicyError(f"Length must be between {MIN_LENGTH} and {MAX_LENGTH}")
+        if max_repeats is not None and (not isinstance(max_repeats, int) or max_repeats < 1):
+            raise PolicyError("max_repeats must be at least 1")
+        if not isinstance(sequence_length, int) or sequence_length < 2:
+            raise PolicyError("sequence_length must be at least 2")
+
+        self.name = name
+        self.length = length
+        self.settings = {
+            'length': length, 'lowercase': lowercase, 'uppercase': uppercase,
+            'numbers': numbers, 'symbols': symbols, 'min_lowercase': min_lowercase,
+            'min_uppercase': min_uppercase, 'min_numbers': min_numbers,
+            'min_symbols': min_symbols, 'forbidden': forbidden,
+            'exclude_ambiguous': exclude_ambiguous, 'max_repeats': max_repeats,
+            'no_sequences': no_sequences, 'sequence_length': sequence_length,
+        }
+
+        # Class alphabets after custom symbols, forbidden and ambiguous characters
+        removed = set(forbidden) | (set(AMBIGUOUS) if exclude_ambiguous else set())
+        defaults = (string.ascii_lowercase, string.ascii_uppercase, string.digits, SYMBOLS)
+        enabled = (lowercase, uppercase, numbers, symbols)
+        minimums = (min_lowercase, min_uppercase, min_numbers, min_symbols)
+        self.classes = {}
+        self.minimums = {}
+        for kind, default, chars, minimum in zip(CLASSES, defaults, enabled, minimums):
+            if isinstance(chars, str):
+                if kind != 'symbols':
+                    raise PolicyError(f"Only symbols accept a custom character set, not {kind}")
+                if not (chars.isascii() and chars.isprintable()) or any(c.isalnum() or c.isspace() for c in chars):
+                    raise PolicyError("Custom symbols must be printable ASCII punctuation")
+                default = ''.join(dict.fromkeys(chars))
+            elif not isinstance(chars, bool):
+                raise PolicyError(f"{kind} must be true, false or (for symbols) a string")
+            if not isinstance(minimum, int) or minimum < 0:
+                raise PolicyError(f"min_{kind} must be a non-negative integer")
+
+            alphabet = ''.join(c for c in default if c not in removed) if chars else ''
+            if minimum and not alphabet:
+                raise PolicyError(f"min_{kind} is set but no {kind} characters are allowed")
+            if alphabet:
+                self.classes[kind] = alphabet
+                if minimum:
+                    self.minimums[kind] = minimum
+
+        if not self.classes:
+            raise PolicyError("Please select at least one character type!")
+        if sum(self.minimums.values()) > length:
+            raise PolicyError(f"Class minimums add up to more than the length ({length})")
+
+        self.alphabet = ''.join(self.classes.values())
+        self._class_of = {code: alphabet for alphabet in self.classes.values()
+                          for code in alphabet.encode('ascii')}
+
+        # Required classes, each with the marker that stands in for its characters
+        required = [kind for kind in CLASSES if kind in self.minimums]
+        self._required = [(marker, kind, self.minimums[kind])
+                          for marker, kind in zip(CLASS_MARKERS, required)]
+        self._labels = ''.join(chr(i << 6) * minimum
+                               for i, (_, _, minimum) in enumerate(self._required))
+        self._required_table = _required_table(
+            tuple(self.classes[kind] for _, kind, _ in self._required))
+        self._needed = len(self._labels)
+
+        # Translation of a batch to class markers, for counting in _top_up_required()
+        markers = {}
+        for marker, kind, _ in self._required:
+            markers.update(dict.fromkeys(self.classes[kind].encode('ascii'), ord(marker)))
+        self._marker_table = bytes(markers.get(b, 0) for b in range(256))
+
+        # Forbidden runs as (neighbour table, run of zero bytes); see _diffs()
+        self._run_checks = []
+        if max_repeats is not None:
+            self._run_checks.append((None, b'\0' * max_repeats))
+        if no_sequences:
+            successor, predecessor = _neighbour_tables()
+            self._run_checks.append((successor, b'\0' * (sequence_length - 1)))
+            self._run_checks.append((predecessor, b'\0' * (sequence_length - 1)))
+
+    @classmethod
+    def from_dict(cls, data, name=None):
+        """Compile a policy from its JSON form"""
+        if not isinstance(data, dict):
+            raise PolicyError("A policy must be a JSON object")
+        try:
+            return cls(name=name, **data)
+        except TypeError as e:
+            label = f"policy {name!r}" if name else "policy"
+            raise PolicyError(f"Invalid {label}: {e}") from e
+
+    @property
+    def options(self):
+        """Option tuple identifying this policy's output"""
+        return tuple(sorted(self.settings.items()))
+
+    def entropy_bits(self):
+        """Approximate entropy of one password in bits, ignoring forbidden runs"""
+        size = len(self.alphabet)
+        bits = (self.length - self._needed) * math.log2(size)
+        for _, kind, minimum in self._required:
+            bits += minimum * math.log2(len(self.classes[kind]))
+        # Plus the choice of which positions hold which required class
+        layouts = math.factorial(self.length) // math.factorial(self.length - self._needed)
+        for _, _, minimum in self._required:
+            layouts //= math.factorial(minimum)
+        bits += math.log2(layouts)
+        return min(bits, self.length * math.log2(size))
+
+    def _generate_batch(self, count):
+        """Generate `count` conforming passwords"""
+        if count < 0:
+            raise ValueError("Count must not be negative")
+
+        flat = sample(self.alphabet, count * self.length)
+        if self._required:
+            flat = self._place_required(flat, count)
+        length = self.length
+        passwords = [flat[i:i + length] for i in range(0, count * length, length)]
+
+        if self._run_checks:
+            self._repair_runs(passwords)
+        return passwords
+
+    def _required_stream(self, orderings, count):
+        """Required characters for `count` passwords, each in a random class order
+
+        Each character comes from one byte holding its class in the top two
+        bits and six random bits below, decoded by a single translate.
+        """
+        labels = b''.join(map(orderings.__getitem__, random_indices(len(orderings), count)))
+        size = len(labels)
+        bits = os.urandom(size).translate(_LOW_BITS)
+        codes = (int.from_bytes(labels, 'big') | int.from_bytes(bits, 'big')).to_bytes(size, 'big')
+        stream = codes.translate(self._required_table).decode('ascii')
+
+        # Codes that would bias a class decode to its marker; redraw those
+        for marker, kind, _ in self._required:
+            redraw = stream.count(marker)
+            if redraw:
+                stream = _scatter(stream, marker, sample(self.classes[kind], redraw))
+        return stream
+
+    def _place_required(self, flat, count):
+        """Overwrite random positions of every password with its required characters"""
+        length = self.length
+        total = count * length
+        slots = _slot_patterns(length, self._needed)
+        orderings = _orderings(self._labels)
+        if slots is None or orderings is None:
+            return self._top_up_required(flat, count)
+
+        # OR-ing a 0xFF mask onto the chosen slots turns them into markers in one step
+        mask = b''.join(map(slots.__getitem__, random_indices(len(slots), count)))
+        marked = (int.from_bytes(flat.encode('ascii'), 'big') | int.from_bytes(mask, 'big'))
+        template = marked.to_bytes(total, 'big').decode('latin-1')
+        return _scatter(template, SLOT_MARKER, self._required_stream(orderings, count))
+
+    def _top_up_required(self, flat, count):
+        """Fallback for policies whose slot tables would be too large
+
+        Only passwords short of a minimum are rewritten, one at a time. That
+        happens for long passwords, which rarely fall short in the first place.
+        """
+        length = self.length
+        total = count * length
+        markers = flat.encode('ascii').translate(self._marker_table)
+        checks = [(marker.encode('ascii'), minimum) for marker, _, minimum in self._required]
+        short = [start for start in range(0, total, length)
+                 if any(markers.count(marker, start, start + length) < minimum
+                        for marker, minimum in checks)]
+        if not short:
+            return flat
+
+        # Each short password gets every required character on its own position,
+        # so the minimums hold whatever the other positions contain
+        picks = [(sample(self.classes[kind], minimum * len(short)), minimum)
+                 for _, kind, minimum in self._required]
+        buffer = bytearray(flat, 'ascii')
+        for n, start in enumerate(short):
+            fill = ''.join(chars[n * minimum:(n + 1) * minimum] for chars, minimum in picks)
+            for position, c in zip(_system_random.sample(range(length), self._needed), fill):
+                buffer[start + position] = ord(c)
+        return buffer.decode('ascii')
+
+    def _diffs(self, data):
+        """Yield (difference, zero run) for each forbidden-run check on `data`
+
+        Each check XORs the data with itself shifted by one character (through
+        a successor table for sequences), so a forbidden run shows up as a
+        stretch of zero bytes; the difference at i covers characters i, i+1.
+        """
+        size = max(len(data) - 1, 0)
+        following = int.from_bytes(data[1:], 'big')
+        for table, run in self._run_checks:
+            current = data[:-1] if table is None else data[:-1].translate(table)
+            yield (following ^ int.from_bytes(current, 'big')).to_bytes(size, 'big'), run
+
+    def _run_ends(self, data):
+        """Positions in `data` of the last character of every forbidden run"""
+        ends = set()
+        for diff, run in self._diffs(data):
+            position = diff.find(run)
+            while position >= 0:
+                end = position + len(run)
+                ends.add(end)
+                position = diff.find(run, end)
+        return ends
+
+    def _repair_runs(self, passwords):
+        """Redraw characters that complete a forbidden repeat or sequence
+
+        The first scan covers the whole batch; later rounds only rescan the
+        passwords just repaired, in case a redrawn character made a new run.
+        """
+        stride = self.length + 1
+        numbers = range(len(passwords))
+        spares = {}
+
+        def replacement(alphabet):
+            # Replacement characters are drawn per class in bulk and handed out as needed
+            pool = spares.get(alphabet)
+            if not pool:
+                pool = spares[alphabet] = list(sample(alphabet, len(numbers) // 4 + 64))
+            return ord(pool.pop())
+
+        for _ in range(MAX_REPAIR_ROUNDS):
+            data = bytearray('\n'.join([passwords[n] for n in numbers]), 'ascii')
+            ends = self._run_ends(bytes(data))
+            if not ends:
+                return
+            for position in ends:
+                data[position] = replacement(self._class_of[data[position]])
+            repaired = data.decode('ascii').split('\n')
+            touched = sorted({position // stride for position in ends})
+            for i in touched:
+                passwords[numbers[i]] = repaired[i]
+            numbers = [numbers[i] for i in touched]
+        raise PolicyError("Policy constraints cannot be satisfied; "
+                          "allow more characters or relax max_repeats/no_sequences")
+
+
+def policy_for_options(length=16, lowercase=True, uppercase=True, numbers=True,
+                       symbols=True, exclude_ambiguous=False):
+    """Policy for the basic generator options that uses every selected class
+
+    Each selected class gets a minimum of one character, as long as the
+    password is long enough to hold one of each.
+    """
+    selected = {'lowercase': lowercase, 'uppercase': uppercase,
+                'numbers': numbers, 'symbols': symbols}
+    minimums = {}
+    if sum(selected.values()) <= length:
+        minimums = {f'min_{kind}': 1 for kind, enabled in selected.items() if enabled}
+    return PasswordPolicy(length=length, exclude_ambiguous=exclude_ambiguous,
+                          **selected, **minimums)
+
+
+def load_policies(path):
+    """Read a policy file into a dict of compiled policies by name
+
+    A file holding a single policy object yields it under the name None.
+    """
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise PolicyError(f"Could not read policy file {path}: {e}") from e
+
+    if isinstance(data, dict) and 'policies' in data:
+        if not isinstance(data['policies'], dict) or not data['policies']:
+            raise PolicyError(f"{path}: 'policies' must map names to policy objects")
+        return {name: PasswordPolicy.from_dict(policy, name)
+                for name, policy in data['policies'].items()}
+    return {None: PasswordPolicy.from_dict(data)}
+
+
+def load_policy(path, name=None):
+    """Read one policy from a file, picking it by name if the file holds several"""
+    policies = load_policies(path)
+    if name is None and len(policies) == 1:
+        return next(iter(policies.values()))
+    if name not in policies:
+        available = ', '.join(sorted(str(n) for n in policies))
+        if name is None:
+            raise PolicyError(f"{path} defines several policies; pick one of: {available}")
+        raise PolicyError(f"No policy named {name!r} in {path} (available: {available})")
+    return policies[name]
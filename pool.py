@@ -0,0 +1,168 @@
+"""Pools of ready-made passwords for low-latency single requests
+
+One pool is kept per generator option set. Each is topped up by a
+background thread whenever it drops below its low-water mark, so a request
+normally just takes a password that already exists. Pools are bounded in
+size, and the least recently used option sets are dropped once there are
+too many.
+
+Pooled passwords are stored encoded in shared bytearrays rather than as
+str objects. Every password is handed out once and its bytes in the pool
+are overwritten with zeros at that moment (as are the remaining ones when
+a pool is evicted or closed). The str returned to the caller is a fresh
+copy; Python strings cannot be wiped, so that copy is the caller's to keep
+short-lived.
+"""
+import threading
+from collections import OrderedDict, deque
+from itertools import accumulate
+
+import metrics
+
+DEFAULT_POOL_SIZE = 256
+DEFAULT_MAX_OPTION_SETS = 8
+
+
+class _Pool:
+    """Passwords for one option set, as (buffer, start, end) slices"""
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.slots = deque()
+        self.failed = False
+
+    def fill(self, passwords):
+        """Copy freshly generated passwords into one new buffer"""
+        encoded = [password.encode('utf-8') for password in passwords]
+        buffer = bytearray(b''.join(encoded))
+        ends = list(accumulate(map(len, encoded)))
+        starts = [0] + ends[:-1]
+        self.slots.extend(zip([buffer] * len(encoded), starts, ends))
+
+    def pop(self):
+        """Hand out the oldest password and zero its bytes in the pool"""
+        buffer, start, end = self.slots.popleft()
+        password = buffer[start:end].decode('utf-8')
+        buffer[start:end] = bytes(end - start)
+        return password
+
+    def clear(self):
+        """Zero and drop every remaining password"""
+        while self.slots:
+            buffer, start, end = self.slots.popleft()
+            buffer[start:end] = bytes(end - start)
+
+
+class PasswordPool:
+    """Per-option-set password pools with background refill and LRU eviction"""
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, low_water=None,
+                 max_option_sets=DEFAULT_MAX_OPTION_SETS):
+        if size < 1 or max_option_sets < 1:
+            raise ValueError("Pool size and option sets must be at least 1")
+        self.size = size
+        self.low_water = size // 4 if low_water is None else low_water
+        if not 0 <= self.low_water < size:
+            raise ValueError("Low-water mark must be below the pool size")
+        self.max_option_sets = max_option_sets
+
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._refiller = threading.Thread(target=self._refill_loop, name='password-pool',
+                                          daemon=True)
+        self._refiller.start()
+
+    @staticmethod
+    def key(generator):
+        """Pool key for a generator: its class and option tuple"""
+        return type(generator).__name__, generator.options
+
+    def _pool_for(self, generator):
+        """Find or create the pool for a generator, marking it most recently used"""
+        key = self.key(generator)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _Pool(generator)
+            while len(self._pools) > self.max_option_sets:
+                _, evicted = self._pools.popitem(last=False)
+                evicted.clear()
+        else:
+            self._pools.move_to_end(key)
+        return pool
+
+    def take(self, generator, reject=None):
+        """Take one password for the generator's options"""
+        return self.take_batch(generator, 1, reject)[0]
+
+    def take_batch(self, generator, count, reject=None):
+        """Take `count` passwords, generating directly whatever the pool cannot supply"""
+        started = metrics.now() if metrics.enabled else 0.0
+        with self._lock:
+            if self._closed:
+                raise ValueError("Password pool is closed")
+            pool = self._pool_for(generator)
+            taken = [pool.pop() for _ in range(min(count, len(pool.slots)))]
+            if len(pool.slots) < self.low_water or not pool.slots:
+                self._wakeup.notify()
+
+        if len(taken) < count:
+            metrics.count('pool.misses', count - len(taken))
+        # The caller's check may be slow (index lookups, I/O), so it runs
+        # after the lock is released; rejected passwords are replaced below
+        if reject is not None:
+            taken = [password for password in taken if not reject(password)]
+        if len(taken) < count:
+            taken.extend(generator.generate_batch(count - len(taken), reject))
+        if started:
+            metrics.record('pool.take', started, count)
+        return taken
+
+    def warm(self, generator):
+        """Start filling the pool for a generator before it is first used"""
+        with self._lock:
+            self._pool_for(generator)
+            self._wakeup.notify()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(pool.slots) for pool in self._pools.values())
+
+    def _needs_refill(self):
+        return [pool for pool in self._pools.values()
+                if not pool.failed and len(pool.slots) <= self.low_water]
+
+    def _refill_loop(self):
+        """Top up pools below the low-water mark; generation runs without the lock"""
+        while True:
+            with self._lock:
+                while not self._closed and not self._needs_refill():
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                work = [(pool, self.size - len(pool.slots)) for pool in self._needs_refill()]
+
+            for pool, missing in work:
+                try:
+                    passwords = pool.generator.generate_batch(missing)
+                except Exception:
+                    # Leave it to take_batch(), which generates directly and
+                    # reports the error to the caller
+                    pool.failed = True
+                    continue
+                with self._lock:
+                    if self._closed:
+                        return
+                    if any(p is pool for p in self._pools.values()):
+                        pool.fill(passwords)
+
+    def close(self):
+        """Stop refilling and zero every pooled password"""
+        with self._lock:
+            self._closed = True
+            for pool in self._pools.values():
+                pool.clear()
+            self._pools.clear()
+            self._wakeup.notify_all()
+        self._refiller.join()
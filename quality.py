@@ -0,0 +1,364 @@
+"""Statistical checks that generated passwords are as random as designed
+
+A large sample is generated in batches and reduced to counting arrays as it
+streams past: per-position character counts (one array of 256 counters per
+position, filled with bytes.count over each column of the batch) and, for
+sources whose characters are independent, counts of adjacent character
+pairs. Nothing else is kept, so tens of millions of characters take no more
+memory than one batch.
+
+The checks compare the counts with what the source promises:
+
+* uniform -- characters that should be equally likely (the whole alphabet,
+  one policy class, the consonants of a pronounceable password) are, both
+  pooled over all positions and at each position;
+* classes -- lowercase/uppercase/digit/symbol frequencies are the same at
+  every position, and match the alphabet's make-up (or the 30%
+  capitalization rate of pronounceable passwords);
+* bigrams -- adjacent characters are independent, tested on characters
+  folded into BIGRAM_BUCKETS buckets so the table stays small.
+
+Each check is a chi-square test reported with its p-value. Entropy is
+estimated from the same counts.
+"""
+import math
+import string
+from array import array
+from collections import namedtuple
+
+from generator import (
+    CONSONANTS,
+    PRONOUNCEABLE_NUMBERS,
+    PRONOUNCEABLE_SYMBOLS,
+    VOWELS,
+    PasswordGenerator,
+)
+from policy import PasswordPolicy
+from strength import CAPITALIZE_PROBABILITY, generator_strength
+
+DEFAULT_SAMPLE_CHARS = 10000000
+# Characters generated and counted per batch
+BATCH_CHARS = 1 << 20
+# Adjacent pairs are counted on characters folded into this many buckets
+BIGRAM_BUCKETS = 16
+# Upper confidence bound used by the most-common-value min-entropy estimate
+# (NIST SP 800-90B)
+MCV_Z = 2.576
+# A test fails when its p-value is below this
+DEFAULT_ALPHA = 1e-5
+
+CLASS_NAMES = ('lowercase', 'uppercase', 'numbers', 'symbols')
+
+TestResult = namedtuple('TestResult', 'name statistic dof p_value')
+
+
+def _gamma_series(a, x):
+    """Regularized lower incomplete gamma P(a, x) by its series (x < a + 1)"""
+    term = total = 1.0 / a
+    n = a
+    for _ in range(100000):
+        n += 1
+        term *= x / n
+        total += term
+        if abs(term) < abs(total) * 1e-15:
+            break
+    return total * math.exp(-x + a * math.log(x) - math.lgamma(a))
+
+
+def _gamma_fraction(a, x):
+    """Regularized upper incomplete gamma Q(a, x) by continued fraction (x >= a + 1)"""
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 100000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return h * math.exp(-x + a * math.log(x) - math.lgamma(a))
+
+
+def chi2_sf(statistic, dof):
+    """Probability of a chi-square statistic at least this large under the null"""
+    if dof <= 0 or statistic <= 0:
+        return 1.0
+    a = dof / 2
+    x = statistic / 2
+    if x < a + 1:
+        return max(0.0, 1.0 - _gamma_series(a, x))
+    return _gamma_fraction(a, x)
+
+
+def chi2_goodness(observed, expected_shares):
+    """Chi-square statistic and degrees of freedom against expected proportions"""
+    total = sum(observed)
+    statistic = 0.0
+    cells = 0
+    for count, share in zip(observed, expected_shares):
+        expected = total * share
+        if expected > 0:
+            statistic += (count - expected) ** 2 / expected
+            cells += 1
+    return statistic, max(cells - 1, 0)
+
+
+def chi2_independence(table):
+    """Chi-square statistic and degrees of freedom for independence of a table's rows and columns"""
+    rows = [sum(row) for row in table]
+    columns = [sum(column) for column in zip(*table)]
+    total = sum(rows)
+    if not total:
+        return 0.0, 0
+    statistic = 0.0
+    for row, row_total in zip(table, rows):
+        for count, column_total in zip(row, columns):
+            expected = row_total * column_total / total
+            if expected > 0:
+                statistic += (count - expected) ** 2 / expected
+    used_rows = sum(1 for r in rows if r)
+    used_columns = sum(1 for c in columns if c)
+    return statistic, max(used_rows - 1, 0) * max(used_columns - 1, 0)
+
+
+def _test(name, statistic, dof):
+    return TestResult(name, statistic, dof, chi2_sf(statistic, dof))
+
+
+def _class_of(char):
+    if char in string.ascii_lowercase:
+        return 'lowercase'
+    if char in string.ascii_uppercase:
+        return 'uppercase'
+    if char in string.digits:
+        return 'numbers'
+    return 'symbols'
+
+
+class SampleCounts:
+    """Per-position character counts and adjacent-pair counts, accumulated batch by batch"""
+
+    def __init__(self, length, charset, bigrams=False):
+        self.length = length
+        self.charset = bytes(sorted(set(charset.encode('ascii'))))
+        self.positions = [array('Q', bytes(8 * 256)) for _ in range(length)]
+        self.passwords = 0
+        self.unexpected = 0
+
+        self.pairs = None
+        if bigrams and length > 1:
+            # Character -> bucket in the high or low nibble of a pair code
+            buckets = min(BIGRAM_BUCKETS, len(self.charset))
+            high = bytearray(256)
+            low = bytearray(256)
+            for index, code in enumerate(self.charset):
+                high[code] = (index % buckets) << 4
+                low[code] = index % buckets
+            self._pair_tables = bytes(high), bytes(low)
+            self.buckets = buckets
+            self.pairs = array('Q', bytes(8 * 256))
+
+    def add(self, batch):
+        """Count one batch of passwords"""
+        length = self.length
+        count = len(batch)
+        text = ''.join(batch)
+        if not text.isascii():
+            # NUL is never in a charset, so foreign characters count as unexpected
+            # ('replace' would turn them into '?', a valid symbol)
+            text = ''.join(c if c < '\x80' else '\0' for c in text)
+        flat = text.encode('ascii')
+        if len(flat) != count * length:
+            raise ValueError("Quality checks need passwords of one fixed length")
+
+        columns = [flat[p::length] for p in range(length)]
+        for column, counts in zip(columns, self.positions):
+            seen = 0
+            for code in self.charset:
+                found = column.count(code)
+                counts[code] += found
+                seen += found
+            self.unexpected += count - seen
+        self.passwords += count
+
+        if self.pairs is not None:
+            high, low = self._pair_tables
+            # Pair codes for each pair of neighbouring columns: OR the high and
+            # low nibbles as one big integer per column
+            codes = b''.join(
+                (int.from_bytes(first.translate(high), 'big')
+                 | int.from_bytes(second.translate(low), 'big')).to_bytes(count, 'big')
+                for first, second in zip(columns, columns[1:])
+            )
+            pairs = self.pairs
+            for code in range(self.buckets << 4):
+                if code & 0xF < self.buckets:
+                    pairs[code] += codes.count(code)
+
+    def pooled(self):
+        """Character counts over all positions"""
+        return [sum(counts[code] for counts in self.positions) for code in range(256)]
+
+
+class QualityReport:
+    """Results of the checks on one sample"""
+
+    def __init__(self, tests, entropy, characters):
+        self.tests = tests
+        self.entropy = entropy
+        self.characters = characters
+
+    def failures(self, alpha=DEFAULT_ALPHA):
+        """Tests whose p-value is below `alpha`"""
+        return [test for test in self.tests if test.p_value < alpha]
+
+
+def _groups(generator):
+    """Characters the generator should produce equally often, as named groups
+
+    Each member is a string of characters counted together (a letter in
+    both cases, where capitalization is a separate random choice).
+    """
+    if isinstance(generator, PasswordPolicy):
+        return {kind: list(chars) for kind, chars in generator.classes.items()}
+
+    if generator.pronounceable:
+        def fold(letters):
+            if generator.uppercase:
+                return [c + c.upper() for c in letters]
+            return list(letters)
+        groups = {'consonants': fold(CONSONANTS), 'vowels': fold(VOWELS)}
+        if generator.numbers and generator.length > 4:
+            groups['numbers'] = list(PRONOUNCEABLE_NUMBERS)
+        if generator.symbols and generator.length > 6:
+            groups['symbols'] = list(PRONOUNCEABLE_SYMBOLS)
+        return groups
+
+    return {'alphabet': list(generator.alphabet)}
+
+
+def _uniformity_tests(counts, groups):
+    tests = []
+    pooled = counts.pooled()
+    for name, members in groups.items():
+        if len(members) < 2:
+            continue
+        codes = [[ord(c) for c in member] for member in members]
+        shares = [1 / len(members)] * len(members)
+
+        observed = [sum(pooled[code] for code in member) for member in codes]
+        tests.append(_test(f'uniform.{name}', *chi2_goodness(observed, shares)))
+
+        # Summed over positions: a chi-square sum is chi-square with summed dof
+        statistic = 0.0
+        dof = 0
+        for position in counts.positions:
+            observed = [sum(position[code] for code in member) for member in codes]
+            s, d = chi2_goodness(observed, shares)
+            statistic += s
+            dof += d
+        tests.append(_test(f'uniform.{name}.positions', statistic, dof))
+    return tests
+
+
+def _class_tests(counts, generator):
+    charset = counts.charset.decode('ascii')
+    class_codes = {kind: [ord(c) for c in charset if _class_of(c) == kind] for kind in CLASS_NAMES}
+    class_codes = {kind: codes for kind, codes in class_codes.items() if codes}
+    table = [[sum(position[code] for code in codes) for codes in class_codes.values()]
+             for position in counts.positions]
+
+    tests = []
+    if len(class_codes) > 1 and counts.length > 1:
+        tests.append(_test('classes.positions', *chi2_independence(table)))
+
+    totals = [sum(column) for column in zip(*table)]
+    if isinstance(generator, PasswordPolicy):
+        # Class minimums shift the make-up on purpose; only the positions are checked
+        return tests
+    if not generator.pronounceable:
+        if len(class_codes) > 1:
+            shares = [len(codes) / len(charset) for codes in class_codes.values()]
+            tests.append(_test('classes.composition', *chi2_goodness(totals, shares)))
+    elif generator.uppercase:
+        kinds = list(class_codes)
+        letters = [totals[kinds.index('lowercase')], totals[kinds.index('uppercase')]]
+        shares = [1 - CAPITALIZE_PROBABILITY, CAPITALIZE_PROBABILITY]
+        tests.append(_test('classes.capitalization', *chi2_goodness(letters, shares)))
+    return tests
+
+
+def _bigram_test(counts):
+    buckets = counts.buckets
+    table = [[counts.pairs[high << 4 | low] for low in range(buckets)] for high in range(buckets)]
+    return _test('bigrams', *chi2_independence(table))
+
+
+def _entropy(counts, generator):
+    """Shannon and min-entropy estimates from the counts"""
+    def shannon(observed):
+        total = sum(observed)
+        if not total:
+            return 0.0
+        return -sum(c / total * math.log2(c / total) for c in observed if c)
+
+    def min_entropy(observed):
+        total = sum(observed)
+        if not total:
+            return 0.0
+        p = max(observed) / total
+        upper = min(1.0, p + MCV_Z * math.sqrt(p * (1 - p) / max(total - 1, 1)))
+        return -math.log2(upper)
+
+    per_position = [[position[code] for code in counts.charset] for position in counts.positions]
+    return {
+        'bits_per_char': shannon([counts.pooled()[code] for code in counts.charset]),
+        'password_bits': sum(map(shannon, per_position)),
+        'password_min_bits': sum(map(min_entropy, per_position)),
+        'expected_bits': generator_strength(generator).entropy_bits,
+    }
+
+
+def charset_of(generator):
+    """Every character the generator can produce"""
+    if isinstance(generator, PasswordGenerator) and generator.pronounceable:
+        groups = _groups(generator)
+        return ''.join(''.join(members) for members in groups.values())
+    return generator.alphabet
+
+
+def check_generator(generator, sample_chars=DEFAULT_SAMPLE_CHARS):
+    """Generate about `sample_chars` characters and run every check that applies
+
+    Supports PasswordGenerator and PasswordPolicy (fixed-length output).
+    Bigrams are only tested for sources whose characters are drawn
+    independently: policy minimums and pronounceable syllables make
+    neighbouring characters depend on each other by design. Policies with
+    no_sequences avoid some characters next to others, so their uniformity
+    checks will show that.
+    """
+    if not isinstance(generator, (PasswordGenerator, PasswordPolicy)):
+        raise ValueError("Quality checks support password generators and policies")
+    independent = isinstance(generator, PasswordGenerator) and not generator.pronounceable
+
+    length = generator.length
+    counts = SampleCounts(length, charset_of(generator), bigrams=independent)
+    count = max(1, -(-sample_chars // length))
+    for batch in generator.iter_batches(count, max(1, BATCH_CHARS // length)):
+        counts.add(batch)
+
+    tests = _uniformity_tests(counts, _groups(generator))
+    tests += _class_tests(counts, generator)
+    if counts.pairs is not None:
+        tests.append(_bigram_test(counts))
+    # Any character outside the charset is a failure in itself
+    tests.append(TestResult('charset', counts.unexpected, 0, 0.0 if counts.unexpected else 1.0))
+    return QualityReport(tests, _entropy(counts, generator), count * length)
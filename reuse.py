@@ -0,0 +1,189 @@
+"""Keyed-hash index of every saved password, for duplicate and reuse detection
+
+Only keyed BLAKE2b digests are stored, so the index can answer "was this
+password issued before?" without holding any plaintext. For very large
+histories a Bloom filter can stand in for the in-memory digest set; it never
+misses a reused password, at the price of rare false alarms.
+"""
+import hashlib
+import hmac
+import math
+import os
+
+from history import HistoryError, write_atomic
+
+SEEN_SUFFIX = '.seen'
+KEY_SUFFIX = '.key'
+
+DIGEST_SIZE = 16
+_MAGIC = b'PWSEEN1\n'
+_HEADER_SIZE = len(_MAGIC) + DIGEST_SIZE
+
+
+def reuse_key(history_path, cipher=None):
+    """Key for the reuse index of a history file
+
+    Encrypted histories derive it from the master key; otherwise a random
+    key is kept in a file next to the index.
+    """
+    if cipher is not None:
+        return cipher.derive_key(b'reuse-index')
+
+    path = history_path + SEEN_SUFFIX + KEY_SUFFIX
+    try:
+        with open(path, 'rb') as f:
+            key = f.read()
+        if len(key) == 32:
+            return key
+    except FileNotFoundError:
+        pass
+    key = os.urandom(32)
+    write_atomic(path, [key])
+    return key
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over digests"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError("Bloom filter needs a positive capacity and 0 < error_rate < 1")
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        """Bit positions for a digest (double hashing over its two halves)"""
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:16], 'little') | 1
+        return range(first, first + self.hashes * step, step)
+
+    def add(self, digest):
+        """Set a digest's bits; returns True if it was not (apparently) present"""
+        bits, size = self.bits, self.size
+        new = False
+        for position in self._positions(digest):
+            position %= size
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        return new
+
+    def __contains__(self, digest):
+        bits, size = self.bits, self.size
+        for position in self._positions(digest):
+            position %= size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class ReuseIndex:
+    """Append-only file of password digests with an in-memory lookup structure
+
+    `stale` is set when the file is new or was written with a different key
+    (e.g. the history has since been encrypted); the caller should then
+    rebuild() it from every saved password.
+    """
+
+    def __init__(self, path, key, bloom_capacity=None, error_rate=0.001, durable=False):
+        self.path = path
+        self.durable = durable
+        self._key = key
+        self._bloom = bool(bloom_capacity)
+        if self._bloom:
+            self._seen = BloomFilter(bloom_capacity, error_rate)
+        else:
+            self._seen = set()
+        self._pending = []
+        self.stale = False
+
+        try:
+            self._load()
+            self._file = open(path, 'ab')
+        except OSError as e:
+            raise HistoryError(f"Could not open reuse index {path}: {e}") from e
+
+    def _check_value(self):
+        return hashlib.blake2b(_MAGIC, key=self._key, digest_size=DIGEST_SIZE).digest()
+
+    def _load(self):
+        """Read stored digests, starting a fresh file if it is missing or stale"""
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = b''
+
+        header = raw[:_HEADER_SIZE]
+        expected = _MAGIC + self._check_value()
+        if not hmac.compare_digest(header, expected):
+            self.stale = True
+            write_atomic(self.path, [expected])
+            return
+
+        end = len(raw) - (len(raw) - _HEADER_SIZE) % DIGEST_SIZE
+        add = self._seen.add
+        for start in range(_HEADER_SIZE, end, DIGEST_SIZE):
+            add(raw[start:start + DIGEST_SIZE])
+
+    def digest(self, password):
+        """Keyed digest identifying a password"""
+        return hashlib.blake2b(password.encode('utf-8'), key=self._key,
+                               digest_size=DIGEST_SIZE).digest()
+
+    def __contains__(self, password):
+        return self.digest(password) in self._seen
+
+    def claim(self, password):
+        """Record a password in memory; returns False if it had been seen before
+
+        Claimed digests are written out by the next flush().
+        """
+        digest = self.digest(password)
+        if self._bloom:
+            if not self._seen.add(digest):
+                return False
+        elif digest in self._seen:
+            return False
+        else:
+            self._seen.add(digest)
+        self._pending.append(digest)
+        return True
+
+    def flush(self):
+        """Write digests claimed since the last flush with a single write"""
+        if not self._pending:
+            return
+        try:
+            self._file.write(b''.join(self._pending))
+            self._file.flush()
+            if self.durable:
+                os.fsync(self._file.fileno())
+        except OSError as e:
+            raise HistoryError(f"Could not write reuse index {self.path}: {e}") from e
+        self._pending = []
+
+    def add(self, password):
+        """Record a password; returns False if it had been seen before"""
+        new = self.claim(password)
+        self.flush()
+        return new
+
+    def add_many(self, passwords):
+        """Record several passwords with one write; returns how many were new"""
+        new = sum(map(self.claim, passwords))
+        self.flush()
+        return new
+
+    def rebuild(self, passwords):
+        """Re-add every saved password after the index was found stale"""
+        self.add_many(passwords)
+        self.stale = False
+
+    def close(self, flush=True):
+        """Close the file, first writing pending claims unless `flush` is false"""
+        if flush:
+            self.flush()
+        self._file.close()
@@ -0,0 +1,107 @@
+"""Zeroable memory for passwords that should not linger after use
+
+Python strings are immutable and their memory is freed without being
+cleared, so every str holding a password may survive in the process until
+the allocator happens to reuse it. Secure mode avoids creating them:
+passwords are generated as bytes straight into a SecretBuffer, a reusable
+anonymous memory map that is zeroed before it is reused or released (and,
+where the platform allows, left out of core dumps). Scratch bytearrays on
+the way are wiped as soon as they have been copied.
+
+Random bytes are read from the OS CSPRNG directly into those buffers where
+the platform offers a random device; elsewhere os.urandom() is used and
+its result is the one copy that cannot be wiped.
+"""
+import mmap
+import os
+from functools import lru_cache
+
+URANDOM_PATH = '/dev/urandom'
+
+# Set to 1 to start the GUI in secure mode
+SECURE_ENV = 'PASSWORD_SECURE_MODE'
+
+
+def secure_mode_enabled():
+    """Whether SECURE_ENV asks for secure mode"""
+    return os.environ.get(SECURE_ENV, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def wipe(buffer):
+    """Overwrite a bytearray, mmap or writable memoryview with zeros in place"""
+    view = memoryview(buffer).cast('B')
+    view[:] = bytes(len(view))
+
+
+@lru_cache(maxsize=None)
+def _random_device():
+    """Unbuffered handle on the random device, or None where there is none"""
+    try:
+        return open(URANDOM_PATH, 'rb', buffering=0)
+    except OSError:
+        return None
+
+
+def urandom_into(buffer):
+    """Fill a writable buffer from the OS CSPRNG, reading straight into it if possible"""
+    view = memoryview(buffer).cast('B')
+    device = _random_device()
+    if device is None:
+        view[:] = os.urandom(len(view))
+        return
+    filled = 0
+    while filled < len(view):
+        read = device.readinto(view[filled:])
+        if not read:
+            raise OSError(f"Short read from {URANDOM_PATH}")
+        filled += read
+
+
+class SecretBuffer:
+    """A reusable anonymous memory map, zeroed whenever it grows or is closed
+
+    reserve(size) hands out a memoryview of the first `size` bytes; it is
+    valid until the next reserve() or close(), and should be released
+    (or dropped) before then.
+    """
+
+    def __init__(self, size=0):
+        self._map = None
+        self.capacity = 0
+        if size:
+            self.reserve(size)
+
+    def reserve(self, size):
+        """Writable view of `size` bytes, replacing the map if it is too small"""
+        if size > self.capacity or self._map is None:
+            self.close()
+            capacity = -(-max(size, 1) // mmap.PAGESIZE) * mmap.PAGESIZE
+            self._map = mmap.mmap(-1, capacity)
+            if hasattr(mmap, 'MADV_DONTDUMP'):
+                self._map.madvise(mmap.MADV_DONTDUMP)
+            self.capacity = capacity
+        return memoryview(self._map)[:size]
+
+    def zero(self):
+        """Overwrite the whole map with zeros"""
+        if self._map is not None:
+            wipe(self._map)
+
+    def close(self):
+        """Zero and unmap the buffer"""
+        if self._map is None:
+            return
+        self.zero()
+        try:
+            self._map.close()
+        except BufferError:
+            # A view is still alive; the zeroed map goes when the view does
+            pass
+        self._map = None
+        self.capacity = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
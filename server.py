@@ -0,0 +1,505 @@
+"""Local JSON service for generation, strength scoring and history saves
+
+A small HTTP/1.1 server built on asyncio streams, listening on a localhost
+port or a Unix socket. Connections are kept alive and may pipeline
+requests: each request is handled as soon as it has been read, and the
+responses are written back in request order. Every endpoint also accepts a
+JSON array of request objects and answers with an array of results.
+
+Endpoints (all bodies are JSON):
+
+* ``POST /generate`` -- ``{"count": 5, "length": 20, "symbols": false}``,
+  ``{"policy": {...}}`` or ``{"passphrase": {"words": 6}}``;
+* ``POST /strength`` -- ``{"password": "..."}`` or ``{"passwords": [...]}``;
+* ``POST /history`` -- ``{"password": "...", "label": "..."}``;
+* ``GET /health``;
+* ``GET /metrics`` -- Prometheus text, while metrics are enabled.
+
+On a TCP port every endpoint but /health needs an ``Authorization: Bearer
+<token>`` header; the token is random per run and written to a file only
+the owner can read. Browsers cannot send that header cross-origin without
+a preflight the service never answers, so web pages cannot reach it
+either. A Unix socket is created readable and writable by its owner only
+and needs no token.
+
+Small generation requests are served from a PasswordPool on the event
+loop. Larger batches and bulk scoring run on a thread pool, and history
+writes queued while one is in progress are committed together with a
+single write on their own thread.
+"""
+import asyncio
+import hmac
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from http import HTTPStatus
+
+from generator import PasswordGenerator
+from history import HistoryError
+import metrics
+from passphrase import PassphraseGenerator
+from policy import PasswordPolicy, policy_for_options
+from pool import PasswordPool
+from strength import generator_strength, score_many, score_password
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Where `serve` writes the access token for TCP clients
+DEFAULT_TOKEN_PATH = 'password_service.token'
+
+# Request limits
+MAX_HEADER_SIZE = 16384
+MAX_BODY_SIZE = 1 << 20
+MAX_COUNT = 100000
+MAX_BATCH_ITEMS = 1000
+
+# Requests read ahead of their responses on one connection
+MAX_PIPELINE = 64
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 30
+
+# Generation requests up to this size are answered from the pool on the
+# event loop; larger ones go to the executor
+INLINE_COUNT = 16
+# Passwords scored on the event loop before handing off to the executor
+INLINE_SCORES = 64
+
+# Options accepted for plain (non-policy, non-passphrase) generation
+PASSWORD_OPTIONS = {
+    'length': int,
+    'lowercase': bool,
+    'uppercase': bool,
+    'numbers': bool,
+    'symbols': bool,
+    'exclude_ambiguous': bool,
+    'pronounceable': bool,
+}
+
+
+class RequestError(ValueError):
+    """Raised for a request the service rejects, with the HTTP status to answer"""
+
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """One parsed HTTP request"""
+
+    def __init__(self, method, path, headers, body, keep_alive):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+
+async def read_request(reader):
+    """Read the next request from a connection, or None once the client is done"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise RequestError("Incomplete request")
+        return None
+    except asyncio.LimitOverrunError:
+        raise RequestError("Request headers too large",
+                           HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise RequestError("Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+
+    if 'transfer-encoding' in headers:
+        raise RequestError("Chunked request bodies are not supported",
+                           HTTPStatus.NOT_IMPLEMENTED)
+    try:
+        size = int(headers.get('content-length', 0))
+    except ValueError:
+        raise RequestError("Invalid Content-Length")
+    if size > MAX_BODY_SIZE:
+        raise RequestError("Request body too large", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    try:
+        body = await reader.readexactly(size) if size else b''
+    except asyncio.IncompleteReadError:
+        raise RequestError("Incomplete request body")
+
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        keep_alive = connection != 'close'
+    else:
+        keep_alive = connection == 'keep-alive'
+    return Request(method, target.partition('?')[0], headers, body, keep_alive)
+
+
+def new_token():
+    """A random access token"""
+    return os.urandom(32).hex()
+
+
+def encode_response(status, payload, keep_alive=True, content_type='application/json'):
+    """Serialize a response; `payload` is JSON-encoded unless it is already text"""
+    if isinstance(payload, str):
+        body = payload.encode('utf-8')
+    else:
+        body = json.dumps(payload).encode('utf-8')
+    head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n')
+    if not keep_alive:
+        head += 'Connection: close\r\n'
+    return head.encode('latin-1') + b'\r\n' + body
+
+
+@lru_cache(maxsize=64)
+def build_generator(spec, wordlist=None):
+    """Compile the generator for a /generate request's options (canonical JSON)"""
+    spec = json.loads(spec)
+    try:
+        if 'policy' in spec:
+            if len(spec) > 1:
+                raise RequestError("'policy' cannot be combined with other options")
+            return PasswordPolicy.from_dict(spec['policy'])
+
+        if 'passphrase' in spec:
+            options = spec['passphrase']
+            if len(spec) > 1 or not isinstance(options, (dict, bool)):
+                raise RequestError("'passphrase' takes an object of passphrase options")
+            if not wordlist:
+                raise RequestError("The service has no wordlist configured")
+            return PassphraseGenerator(wordlist, **(options if options is not True else {}))
+
+        for name, value in spec.items():
+            kind = PASSWORD_OPTIONS.get(name)
+            if kind is None:
+                raise RequestError(f"Unknown option {name!r}")
+            if type(value) is not kind:
+                raise RequestError(f"Option {name!r} must be of type {kind.__name__}")
+        if spec.get('pronounceable'):
+            return PasswordGenerator(**spec)
+        spec.pop('pronounceable', None)
+        # Same composition as the GUI: at least one of every selected class
+        return policy_for_options(**spec)
+    except TypeError as e:
+        raise RequestError(f"Invalid options: {e}") from e
+
+
+@lru_cache(maxsize=64)
+def generator_summary(generator):
+    """Strength fields reported with every password from a (cached) generator"""
+    strength = generator_strength(generator)
+    return {'strength': strength.score, 'entropy_bits': round(strength.entropy_bits, 2)}
+
+
+def _count(item, name='count', default=1, limit=MAX_COUNT):
+    """Validate a count field"""
+    value = item.get(name, default)
+    if type(value) is not int or not 0 <= value <= limit:
+        raise RequestError(f"'{name}' must be an integer from 0 to {limit}")
+    return value
+
+
+class PasswordService:
+    """Request handlers and connection loop for the JSON service
+
+    The history store, reuse index and breach corpus are optional and owned
+    by the caller; close() only stops the service's own threads. With a
+    `token`, requests other than /health must present it as a bearer token.
+    """
+
+    def __init__(self, history_store=None, reuse_index=None, breach_corpus=None,
+                 wordlist=None, pool=None, threads=None, token=None):
+        self.history_store = history_store
+        self.reuse_index = reuse_index
+        self.breach_corpus = breach_corpus
+        self.wordlist = wordlist
+        self.pool = pool if pool is not None else PasswordPool()
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='password-service')
+        # History writes stay in order on a thread of their own
+        self.history_executor = ThreadPoolExecutor(1, thread_name_prefix='password-history')
+        self._pending_saves = []
+        self._saving = None
+        # Digests of passwords being saved; claimed in the index once written
+        self._saves_in_flight = set()
+        self._authorization = f'Bearer {token}'.encode('latin-1') if token else None
+        self.routes = {
+            '/generate': self.generate,
+            '/strength': self.strength,
+            '/history': self.save_history,
+        }
+
+    def is_rejected(self, password):
+        """Check whether a generated password was saved before or is breached"""
+        return ((self.reuse_index is not None and password in self.reuse_index)
+                or (self.breach_corpus is not None and password in self.breach_corpus))
+
+    def _result(self, result, breached=None):
+        """JSON form of a strength result"""
+        fields = {'score': result.score, 'entropy_bits': round(result.entropy_bits, 2),
+                  'length': result.length}
+        if breached is not None:
+            fields['breached'] = breached
+            if breached:
+                fields['score'] = 1
+        return fields
+
+    async def generate(self, item):
+        """Handle one /generate request object"""
+        count = _count(item)
+        spec = json.dumps({k: v for k, v in item.items() if k != 'count'}, sort_keys=True)
+        generator = build_generator(spec, self.wordlist)
+        if self.reuse_index is None and self.breach_corpus is None:
+            reject = None
+        else:
+            reject = self.is_rejected
+        if count <= INLINE_COUNT:
+            passwords = self.pool.take_batch(generator, count, reject)
+        else:
+            loop = asyncio.get_running_loop()
+            passwords = await loop.run_in_executor(self.executor, generator.generate_batch,
+                                                   count, reject)
+        return {'passwords': passwords, **generator_summary(generator)}
+
+    def _score(self, passwords):
+        breached = self.breach_corpus
+        return [self._result(result, password in breached if breached is not None else None)
+                for password, result in zip(passwords, score_many(passwords))]
+
+    async def strength(self, item):
+        """Handle one /strength request object"""
+        if 'password' in item:
+            password = item['password']
+            if not isinstance(password, str):
+                raise RequestError("'password' must be a string")
+            return self._score([password])[0]
+
+        passwords = item.get('passwords')
+        if not isinstance(passwords, list) or not all(isinstance(p, str) for p in passwords):
+            raise RequestError("Send 'password' or a list of strings as 'passwords'")
+        if len(passwords) > MAX_COUNT:
+            raise RequestError(f"At most {MAX_COUNT} passwords per request")
+        if len(passwords) <= INLINE_SCORES:
+            results = self._score(passwords)
+        else:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, self._score, passwords)
+        return {'results': results}
+
+    async def save_history(self, item):
+        """Handle one /history request object"""
+        if self.history_store is None:
+            raise RequestError("History is disabled", HTTPStatus.SERVICE_UNAVAILABLE)
+        password = item.get('password')
+        label = item.get('label')
+        if not isinstance(password, str) or not password:
+            raise RequestError("'password' must be a non-empty string")
+        if label is not None and not isinstance(label, str):
+            raise RequestError("'label' must be a string")
+
+        # A save in flight counts as issued, so concurrent saves of one
+        # password cannot both pass; the index itself only learns of it once written
+        digest = None
+        if self.reuse_index is not None:
+            digest = self.reuse_index.digest(password)
+            if digest in self._saves_in_flight or password in self.reuse_index:
+                return {'saved': False, 'reason': 'reused'}
+            self._saves_in_flight.add(digest)
+        entry = {
+            'password': password,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'length': len(password),
+            'strength': score_password(password).score
+        }
+        if label:
+            entry['label'] = label
+        try:
+            await self._commit(entry)
+        finally:
+            self._saves_in_flight.discard(digest)
+        return {'saved': True, 'timestamp': entry['timestamp'], 'strength': entry['strength']}
+
+    def _write_history(self, entries):
+        self.history_store.append_many(entries)
+        if self.reuse_index is not None:
+            self.reuse_index.add_many(entry['password'] for entry in entries)
+
+    async def _commit(self, entry):
+        """Queue an entry; entries queued during a write go out in the next one"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending_saves.append((entry, future))
+        if self._saving is None or self._saving.done():
+            self._saving = asyncio.ensure_future(self._write_pending())
+        await future
+
+    async def _write_pending(self):
+        loop = asyncio.get_running_loop()
+        while self._pending_saves:
+            pending, self._pending_saves = self._pending_saves, []
+            try:
+                await loop.run_in_executor(self.history_executor, self._write_history,
+                                           [entry for entry, _ in pending])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+            else:
+                for _, future in pending:
+                    future.set_result(None)
+
+    async def _answer(self, handler, item):
+        """Run a handler for one request object; returns (status, payload)"""
+        if not isinstance(item, dict):
+            return HTTPStatus.BAD_REQUEST, {'error': "Expected a JSON object"}
+        started = metrics.now() if metrics.enabled else 0.0
+        try:
+            return HTTPStatus.OK, await handler(item)
+        except RequestError as e:
+            return e.status, {'error': str(e)}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except HistoryError as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+        finally:
+            if started:
+                metrics.record('service.' + handler.__name__, started)
+
+    def authorized(self, request):
+        """Whether a request carries the service's token, if it has one"""
+        if self._authorization is None:
+            return True
+        given = request.headers.get('authorization', '').encode('latin-1')
+        return hmac.compare_digest(given, self._authorization)
+
+    async def respond(self, request):
+        """Handle a request; returns the encoded response"""
+        keep_alive = request.keep_alive
+        if request.path == '/health':
+            return encode_response(HTTPStatus.OK, {'status': 'ok'}, keep_alive)
+        if not self.authorized(request):
+            return encode_response(HTTPStatus.UNAUTHORIZED,
+                                   {'error': "Missing or wrong access token"}, keep_alive)
+        if request.path == '/metrics' and metrics.enabled:
+            return encode_response(HTTPStatus.OK, metrics.to_prometheus(), keep_alive,
+                                   'text/plain; version=0.0.4')
+        handler = self.routes.get(request.path)
+        if handler is None:
+            return encode_response(HTTPStatus.NOT_FOUND, {'error': "Not found"}, keep_alive)
+        if request.method != 'POST':
+            return encode_response(HTTPStatus.METHOD_NOT_ALLOWED, {'error': "Use POST"},
+                                   keep_alive)
+        try:
+            body = json.loads(request.body)
+        except ValueError:
+            return encode_response(HTTPStatus.BAD_REQUEST, {'error': "Invalid JSON"}, keep_alive)
+
+        try:
+            if isinstance(body, list):
+                # Batch: one result (or error object) per request object
+                if len(body) > MAX_BATCH_ITEMS:
+                    return encode_response(HTTPStatus.BAD_REQUEST,
+                                           {'error': f"At most {MAX_BATCH_ITEMS} requests per batch"},
+                                           keep_alive)
+                answers = await asyncio.gather(*(self._answer(handler, item) for item in body))
+                return encode_response(HTTPStatus.OK, [payload for _, payload in answers],
+                                       keep_alive)
+            status, payload = await self._answer(handler, body)
+            return encode_response(status, payload, keep_alive)
+        except Exception as e:
+            print(f"password service: {request.path}: {e!r}", file=sys.stderr)
+            return encode_response(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                   {'error': "Internal server error"}, keep_alive)
+
+    async def _send(self, responses, writer):
+        """Write responses in request order, flushing when the pipeline is drained"""
+        connected = True
+        while True:
+            queued = await responses.get()
+            if queued is None:
+                return
+            response, keep_alive = queued
+            data = await response
+            if not connected:
+                # Keep consuming so the reading side never blocks on a full queue
+                continue
+            try:
+                writer.write(data)
+                if responses.empty() or not keep_alive:
+                    await writer.drain()
+            except ConnectionError:
+                connected = False
+            if not keep_alive:
+                return
+
+    async def handle_connection(self, reader, writer):
+        """Serve one client connection until it closes or stops keeping alive"""
+        loop = asyncio.get_running_loop()
+        responses = asyncio.Queue(MAX_PIPELINE)
+        sender = asyncio.ensure_future(self._send(responses, writer))
+        idle = None
+        try:
+            while not sender.done():
+                # An idle client reads as end of input; pending responses still go out.
+                # A timer handle is much cheaper per request than wait_for().
+                idle = loop.call_later(KEEPALIVE_TIMEOUT, reader.feed_eof)
+                try:
+                    request = await read_request(reader)
+                except RequestError as e:
+                    error = loop.create_future()
+                    error.set_result(encode_response(e.status, {'error': str(e)}, False))
+                    await responses.put((error, False))
+                    break
+                except ConnectionError:
+                    break
+                finally:
+                    idle.cancel()
+                if request is None:
+                    break
+                await responses.put((asyncio.ensure_future(self.respond(request)),
+                                     request.keep_alive))
+                if not request.keep_alive:
+                    break
+            if not sender.done():
+                await responses.put(None)
+            await sender
+        finally:
+            if idle is not None:
+                idle.cancel()
+            sender.cancel()
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, ready=None):
+        """Listen on a Unix socket if `unix_path` is given, otherwise on host:port
+
+        `ready`, if given, is called with the listening server once it is bound.
+        """
+        if unix_path:
+            # Created owner-only from the start; the socket's mode is its access control
+            umask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(self.handle_connection, unix_path,
+                                                         limit=MAX_HEADER_SIZE)
+            finally:
+                os.umask(umask)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port,
+                                                limit=MAX_HEADER_SIZE)
+        async with server:
+            if ready is not None:
+                ready(server)
+            await server.serve_forever()
+
+    def close(self):
+        """Stop the pool and executors, letting queued history writes finish"""
+        self.pool.close()
+        self.executor.shutdown(cancel_futures=True)
+        self.history_executor.shutdown()
@@ -0,0 +1,230 @@
+"""Password strength scoring, usable without the GUI"""
+import math
+import string
+from collections import namedtuple
+from functools import lru_cache
+from itertools import islice
+
+from generator import (
+    DEFAULT_SYLLABLE_TEMPLATES,
+    PRONOUNCEABLE_NUMBERS,
+    PRONOUNCEABLE_SYMBOLS,
+    SYMBOLS,
+    build_alphabet,
+    build_syllable_tables,
+)
+import metrics
+
+StrengthResult = namedtuple('StrengthResult', [
+    'score',         # 1-5 rating shown by the strength bars, from entropy_bits
+    'length',
+    'lowercase',     # number of characters in each class
+    'uppercase',
+    'digits',
+    'symbols',
+    'other',
+    'entropy_bits',  # length * log2(size of the character pool in use)
+])
+
+# Strength of generated passwords, known from their options alone
+EntropyEstimate = namedtuple('EntropyEstimate', ['score', 'entropy_bits'])
+
+# Entropy (bits) needed for scores 2, 3, 4 and 5
+SCORE_THRESHOLDS = (28, 36, 60, 80)
+
+# Chance that a pronounceable letter is capitalized
+CAPITALIZE_PROBABILITY = 0.3
+
+# Every character of a class translates to one marker (a member of that
+# class), so a single translate classifies the whole password and count()
+# tallies each class. ASCII passwords use the much faster bytes table.
+_LOWER, _UPPER, _DIGIT, _SYMBOL = 'a', 'A', '0', '!'
+_CLASS_MAP = {
+    **dict.fromkeys(string.ascii_lowercase, _LOWER),
+    **dict.fromkeys(string.ascii_uppercase, _UPPER),
+    **dict.fromkeys(string.digits, _DIGIT),
+    **dict.fromkeys(SYMBOLS, _SYMBOL),
+}
+_CLASS_TABLE = str.maketrans(_CLASS_MAP)
+_BYTE_CLASS_TABLE = bytes(ord(_CLASS_MAP.get(chr(b), chr(b))) for b in range(128)) + bytes(range(128, 256))
+_MARKERS = frozenset(_LOWER + _UPPER + _DIGIT + _SYMBOL)
+_MARKER_BYTES = (_LOWER + _UPPER + _DIGIT + _SYMBOL).encode('ascii')
+_LOWER_BYTE, _UPPER_BYTE, _DIGIT_BYTE = ord(_LOWER), ord(_UPPER), ord(_DIGIT)
+
+_LOWER_SIZE = len(string.ascii_lowercase)
+_UPPER_SIZE = len(string.ascii_uppercase)
+_DIGIT_SIZE = len(string.digits)
+_SYMBOL_SIZE = len(SYMBOLS)
+
+# Passwords classified per translate call in score_many
+SCORE_CHUNK_SIZE = 4096
+
+# log2 of every pool size the four known classes can produce
+_LOG2 = [0.0, 0.0] + [math.log2(n) for n in range(2, 256)]
+
+
+def score_from_entropy(entropy_bits):
+    """Map an entropy estimate onto the 1-5 strength scale"""
+    return 1 + sum(entropy_bits >= threshold for threshold in SCORE_THRESHOLDS)
+
+
+def _binary_entropy(p):
+    """Entropy in bits of a yes/no choice taken with probability p"""
+    return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+
+@lru_cache(maxsize=None)
+def estimate_entropy(length, lowercase=True, uppercase=True, numbers=True,
+                     symbols=True, exclude_ambiguous=False, pronounceable=False,
+                     syllable_templates=DEFAULT_SYLLABLE_TEMPLATES):
+    """Estimate the entropy of passwords generated with a set of options (cached)
+
+    Random passwords get log2(alphabet size) bits per character. Pronounceable
+    ones are rated per syllable, plus the capitalization coin flips and the
+    digit/symbol substitutions, which is what the generator actually draws.
+    """
+    if not pronounceable:
+        alphabet = build_alphabet(lowercase, uppercase, numbers, symbols, exclude_ambiguous)
+        return length * math.log2(len(alphabet)) if len(alphabet) > 1 else 0.0
+
+    tables = build_syllable_tables(tuple(syllable_templates))
+    # Template chosen uniformly, then a syllable uniformly within its table
+    syllable_bits = math.log2(len(tables)) + sum(math.log2(len(t)) for t in tables) / len(tables)
+    syllable_chars = sum(len(t[0]) for t in tables) / len(tables)
+    char_bits = syllable_bits / syllable_chars
+    if uppercase:
+        char_bits += _binary_entropy(CAPITALIZE_PROBABILITY)
+
+    bits = length * char_bits
+    # Each substitution picks a position and a character but overwrites a letter
+    if numbers and length > 4:
+        bits += max(0.0, math.log2(len(PRONOUNCEABLE_NUMBERS) * length) - char_bits)
+    if symbols and length > 6:
+        bits += max(0.0, math.log2(len(PRONOUNCEABLE_SYMBOLS) * length) - char_bits)
+    return bits
+
+
+def generator_strength(generator):
+    """Strength shared by every password a generator produces
+
+    Generators other than PasswordGenerator (policies, passphrases) report
+    their own entropy_bits().
+    """
+    if hasattr(generator, 'entropy_bits'):
+        bits = generator.entropy_bits()
+        return EntropyEstimate(score_from_entropy(bits), bits)
+    bits = estimate_entropy(
+        generator.length, generator.lowercase, generator.uppercase,
+        generator.numbers, generator.symbols, generator.exclude_ambiguous,
+        generator.pronounceable, generator.syllable_templates
+    )
+    return EntropyEstimate(score_from_entropy(bits), bits)
+
+
+def _classify(password):
+    """Translate every character of a password to its class marker"""
+    if password.isascii():
+        return password.encode('ascii').translate(_BYTE_CLASS_TABLE).decode('ascii')
+    return password.translate(_CLASS_TABLE)
+
+
+def _score_classes(classes):
+    """Build a StrengthResult from an already classified password"""
+    length = len(classes)
+    lowercase = classes.count(_LOWER)
+    uppercase = classes.count(_UPPER)
+    digits = classes.count(_DIGIT)
+    symbols = classes.count(_SYMBOL)
+    other = length - lowercase - uppercase - digits - symbols
+
+    pool = ((lowercase and _LOWER_SIZE) + (uppercase and _UPPER_SIZE)
+            + (digits and _DIGIT_SIZE) + (symbols and _SYMBOL_SIZE))
+    if other:
+        # Characters outside the known classes count once per distinct value
+        pool += len(set(classes) - _MARKERS)
+    entropy_bits = length * (_LOG2[pool] if pool < 256 else math.log2(pool))
+
+    return StrengthResult(score_from_entropy(entropy_bits), length, lowercase,
+                          uppercase, digits, symbols, other, entropy_bits)
+
+
+def score_password(password):
+    """Classify a password's characters and rate its strength"""
+    started = metrics.now() if metrics.enabled else 0.0
+    result = _score_classes(_classify(password))
+    if started:
+        metrics.record('score', started)
+    return result
+
+
+def _rating(ratings, length, pool):
+    """Score and entropy for a length and pool size, memoized in ratings"""
+    key = (length, pool)
+    rating = ratings.get(key)
+    if rating is None:
+        entropy_bits = length * (_LOG2[pool] if pool < 256 else math.log2(pool))
+        rating = ratings[key] = (score_from_entropy(entropy_bits), entropy_bits)
+    return rating
+
+
+def _score_chunk(chunk, ratings):
+    """Score a chunk of passwords from one classification of their joined text
+
+    When the whole chunk is ASCII from the four known classes (checked once),
+    each password's counts come straight from the classified bytes without
+    slicing, symbols are whatever is left over, and the few distinct
+    (length, pool) pairs share one entropy and score computation.
+    """
+    text = ''.join(chunk)
+    if not text.isascii():
+        classes = text.translate(_CLASS_TABLE)
+        return _score_slices(chunk, classes)
+    classes = text.encode('ascii').translate(_BYTE_CLASS_TABLE)
+    if classes.translate(None, _MARKER_BYTES):
+        return _score_slices(chunk, classes.decode('ascii'))
+
+    results = []
+    end = 0
+    for password in chunk:
+        length = len(password)
+        start, end = end, end + length
+        lowercase = classes.count(_LOWER_BYTE, start, end)
+        uppercase = classes.count(_UPPER_BYTE, start, end)
+        digits = classes.count(_DIGIT_BYTE, start, end)
+        symbols = length - lowercase - uppercase - digits
+        pool = ((lowercase and _LOWER_SIZE) + (uppercase and _UPPER_SIZE)
+                + (digits and _DIGIT_SIZE) + (symbols and _SYMBOL_SIZE))
+        score, entropy_bits = _rating(ratings, length, pool)
+        results.append(StrengthResult(score, length, lowercase, uppercase, digits,
+                                      symbols, 0, entropy_bits))
+    return results
+
+
+def _score_slices(chunk, classes):
+    """Score each password's slice of already classified text"""
+    results = []
+    end = 0
+    for password in chunk:
+        start, end = end, end + len(password)
+        results.append(_score_classes(classes[start:end]))
+    return results
+
+
+def score_many(passwords, chunk_size=SCORE_CHUNK_SIZE):
+    """Score every password in an iterable (list or stream), yielding results
+
+    Passwords are classified a chunk at a time with one translate call and
+    tallied in place; see _score_chunk.
+    """
+    iterator = iter(passwords)
+    ratings = {}
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        # Scored a chunk at a time, so only scoring (not the consumer) is timed
+        started = metrics.now() if metrics.enabled else 0.0
+        results = _score_chunk(chunk, ratings)
+        if started:
+            metrics.record('score.many', started, len(chunk))
+        yield from results
@@ -0,0 +1,21 @@
+"""Shared fixtures; the modules under test live at the top of the repository"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vault  # noqa: E402  (needs the path above)
+
+
+@pytest.fixture
+def fast_scrypt(monkeypatch):
+    """Cheap scrypt parameters, so tests that create key files stay quick"""
+    monkeypatch.setattr(vault, 'SCRYPT_N', 2 ** 10)
+
+
+@pytest.fixture
+def cipher(tmp_path, fast_scrypt):
+    """A cipher with a freshly created key file"""
+    return vault.HistoryCipher.create('correct horse', str(tmp_path / 'history.ndjson.key'))
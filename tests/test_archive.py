@@ -0,0 +1,144 @@
+import io
+
+import pytest
+
+import archive
+from archive import ArchiveError, read_records, validate_records, write_records
+
+RECORDS = [
+    {'password': 'hunter2', 'timestamp': '2024-01-01 10:00:00', 'length': 7, 'strength': 1},
+    {'password': 'pässwörd, "quoted"', 'timestamp': '2024-01-02 11:30:00', 'length': 18,
+     'strength': 3, 'label': 'mail ✉'},
+    {'password': 'x' * 300, 'timestamp': '2024-01-03 12:00:00', 'length': 300, 'strength': 5,
+     'label': 'db'},
+]
+
+
+def export(records, fmt, batch_size=2):
+    stream = io.BytesIO()
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    assert write_records(batches, stream, fmt) == len(records)
+    return stream.getvalue()
+
+
+def reimport(data, fmt, batch_size=archive.BATCH_SIZE):
+    return [record for batch in read_records(io.BytesIO(data), fmt, batch_size)
+            for record in batch]
+
+
+def comparable(record):
+    """Fields every format keeps (binary drops the length, recomputed on import), as strings"""
+    return {key: str(value) for key, value in record.items() if key != 'length'}
+
+
+@pytest.mark.parametrize('fmt', archive.FORMATS)
+def test_round_trip(fmt):
+    records = reimport(export(RECORDS, fmt), fmt, batch_size=2)
+    assert [comparable(r) for r in records] == [comparable(r) for r in RECORDS]
+
+
+@pytest.mark.parametrize('fmt', archive.FORMATS)
+def test_round_trip_through_validation(fmt):
+    entries, errors = validate_records(reimport(export(RECORDS, fmt), fmt))
+    assert errors == []
+    assert [e['password'] for e in entries] == [r['password'] for r in RECORDS]
+    assert [e['length'] for e in entries] == [7, 18, 300]
+
+
+@pytest.mark.parametrize('fmt', archive.FORMATS)
+def test_empty_export(fmt):
+    assert reimport(export([], fmt), fmt) == []
+
+
+def test_binary_reads_across_buffer_boundaries(monkeypatch):
+    monkeypatch.setattr(archive, 'BUFFER_SIZE', 7)
+    records = reimport(export(RECORDS, 'binary'), 'binary', batch_size=1)
+    assert [r['password'] for r in records] == [r['password'] for r in RECORDS]
+
+
+def test_binary_truncated():
+    data = export(RECORDS, 'binary')
+    with pytest.raises(ArchiveError, match='truncated'):
+        reimport(data[:-1], 'binary')
+
+
+def test_binary_bad_magic():
+    with pytest.raises(ArchiveError, match='Not a binary'):
+        reimport(b'nope', 'binary')
+
+
+def test_csv_without_password_column():
+    with pytest.raises(ArchiveError, match="no 'password' column"):
+        reimport(b'timestamp,label\n2024-01-01 00:00:00,x\n', 'csv')
+
+
+def test_ndjson_bad_lines_become_none():
+    data = b'{"password": "a"}\nnot json\n\n{"password": "b"}\n'
+    assert reimport(data, 'ndjson') == [{'password': 'a'}, None, {'password': 'b'}]
+
+
+def test_validation_reports_bad_records():
+    records = [
+        None,
+        {'timestamp': '2024-01-01 00:00:00'},
+        {'password': 'a\nb'},
+        {'password': 'ok', 'timestamp': 'yesterday'},
+        {'password': 'ok', 'label': 'l' * 256},
+        {'password': 'fine', 'timestamp': '2024-01-01T08:00:00', 'strength': 5, 'length': 99},
+    ]
+    entries, errors = validate_records(records, first_number=10, label='imported',
+                                       timestamp='2024-02-02 00:00:00')
+    assert [number for number, _ in errors] == [10, 11, 12, 13, 14]
+    assert entries == [{'password': 'fine', 'timestamp': '2024-01-01 08:00:00',
+                        'label': 'imported', 'length': 4, 'strength': 1}]
+
+
+def test_validation_fills_defaults():
+    entries, _ = validate_records([{'password': 'abc'}], label='x',
+                                  timestamp='2024-02-02 00:00:00')
+    assert entries[0]['timestamp'] == '2024-02-02 00:00:00'
+    assert entries[0]['label'] == 'x'
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('out.CSV', 'csv'), ('a.jsonl', 'ndjson'), ('b.pwb', 'binary'), ('c.txt', None),
+])
+def test_format_for_path(path, expected):
+    assert archive.format_for_path(path) == expected
+
+
+def test_unknown_format():
+    with pytest.raises(ArchiveError):
+        write_records([], io.BytesIO(), 'xml')
+    with pytest.raises(ArchiveError):
+        read_records(io.BytesIO(), 'xml')
+
+
+@pytest.mark.parametrize('value', ['=1+1', '+SUM(A1)', '-2', '@cmd', '\tx', "'quoted", "''", 'plain'])
+def test_csv_cells_are_not_formulas(value):
+    record = {'password': value, 'timestamp': '2024-01-01 00:00:00', 'label': value}
+    data = export([record], 'csv')
+    row = data.decode('utf-8').splitlines()[1]
+    if value != 'plain':
+        assert row.startswith('"\'') or row.startswith("'")
+    assert reimport(data, 'csv') == [record]
+
+
+def test_binary_invalid_utf8_is_an_invalid_record():
+    data = bytearray(export(RECORDS[:2], 'binary'))
+    start = len(archive.MAGIC) + archive.HEADER.size
+    data[start] = 0xFF  # first byte of the first password
+    records = reimport(bytes(data), 'binary')
+    assert records[0] is None
+    assert records[1]['password'] == RECORDS[1]['password']
+    entries, errors = validate_records(records)
+    assert errors == [(1, 'malformed record (invalid JSON or UTF-8)')]
+    assert len(entries) == 1
+
+
+def test_password_only_csv():
+    stream = io.BytesIO()
+    batches = archive.password_records([['a', 'b'], ['c']])
+    assert write_records(batches, stream, 'csv', archive.PASSWORD_FIELDS) == 3
+    assert stream.getvalue() == b'password\na\nb\nc\n'
+    assert reimport(stream.getvalue(), 'csv') == [{'password': p} for p in 'abc']
@@ -0,0 +1,37 @@
+import pytest
+
+from breach import BreachCorpus, BreachCorpusError, build_binary_corpus, password_hash
+
+BREACHED = ['password', '123456', 'hunter2', 'letmein']
+
+
+@pytest.fixture
+def text_corpus(tmp_path):
+    path = tmp_path / 'pwned.txt'
+    digests = sorted(password_hash(p).hex().upper() for p in BREACHED)
+    path.write_text(''.join(f'{digest}:{n}\r\n' for n, digest in enumerate(digests, 1)))
+    return str(path)
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_lookup(tmp_path, text_corpus, binary):
+    path = text_corpus
+    if binary:
+        path = str(tmp_path / 'pwned.sha1bin')
+        assert build_binary_corpus(text_corpus, path) == len(BREACHED)
+    corpus = BreachCorpus(path)
+    try:
+        assert all(p in corpus for p in BREACHED)
+        assert 'correct horse battery staple' not in corpus
+    finally:
+        corpus.close()
+
+
+def test_failed_build_leaves_no_files(tmp_path):
+    source = tmp_path / 'unsorted.txt'
+    source.write_text('F' * 40 + ':1\n' + '0' * 40 + ':1\n')
+    with pytest.raises(BreachCorpusError):
+        build_binary_corpus(str(source), str(tmp_path / 'out.sha1bin'))
+    with pytest.raises(BreachCorpusError):
+        build_binary_corpus(str(tmp_path / 'missing.txt'), str(tmp_path / 'out.sha1bin'))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['unsorted.txt']
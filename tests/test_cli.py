@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import archive
+import bench
+import cli
+import pool
+import quality
+from breach import BINARY_SUFFIX
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported only by the commands that need them
+LAZY_MODULES = ('archive', 'bench', 'breach', 'pool', 'reuse', 'server', 'vault')
+
+
+def test_import_leaves_command_modules_unloaded():
+    code = ('import sys, cli; '
+            f'print(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPO,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
+
+
+def test_parser_constants_match_their_modules():
+    assert cli.ARCHIVE_FORMATS == archive.FORMATS
+    assert cli.BENCH_SUITES == tuple(bench.SUITES)
+
+
+def test_help_shows_defaults_of_lazy_modules():
+    parser = cli.build_parser()
+    actions = {action.dest: action for action in parser._subparsers._group_actions}
+    commands = actions['command'].choices
+
+    def help_text(command):
+        return ' '.join(commands[command].format_help().split())
+
+    assert BINARY_SUFFIX in help_text('breach-index')
+    assert f'(default: {pool.DEFAULT_POOL_SIZE})' in help_text('serve')
+    bench_help = help_text('bench')
+    assert f'(default: {bench.DEFAULT_THRESHOLD})' in bench_help
+    assert f'{quality.DEFAULT_SAMPLE_CHARS}, {bench.QUICK_QUALITY_CHARS} with' in bench_help
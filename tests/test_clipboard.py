@@ -0,0 +1,184 @@
+import sys
+import time
+
+import pytest
+
+import clipboard
+from clipboard import (
+    ClipboardError,
+    ClipboardManager,
+    CommandBackend,
+    MemoryBackend,
+    default_clear_seconds,
+    detect_backend,
+)
+
+
+class ManualClock:
+    """Scheduler for ClipboardManager that runs nothing until fire() is called"""
+
+    def __init__(self):
+        self.pending = []
+
+    def __call__(self, seconds, func):
+        self.pending.append((seconds, func))
+
+    def fire(self, index=0):
+        seconds, func = self.pending.pop(index)
+        func()
+        return seconds
+
+
+def settle(manager, condition, timeout=5.0):
+    """Dispatch the manager's callbacks until `condition()` holds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        manager.dispatch()
+        if time.monotonic() > deadline:
+            raise AssertionError("clipboard worker did not finish in time")
+        time.sleep(0.001)
+    manager.dispatch()
+
+
+class FailingBackend(MemoryBackend):
+    def copy(self, text):
+        raise ClipboardError("clipboard is gone")
+
+
+@pytest.fixture
+def clock():
+    return ManualClock()
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend()
+
+
+@pytest.fixture
+def manager(backend, clock):
+    manager = ClipboardManager(backend, clear_after=30, schedule=clock)
+    yield manager
+    manager.close(clear=False)
+
+
+def test_copy_runs_on_worker_and_reports_duration(manager, backend):
+    durations = []
+    job = manager.copy('hunter2', on_done=durations.append)
+    assert job is not None
+    settle(manager, lambda: durations)
+    assert backend.text == 'hunter2'
+    assert durations[0] >= 0
+    assert manager.holds_copy()
+
+
+def test_copy_is_cleared_after_delay(manager, backend, clock):
+    manager.copy('hunter2')
+    settle(manager, lambda: backend.copies == 1)
+    assert clock.fire() == 30
+    settle(manager, lambda: backend.text == '')
+    assert not manager.holds_copy()
+
+
+def test_clipboard_changed_by_user_is_not_cleared(manager, backend, clock):
+    manager.copy('hunter2')
+    settle(manager, lambda: backend.copies == 1)
+    backend.text = 'something the user copied'
+    clock.fire()
+    manager.close(clear=False)  # waits for the clear job
+    assert backend.text == 'something the user copied'
+    assert backend.copies == 1
+
+
+def test_newer_copy_restarts_countdown(manager, backend, clock):
+    manager.copy('first')
+    manager.copy('second')
+    settle(manager, lambda: backend.copies == 2)
+    clock.fire(0)  # the first copy's timer is stale
+    manager.close(clear=False)
+    assert backend.text == 'second'
+    assert backend.copies == 2
+
+
+def test_clear_after_zero_keeps_copies(backend, clock):
+    manager = ClipboardManager(backend, clear_after=0, schedule=clock)
+    manager.copy('hunter2')
+    manager.close()
+    assert backend.text == 'hunter2'
+    assert clock.pending == []
+
+
+def test_close_clears_pending_copy(manager, backend):
+    manager.copy('hunter2')
+    manager.close()
+    assert backend.text == ''
+
+
+def test_backend_error_reaches_on_error(clock):
+    manager = ClipboardManager(FailingBackend(), schedule=clock)
+    errors = []
+    manager.copy('hunter2', on_error=errors.append)
+    settle(manager, lambda: errors)
+    manager.close(clear=False)
+    assert isinstance(errors[0], ClipboardError)
+
+
+def test_thread_unsafe_backend_runs_on_caller(clock):
+    backend = MemoryBackend()
+    backend.thread_safe = False
+    manager = ClipboardManager(backend, schedule=clock)
+    durations = []
+    assert manager.copy('hunter2', on_done=durations.append) is None
+    assert backend.text == 'hunter2' and durations
+    clock.fire()
+    assert backend.text == ''
+    manager.close()
+
+
+def test_fallback_used_without_pyperclip_or_commands(monkeypatch, clock):
+    monkeypatch.setitem(sys.modules, 'pyperclip', None)
+    monkeypatch.setattr(clipboard.shutil, 'which', lambda name: None)
+    fallback = MemoryBackend()
+    assert detect_backend(fallback) is fallback
+
+    manager = ClipboardManager(fallback=fallback, schedule=clock)
+    manager.copy('hunter2')
+    manager.close(clear=False)
+    assert manager.backend is fallback
+    assert fallback.text == 'hunter2'
+
+
+def test_no_backend_at_all(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyperclip', None)
+    monkeypatch.setattr(clipboard.shutil, 'which', lambda name: None)
+    with pytest.raises(ClipboardError):
+        detect_backend()
+
+
+def test_command_backend_needs_its_display(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyperclip', None)
+    monkeypatch.setattr(clipboard.shutil, 'which',
+                        lambda name: '/usr/bin/' + name if name == 'xclip' else None)
+    monkeypatch.delenv('WAYLAND_DISPLAY', raising=False)
+    monkeypatch.setenv('DISPLAY', ':0')
+    backend = detect_backend(MemoryBackend())
+    assert isinstance(backend, CommandBackend) and backend.name == 'xclip'
+
+    monkeypatch.delenv('DISPLAY')
+    assert isinstance(detect_backend(MemoryBackend()), MemoryBackend)
+
+
+@pytest.mark.parametrize('value, expected', [(None, 30), ('', 30), ('0', 0), ('2.5', 2.5)])
+def test_default_clear_seconds(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv(clipboard.CLEAR_ENV, raising=False)
+    else:
+        monkeypatch.setenv(clipboard.CLEAR_ENV, value)
+    assert default_clear_seconds() == expected
+
+
+@pytest.mark.parametrize('value', ['soon', '-1'])
+def test_invalid_clear_seconds(monkeypatch, value):
+    monkeypatch.setenv(clipboard.CLEAR_ENV, value)
+    with pytest.raises(ClipboardError):
+        default_clear_seconds()
@@ -0,0 +1,63 @@
+import string
+
+import pytest
+
+from generator import AMBIGUOUS, SYMBOLS, PasswordGenerator
+from secure import SecretBuffer
+
+
+@pytest.mark.parametrize('options, alphabet', [
+    ({}, string.ascii_letters + string.digits + SYMBOLS),
+    ({'symbols': False}, string.ascii_letters + string.digits),
+    ({'uppercase': False, 'symbols': False, 'exclude_ambiguous': True},
+     ''.join(c for c in string.ascii_lowercase + string.digits if c not in AMBIGUOUS)),
+])
+def test_batch_uses_exactly_the_alphabet(options, alphabet):
+    passwords = PasswordGenerator(length=12, **options).generate_batch(3000)
+    assert len(passwords) == 3000
+    assert all(len(p) == 12 for p in passwords)
+    assert set(''.join(passwords)) == set(alphabet)
+
+
+def test_no_character_type():
+    with pytest.raises(ValueError):
+        PasswordGenerator(lowercase=False, uppercase=False, numbers=False, symbols=False)
+
+
+def test_reject_callback():
+    generator = PasswordGenerator(length=1, lowercase=False, uppercase=False, symbols=False)
+    passwords = generator.generate_batch(20, reject=lambda p: p != '7')
+    assert passwords == ['7'] * 20
+
+
+def test_pronounceable():
+    passwords = PasswordGenerator(length=10, pronounceable=True).generate_batch(200)
+    assert all(len(p) == 10 for p in passwords)
+
+
+@pytest.mark.parametrize('count', [0, 1, 1000])
+def test_lines_into_secret_buffer(count):
+    generator = PasswordGenerator(length=16, symbols=False)
+    with SecretBuffer() as secret:
+        lines = generator.generate_lines_into(secret, count)
+        data = bytes(lines)
+        lines.release()
+    passwords = data.decode('ascii').split('\n')
+    assert passwords[-1] == '' and len(passwords) == count + 1
+    assert all(len(p) == 16 and p.isalnum() for p in passwords[:-1])
+
+
+def test_secret_buffer_is_zeroed_on_reuse():
+    with SecretBuffer() as secret:
+        view = secret.reserve(16)
+        view[:] = b'x' * 16
+        view.release()
+        secret.zero()
+        view = secret.reserve(16)
+        assert bytes(view) == bytes(16)
+        view.release()
+
+
+def test_lines_into_rejects_pronounceable():
+    with SecretBuffer() as secret, pytest.raises(ValueError):
+        PasswordGenerator(pronounceable=True).generate_lines_into(secret, 1)
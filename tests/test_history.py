@@ -0,0 +1,305 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import history
+from history import LEGACY_HISTORY_PATH, HistoryError, HistoryStore
+from history_index import _RECORD, INDEX_SUFFIX
+
+
+def entry(number, **fields):
+    return dict({'password': f'password-{number}', 'timestamp': f'2024-01-01 00:00:{number:02d}',
+                 'length': 11, 'strength': 2}, **fields)
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def write_lines(path, records):
+    with open(path, 'w') as f:
+        f.writelines(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'history.ndjson')
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    path = tmp_path / LEGACY_HISTORY_PATH
+    path.write_text(json.dumps([entry(1), entry(2)]))
+    return path
+
+
+def test_open_leaves_legacy_file_untouched(path, legacy, cipher):
+    before = legacy.read_bytes()
+    for store_cipher in (None, cipher):
+        store = HistoryStore(path, cipher=store_cipher)
+        try:
+            assert store.legacy_path == str(legacy)
+            assert list(store) == [] and store.query() == [] and store.tail(5) == []
+        finally:
+            store.close()
+    assert legacy.read_bytes() == before
+
+
+@pytest.mark.parametrize('command', [['history', '--show-passwords', '-o', 'out.txt'],
+                                     ['export', 'out.csv']])
+def test_read_only_commands_leave_legacy_file_untouched(tmp_path, path, legacy, command,
+                                                        monkeypatch, capsys):
+    import cli
+    monkeypatch.chdir(tmp_path)
+    before = legacy.read_bytes()
+    assert cli.main(command + ['--history', path]) == 0
+    assert legacy.read_bytes() == before
+    assert '--migrate-legacy' in capsys.readouterr().err
+
+
+def test_migration_needs_a_cipher(path, legacy):
+    store = HistoryStore(path)
+    try:
+        with pytest.raises(HistoryError):
+            store.migrate_legacy()
+    finally:
+        store.close()
+    assert legacy.exists()
+
+
+def test_legacy_migration_then_shred(path, legacy, cipher):
+    store = HistoryStore(path, cipher=cipher)
+    try:
+        store.append(entry(3))
+        with pytest.raises(HistoryError):
+            store.shred_legacy()  # nothing migrated yet
+        assert store.migrate_legacy() == [entry(1), entry(2)]
+        assert store.migrate_legacy() == []  # already there
+        assert [e['password'] for e in store] == ['password-1', 'password-2', 'password-3']
+        assert legacy.exists()
+        assert store.shred_legacy() == str(legacy)
+        assert store.legacy_path is None
+    finally:
+        store.close()
+    assert not legacy.exists()
+    assert all('password' not in record for record in read_lines(path))
+
+
+def test_encrypted_round_trip(path, cipher):
+    store = HistoryStore(path, cipher=cipher)
+    try:
+        store.append_many([entry(1), entry(2, label='db')])
+        assert [e['password'] for e in store] == ['password-1', 'password-2']
+    finally:
+        store.close()
+    for record in read_lines(path):
+        assert 'password' not in record
+        assert record['secret'].startswith('v2.')
+
+
+def test_secret_moved_between_records_fails(path, cipher):
+    store = HistoryStore(path, cipher=cipher)
+    store.append_many([entry(1), entry(2)])
+    store.close()
+    records = read_lines(path)
+    records[0]['secret'], records[1]['secret'] = records[1]['secret'], records[0]['secret']
+    write_lines(path, records)
+    store = HistoryStore(path, cipher=cipher)
+    try:
+        with pytest.raises(HistoryError, match='authentication'):
+            list(store)
+    finally:
+        store.close()
+
+
+def test_changed_metadata_fails(path, cipher):
+    store = HistoryStore(path, cipher=cipher)
+    store.append(entry(1, label='db'))
+    store.close()
+    records = read_lines(path)
+    records[0]['label'] = 'mail'
+    write_lines(path, records)
+    store = HistoryStore(path, cipher=cipher)
+    try:
+        with pytest.raises(HistoryError):
+            list(store)
+    finally:
+        store.close()
+
+
+def test_legacy_secrets_are_upgraded_on_open(path, cipher):
+    def legacy_token(password):
+        data = password.encode('utf-8')
+        nonce = os.urandom(16)
+        stream = cipher._keystream(nonce, len(data))
+        sealed = nonce + (int.from_bytes(data, 'big') ^ stream).to_bytes(len(data), 'big')
+        return base64.urlsafe_b64encode(sealed + cipher._legacy_tag(sealed)).decode('ascii')
+
+    records = []
+    for number in range(3):
+        record = entry(number)
+        record['secret'] = legacy_token(record.pop('password'))
+        records.append(record)
+    write_lines(path, records)
+
+    store = HistoryStore(path, cipher=cipher)
+    try:
+        assert [e['password'] for e in store] == ['password-0', 'password-1', 'password-2']
+    finally:
+        store.close()
+    assert all(record['secret'].startswith('v2.') for record in read_lines(path))
+
+
+def test_append_count_and_order(path):
+    store = HistoryStore(path)
+    try:
+        store.append_many([entry(1), entry(2)])
+        store.append(entry(3))
+        assert len(store) == 3
+        assert [e['password'] for e in store] == ['password-1', 'password-2', 'password-3']
+        assert [e['password'] for e in store.iter_newest_first()] == [
+            'password-3', 'password-2', 'password-1']
+        assert [e['password'] for e in store.tail(2)] == ['password-2', 'password-3']
+    finally:
+        store.close()
+
+
+def test_torn_last_line_is_skipped_and_terminated(path):
+    with open(path, 'w') as f:
+        f.write(json.dumps(entry(1)) + '\n{"password": "torn')
+    store = HistoryStore(path)
+    try:
+        store.append(entry(2))
+        assert [e['password'] for e in store] == ['password-1', 'password-2']
+    finally:
+        store.close()
+
+
+@pytest.fixture
+def queried(path):
+    store = HistoryStore(path, retention=None)
+    store.append_many([
+        entry(1, length=8, strength=1),
+        entry(2, length=16, strength=4, label='db'),
+        entry(3, length=24, strength=5, label='mail'),
+        entry(4, length=16, strength=3, label='db'),
+    ])
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize('bounds, expected', [
+    ({}, [1, 2, 3, 4]),
+    ({'min_length': 16}, [2, 3, 4]),
+    ({'min_length': 16, 'max_length': 16}, [2, 4]),
+    ({'min_strength': 4}, [2, 3]),
+    ({'label': 'db'}, [2, 4]),
+    ({'label': 'db', 'min_strength': 4}, [2]),
+    ({'label': 'none'}, []),
+    ({'since': datetime(2024, 1, 1, 0, 0, 2), 'until': datetime(2024, 1, 1, 0, 0, 3)}, [2, 3]),
+])
+def test_query(queried, bounds, expected):
+    assert [e['password'] for e in queried.query(**bounds)] == [
+        f'password-{number}' for number in expected]
+
+
+def test_index_catches_up_with_unindexed_appends(path):
+    store = HistoryStore(path, retention=None)
+    store.append(entry(1, length=10))
+    assert len(store.query()) == 1  # loads and writes the index
+    store.close()
+
+    # Written without the index loaded, so the sidecar falls behind
+    store = HistoryStore(path, retention=None)
+    store.append_many([entry(2, length=20), entry(3, length=30)])
+    store.close()
+
+    store = HistoryStore(path, retention=None)
+    try:
+        assert [e['length'] for e in store.query(min_length=20)] == [20, 30]
+        store.append(entry(4, length=40))  # indexed incrementally now
+        assert [e['length'] for e in store.query(min_length=30)] == [30, 40]
+    finally:
+        store.close()
+    assert os.path.getsize(path + INDEX_SUFFIX) == 4 * _RECORD.size
+
+
+def test_index_rebuilt_when_history_was_rewritten(path):
+    store = HistoryStore(path, retention=None)
+    store.append_many([entry(1), entry(2), entry(3)])
+    store.query()
+    store.close()
+    write_lines(path, [entry(9, label='new')])
+
+    store = HistoryStore(path, retention=None)
+    try:
+        assert [e['password'] for e in store.query()] == ['password-9']
+    finally:
+        store.close()
+
+
+def test_query_without_index(path):
+    store = HistoryStore(path, indexed=False)
+    try:
+        with pytest.raises(HistoryError):
+            store.query()
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize('block_size', [7, 64, 1 << 16])
+def test_compact_keeps_newest_records(path, monkeypatch, block_size):
+    monkeypatch.setattr(history, 'READ_BLOCK_SIZE', block_size)
+    write_lines(path, [entry(n) for n in range(40)])
+    store = HistoryStore(path, retention=15, indexed=False)
+    store.compact()
+    store.append(entry(40))
+    assert len(store) == 16
+    store.close()
+    assert read_lines(path) == [entry(n) for n in range(25, 41)]
+
+
+def test_background_compaction_is_joined_on_close(path):
+    store = HistoryStore(path, retention=10, durable=False, indexed=False)
+    for number in range(120):
+        store.append(entry(number % 60))
+    store.close()
+    lines = read_lines(path)
+    assert 10 <= len(lines) < 120
+    assert lines[-1] == entry(119 % 60)
+    assert store.compaction_error is None
+
+
+def test_failed_background_compaction_is_reported(path, monkeypatch, capsys):
+    def failing_writer(path):
+        raise OSError("disk full")
+    monkeypatch.setattr(history, 'atomic_writer', failing_writer)
+    store = HistoryStore(path, retention=10, durable=False, indexed=False)
+    for number in range(111):
+        store.append(entry(number % 60))
+    store.close()
+    assert isinstance(store.compaction_error, HistoryError)
+    assert 'disk full' in capsys.readouterr().err
+    assert len(read_lines(path)) == 111
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, history.DEFAULT_RETENTION), ('', history.DEFAULT_RETENTION), ('500', 500), ('0', None),
+])
+def test_default_retention(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv(history.RETENTION_ENV, raising=False)
+    else:
+        monkeypatch.setenv(history.RETENTION_ENV, value)
+    assert history.default_retention() == expected
+
+
+@pytest.mark.parametrize('value', ['-1', 'lots'])
+def test_invalid_retention(monkeypatch, value):
+    monkeypatch.setenv(history.RETENTION_ENV, value)
+    with pytest.raises(HistoryError):
+        history.default_retention()
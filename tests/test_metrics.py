@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import metrics
+from metrics import BUCKETS, Histogram
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.disable()
+    metrics.reset()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_metrics_are_no_ops():
+    metrics.count('things', 5)
+    metrics.record('op', metrics.now(), 3)
+    with metrics.timer('block'):
+        pass
+    assert metrics.snapshot() == {'counters': {}, 'histograms': {}}
+
+
+def test_enabled_metrics_are_collected():
+    metrics.enable()
+    metrics.count('things', 5)
+    metrics.count('things')
+    metrics.record('op', metrics.now(), 3)
+    with metrics.timer('block', items=2):
+        pass
+    snap = metrics.snapshot()
+    assert snap['counters'] == {'things': 6, 'op': 3, 'block': 2}
+    assert {name: h['count'] for name, h in snap['histograms'].items()} == {'op': 1, 'block': 1}
+
+    metrics.disable()
+    metrics.count('things')
+    assert metrics.snapshot()['counters']['things'] == 6  # kept, but no longer counted
+
+
+def test_quantile_bucket_bounds():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) == 0.0
+    for _ in range(50):
+        histogram.observe(0.0000005)
+    for _ in range(49):
+        histogram.observe(0.003)
+    histogram.observe(20.0)
+    assert histogram.quantile(0.5) == 0.000001
+    assert histogram.quantile(0.51) == 0.005
+    assert histogram.quantile(0.99) == 0.005
+    assert histogram.quantile(1.0) == float('inf')
+
+
+def test_observation_on_a_bound_falls_in_that_bucket():
+    histogram = Histogram()
+    histogram.observe(0.001)
+    assert histogram.counts[BUCKETS.index(0.001)] == 1
+    assert histogram.quantile(0.5) == 0.001
+
+
+def test_prometheus_buckets_are_cumulative(monkeypatch):
+    # A frozen clock, so the sub-microsecond sample cannot drift past the first bound
+    monkeypatch.setattr(metrics, 'now', lambda: 100.0)
+    metrics.enable()
+    metrics.count('pool.misses', 4)
+    for seconds in (0.0000005, 0.003, 0.003, 20.0):
+        metrics.record('history.save', 100.0 - seconds)
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'password_generator_pool_misses_total 4' in lines
+    prefix = 'password_generator_history_save_seconds_bucket{le="'
+    buckets = [line[len(prefix):].split('"} ') for line in lines if line.startswith(prefix)]
+    assert [bound for bound, _ in buckets] == [str(b) for b in BUCKETS] + ['+Inf']
+    values = [int(value) for _, value in buckets]
+    assert values == sorted(values)
+    assert values[0] == 1 and values[-2] == 3 and values[-1] == 4
+    assert 'password_generator_history_save_seconds_count 4' in lines
+
+
+def test_json_writes_infinity_as_text():
+    metrics.enable()
+    metrics.record('slow', metrics.now() - 20.0)
+    histogram = json.loads(metrics.to_json())['histograms']['slow']
+    assert histogram['p50'] == histogram['p99'] == '+Inf'
+    assert histogram['bounds'][-1] == '+Inf'
+    assert len(histogram['bounds']) == len(histogram['buckets']) == len(BUCKETS) + 1
+
+
+@pytest.mark.parametrize('value, expected', [('1', True), ('on', True), ('', False),
+                                             ('0', False)])
+def test_requested(monkeypatch, value, expected):
+    monkeypatch.setenv(metrics.METRICS_ENV, value)
+    assert metrics.requested() is expected
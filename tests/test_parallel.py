@@ -0,0 +1,57 @@
+import pytest
+
+import parallel
+from parallel import auto_chunk_size, iter_parallel_batches, resolve_workers
+from policy import PasswordPolicy
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_exact_count_with_partial_last_chunk(workers, ordered):
+    batches = list(iter_parallel_batches({'length': 12}, 1003, workers=workers, chunk_size=100,
+                                         ordered=ordered))
+    assert sum(map(len, batches)) == 1003
+    assert sorted(map(len, batches)) == [3] + [100] * 10
+    assert all(len(p) == 12 for batch in batches for p in batch)
+
+
+def test_no_duplicates_across_workers():
+    # Workers sharing (forked) generator state would repeat each other's draws
+    passwords = [p for batch in iter_parallel_batches({'length': 16}, 40000, workers=4,
+                                                      chunk_size=1000)
+                 for p in batch]
+    assert len(passwords) == len(set(passwords)) == 40000
+
+
+def test_policy_factory():
+    settings = {'length': 20, 'min_numbers': 5, 'symbols': False}
+    batches = iter_parallel_batches(settings, 500, workers=2, chunk_size=64,
+                                    factory=PasswordPolicy)
+    passwords = [p for batch in batches for p in batch]
+    assert len(passwords) == 500
+    assert all(sum(c.isdigit() for c in p) >= 5 for p in passwords)
+
+
+@pytest.mark.parametrize('options, kwargs', [
+    ({'lowercase': False, 'uppercase': False, 'numbers': False, 'symbols': False}, {}),
+    ({'length': 12}, {'chunk_size': 0}),
+    ({'length': 12}, {'workers': -1}),
+])
+def test_invalid_options_fail_before_workers_start(monkeypatch, options, kwargs):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("worker pool started")
+    monkeypatch.setattr(parallel, 'ProcessPoolExecutor', no_pool)
+    with pytest.raises(ValueError):
+        iter_parallel_batches(options, 100, **dict({'workers': 2}, **kwargs))
+
+
+def test_resolve_workers(monkeypatch):
+    monkeypatch.setattr(parallel.os, 'cpu_count', lambda: 6)
+    assert resolve_workers(None) == resolve_workers(0) == 6
+    assert resolve_workers(3) == 3
+
+
+def test_auto_chunk_size_bounds():
+    assert auto_chunk_size(10, 16, 8) == 1
+    assert auto_chunk_size(10 ** 9, 16, 2) == parallel.TARGET_CHUNK_CHARS // 16
+    assert auto_chunk_size(10 ** 9, 1, 2) == parallel.MAX_CHUNK_SIZE
@@ -0,0 +1,107 @@
+import math
+import os
+
+import pytest
+
+from passphrase import (
+    MAX_WORDLIST_SIZE,
+    PassphraseGenerator,
+    WordList,
+    WordListError,
+    load_wordlist,
+    parse_wordlist,
+)
+
+WORDS = [f'word{n}' for n in range(1000)]
+
+
+@pytest.fixture
+def wordlist():
+    return WordList(WORDS)
+
+
+def test_parse_diceware_and_plain_lines():
+    lines = ['# comment\n', '\n', '11111\tabacus\n', '11112 abdomen\n', 'plain\n',
+             'two words\n', '  spaced  \n']
+    assert parse_wordlist(lines) == ['abacus', 'abdomen', 'plain', 'two words', 'spaced']
+
+
+def test_words_are_deduplicated():
+    assert WordList(['a', 'b', 'a', 'c', 'b']).words == ('a', 'b', 'c')
+
+
+@pytest.mark.parametrize('words', [[], ['only'], ['same', 'same']])
+def test_too_few_words(words):
+    with pytest.raises(WordListError, match='at least two'):
+        WordList(words)
+
+
+def test_size_cap():
+    limit = MAX_WORDLIST_SIZE // 2
+    assert limit == 32768
+    assert len(WordList(map(str, range(limit)))) == limit
+    with pytest.raises(WordListError, match='limited to 32768'):
+        WordList(map(str, range(limit + 1)))
+
+
+@pytest.mark.parametrize('capitalize, check', [
+    ('none', lambda word: word.islower()),
+    ('first', lambda word: word[0].isupper() and word[1:].islower()),
+])
+def test_capitalize(wordlist, capitalize, check):
+    passphrases = PassphraseGenerator(wordlist, words=4, capitalize=capitalize).generate_batch(200)
+    assert all(len(p.split('-')) == 4 for p in passphrases)
+    assert all(check(word) for p in passphrases for word in p.split('-'))
+
+
+def test_random_capitalization_uses_both_forms(wordlist):
+    words = [w for p in PassphraseGenerator(wordlist, capitalize='random').generate_batch(200)
+             for w in p.split('-')]
+    upper = sum(w[0].isupper() for w in words)
+    assert 0.4 < upper / len(words) < 0.6
+
+
+@pytest.mark.parametrize('digits', [0, 1, 3])
+def test_digits(digits):
+    letters = WordList(['alpha', 'bravo', 'charlie', 'delta'])
+    generator = PassphraseGenerator(letters, words=3, separator=' ', digits=digits)
+    for passphrase in generator.generate_batch(300):
+        assert sum(c.isdigit() for c in passphrase) == digits
+        assert len(passphrase.split(' ')) == 3
+
+
+@pytest.mark.parametrize('options', [{'words': 0}, {'capitalize': 'all'}, {'digits': -1}])
+def test_invalid_options(wordlist, options):
+    with pytest.raises(ValueError):
+        PassphraseGenerator(wordlist, **options)
+
+
+def test_entropy_bits(wordlist):
+    assert PassphraseGenerator(wordlist, words=6).entropy_bits() == pytest.approx(
+        6 * math.log2(1000))
+    assert PassphraseGenerator(wordlist, words=6, capitalize='random').entropy_bits() == \
+        pytest.approx(6 * (math.log2(1000) + 1))
+    assert PassphraseGenerator(wordlist, words=4, digits=2).entropy_bits() == pytest.approx(
+        4 * math.log2(1000) + 2 * (math.log2(10) + 2))
+    # Capitalizing digits changes nothing, so those entries add no entropy
+    assert PassphraseGenerator(WordList(['1', '2', 'a', 'b']), words=1,
+                               capitalize='random').entropy_bits() == pytest.approx(math.log2(6))
+
+
+def test_cache_reloads_after_the_file_changes(tmp_path):
+    path = tmp_path / 'words.txt'
+    path.write_text('alpha\nbravo\n')
+    first = load_wordlist(str(path))
+    assert load_wordlist(str(path)) is first
+
+    path.write_text('alpha\nbravo\ncharlie\n')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    second = load_wordlist(str(path))
+    assert second is not first
+    assert second.words == ('alpha', 'bravo', 'charlie')
+
+
+def test_missing_wordlist(tmp_path):
+    with pytest.raises(WordListError, match='Could not read'):
+        load_wordlist(str(tmp_path / 'missing.txt'))
@@ -0,0 +1,124 @@
+import json
+import string
+
+import pytest
+
+from generator import AMBIGUOUS, SYMBOLS
+from policy import PasswordPolicy, PolicyError, load_policy, policy_for_options
+
+COUNT = 2000
+
+
+def runs(password, size):
+    """Every run of `size` consecutive characters"""
+    return [password[i:i + size] for i in range(len(password) - size + 1)]
+
+
+def is_sequence(run):
+    return any(run in sequence or run[::-1] in sequence
+               for sequence in (string.ascii_lowercase, string.ascii_uppercase, string.digits))
+
+
+@pytest.mark.parametrize('settings', [
+    {'length': 12, 'min_lowercase': 2, 'min_uppercase': 2, 'min_numbers': 2, 'min_symbols': 2},
+    {'length': 8, 'min_numbers': 8, 'lowercase': False},
+    {'length': 20, 'symbols': '!#', 'min_symbols': 3, 'exclude_ambiguous': True},
+    {'length': 16, 'forbidden': 'aeiou', 'max_repeats': 1},
+    {'length': 32, 'no_sequences': True, 'sequence_length': 3, 'min_numbers': 4},
+    {'length': 6, 'uppercase': False, 'numbers': False, 'symbols': False,
+     'max_repeats': 2, 'no_sequences': True},
+])
+def test_generated_passwords_conform(settings):
+    policy = PasswordPolicy(**settings)
+    passwords = policy.generate_batch(COUNT)
+    assert len(passwords) == COUNT
+    symbols = settings.get('symbols', True)
+    symbols = symbols if isinstance(symbols, str) else SYMBOLS if symbols else ''
+    classes = {
+        'lowercase': string.ascii_lowercase if settings.get('lowercase', True) else '',
+        'uppercase': string.ascii_uppercase if settings.get('uppercase', True) else '',
+        'numbers': string.digits if settings.get('numbers', True) else '',
+        'symbols': symbols,
+    }
+    banned = set(settings.get('forbidden', ''))
+    if settings.get('exclude_ambiguous'):
+        banned |= set(AMBIGUOUS)
+    allowed = set(''.join(classes.values())) - banned
+
+    for password in passwords:
+        assert len(password) == settings['length']
+        assert set(password) <= allowed
+        for kind, chars in classes.items():
+            assert sum(c in chars for c in password) >= settings.get(f'min_{kind}', 0)
+        if settings.get('max_repeats'):
+            size = settings['max_repeats'] + 1
+            assert not any(len(set(run)) == 1 for run in runs(password, size))
+        if settings.get('no_sequences'):
+            assert not any(is_sequence(run) for run in runs(password, settings.get('sequence_length', 3)))
+
+
+def test_every_allowed_character_is_used():
+    policy = PasswordPolicy(length=16, symbols='!?', min_symbols=1)
+    seen = set(''.join(policy.generate_batch(COUNT)))
+    assert seen == set(string.ascii_letters + string.digits + '!?')
+
+
+def test_gui_options_require_each_selected_class():
+    policy = policy_for_options(length=4)
+    for password in policy.generate_batch(COUNT):
+        assert any(c.islower() for c in password)
+        assert any(c.isupper() for c in password)
+        assert any(c.isdigit() for c in password)
+        assert any(c in SYMBOLS for c in password)
+
+
+def test_gui_options_shorter_than_class_count():
+    assert len(policy_for_options(length=2).generate()) == 2
+
+
+@pytest.mark.parametrize('settings, message', [
+    ({'length': 0}, 'Length'),
+    ({'length': 4, 'min_numbers': 3, 'min_symbols': 2}, 'more than the length'),
+    ({'lowercase': False, 'uppercase': False, 'numbers': False, 'symbols': False}, 'at least one'),
+    ({'numbers': False, 'min_numbers': 1}, 'no numbers'),
+    ({'symbols': 'ab'}, 'punctuation'),
+    ({'lowercase': 'abc'}, 'custom character set'),
+    ({'max_repeats': 0}, 'max_repeats'),
+    ({'numbers': True, 'forbidden': string.digits, 'min_numbers': 1}, 'no numbers'),
+])
+def test_invalid_policies(settings, message):
+    with pytest.raises(PolicyError, match=message):
+        PasswordPolicy(**settings)
+
+
+def test_unknown_setting():
+    with pytest.raises(PolicyError, match='Invalid policy'):
+        PasswordPolicy.from_dict({'length': 8, 'colour': 'blue'})
+
+
+def test_load_named_policies(tmp_path):
+    path = tmp_path / 'policies.json'
+    path.write_text(json.dumps({'policies': {
+        'bank': {'length': 8, 'symbols': False, 'min_numbers': 2},
+        'wifi': {'length': 20},
+    }}))
+    bank = load_policy(str(path), 'bank')
+    assert bank.name == 'bank' and bank.length == 8
+    assert all(not set(p) & set(SYMBOLS) for p in bank.generate_batch(100))
+    with pytest.raises(PolicyError, match='several policies'):
+        load_policy(str(path))
+    with pytest.raises(PolicyError, match='No policy named'):
+        load_policy(str(path), 'mail')
+
+
+def test_load_single_policy(tmp_path):
+    path = tmp_path / 'policy.json'
+    path.write_text(json.dumps({'length': 10}))
+    assert load_policy(str(path)).length == 10
+
+
+def test_unreadable_policy_file(tmp_path):
+    path = tmp_path / 'policy.json'
+    path.write_text('{not json')
+    with pytest.raises(PolicyError, match='Could not read'):
+        load_policy(str(path))
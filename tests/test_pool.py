@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from policy import policy_for_options
+from pool import PasswordPool
+
+
+@pytest.fixture
+def pool():
+    pool = PasswordPool(16)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def generator():
+    return policy_for_options(length=12)
+
+
+def warmed(pool, generator):
+    pool.warm(generator)
+    deadline = time.monotonic() + 5
+    while len(pool) < pool.size:
+        assert time.monotonic() < deadline, "pool was never filled"
+        time.sleep(0.01)
+    return pool
+
+
+def test_take_batch_from_pool_and_generator(pool, generator):
+    passwords = warmed(pool, generator).take_batch(generator, 40)
+    assert len(passwords) == len(set(passwords)) == 40
+    assert all(len(password) == 12 for password in passwords)
+
+
+def test_reject_runs_without_the_lock(pool, generator):
+    checked = []
+
+    def reject(password):
+        # Would time out if this thread still held the (non-reentrant) lock
+        assert pool._lock.acquire(timeout=1)
+        pool._lock.release()
+        checked.append(password)
+        return len(checked) % 2 == 0
+
+    passwords = warmed(pool, generator).take_batch(generator, 10, reject)
+    assert len(passwords) == 10
+    assert set(passwords) <= set(checked[::2])
@@ -0,0 +1,106 @@
+import math
+import os
+
+import pytest
+
+import bench
+from generator import PasswordGenerator
+from quality import (
+    SampleCounts,
+    check_generator,
+    chi2_goodness,
+    chi2_independence,
+    chi2_sf,
+)
+
+
+@pytest.mark.parametrize('statistic', [0.01, 0.5, 1.0, 3.0, 7.5, 20.0, 60.0])
+@pytest.mark.parametrize('dof, closed_form', [
+    (1, lambda s: math.erfc(math.sqrt(s / 2))),
+    (2, lambda s: math.exp(-s / 2)),
+    (4, lambda s: math.exp(-s / 2) * (1 + s / 2)),
+])
+def test_chi2_sf_matches_closed_forms(statistic, dof, closed_form):
+    assert chi2_sf(statistic, dof) == pytest.approx(closed_form(statistic), rel=1e-9, abs=1e-300)
+
+
+@pytest.mark.parametrize('statistic, dof, p_value', [
+    (3.841458820694124, 1, 0.05),
+    (6.634896601021214, 1, 0.01),
+    (18.307038053275146, 10, 0.05),
+    (124.34211340400407, 100, 0.05),
+    (1.0, 100, 1.0),
+])
+def test_chi2_sf_table_values(statistic, dof, p_value):
+    assert chi2_sf(statistic, dof) == pytest.approx(p_value, rel=1e-6)
+
+
+def test_chi2_sf_degenerate():
+    assert chi2_sf(0.0, 5) == chi2_sf(5.0, 0) == 1.0
+
+
+def test_chi2_goodness():
+    assert chi2_goodness([10, 20, 30], [1 / 3] * 3) == (pytest.approx(10.0), 2)
+    # Cells expected to be empty are left out
+    assert chi2_goodness([5, 5, 0], [0.5, 0.5, 0.0]) == (0.0, 1)
+
+
+def test_chi2_independence():
+    assert chi2_independence([[10, 20], [20, 40]]) == (0.0, 1)
+    statistic, dof = chi2_independence([[30, 10], [10, 30]])
+    assert statistic == pytest.approx(20.0) and dof == 1
+    assert chi2_independence([[0, 0], [0, 0]]) == (0.0, 0)
+
+
+def test_sample_counts():
+    counts = SampleCounts(3, 'abc', bigrams=True)
+    counts.add(['abc', 'aab', 'cxa'])
+    assert counts.passwords == 3
+    assert counts.unexpected == 1
+    assert [counts.positions[0][ord(c)] for c in 'abc'] == [2, 0, 1]
+    assert [counts.pooled()[ord(c)] for c in 'abc'] == [4, 2, 2]
+    # Pairs (a,b), (b,c), (a,a), (a,b), (c,x), (x,a); 'x' is outside the
+    # charset (and flagged by the charset check), so it folds into bucket 0
+    assert counts.pairs[0 << 4 | 1] == 2
+    assert counts.pairs[1 << 4 | 2] == 1
+    assert counts.pairs[0 << 4 | 0] == 2
+    with pytest.raises(ValueError):
+        counts.add(['ab'])
+
+
+class ModuloBiasedGenerator(PasswordGenerator):
+    """Maps random bytes onto the alphabet with `%`, the bias rejection sampling avoids"""
+
+    def _generate_batch(self, count):
+        alphabet = self.alphabet
+        flat = ''.join(alphabet[b % len(alphabet)] for b in os.urandom(count * self.length))
+        return [flat[i:i + self.length] for i in range(0, len(flat), self.length)]
+
+
+def as_results(report):
+    return {f'quality.test.{test.name}': bench.Measurement(test.p_value, 'p', True)
+            for test in report.tests}
+
+
+def test_unbiased_generator_passes():
+    generator = PasswordGenerator(length=16)
+    report = check_generator(generator, 400000)
+    assert report.failures() == []
+    assert bench.quality_failures(as_results(report)) == []
+    assert report.entropy['bits_per_char'] == pytest.approx(math.log2(len(generator.alphabet)),
+                                                            abs=0.01)
+
+
+def test_modulo_bias_is_flagged():
+    report = check_generator(ModuloBiasedGenerator(length=16), 400000)
+    failed = {name for name, _ in bench.quality_failures(as_results(report))}
+    assert 'quality.test.uniform.alphabet' in failed
+    assert 'quality.test.uniform.alphabet.positions' in failed
+
+
+def test_foreign_characters_are_flagged():
+    class Leaky(PasswordGenerator):
+        def _generate_batch(self, count):
+            return [p[:-1] + 'é' for p in super()._generate_batch(count)]
+    report = check_generator(Leaky(length=8), 80000)
+    assert 'charset' in {test.name for test in report.failures()}
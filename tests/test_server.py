@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import stat
+
+import pytest
+
+from history import HistoryError, HistoryStore
+from pool import PasswordPool
+from reuse import ReuseIndex
+from server import MAX_BATCH_ITEMS, MAX_BODY_SIZE, PasswordService, Request, read_request
+
+TOKEN = 'test-token'
+AUTH = {'authorization': f'Bearer {TOKEN}'}
+
+
+def parse_response(data):
+    head, _, body = data.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    headers = dict(line.split(': ', 1) for line in lines[1:])
+    if headers['Content-Type'] == 'application/json':
+        body = json.loads(body)
+    return status, body
+
+
+def call(service, *requests):
+    """Answer (method, path, body, headers) requests in order on one event loop"""
+    async def answer():
+        responses = []
+        for method, path, body, headers in requests:
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode('utf-8')
+            request = Request(method, path, headers, body, True)
+            responses.append(parse_response(await service.respond(request)))
+        return responses
+    return asyncio.run(answer())
+
+
+def post(service, path, body, headers=AUTH):
+    return call(service, ('POST', path, body, headers))[0]
+
+
+@pytest.fixture
+def service():
+    service = PasswordService(pool=PasswordPool(8), token=TOKEN)
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def history_service(tmp_path):
+    path = str(tmp_path / 'history.ndjson')
+    store = HistoryStore(path)
+    index = ReuseIndex(path + '.seen', b'k' * 32)
+    service = PasswordService(store, index, pool=PasswordPool(8), token=TOKEN)
+    yield service
+    service.close()
+    index.close()
+    store.close()
+
+
+def test_health_needs_no_token(service):
+    assert call(service, ('GET', '/health', b'', {}))[0] == (200, {'status': 'ok'})
+
+
+@pytest.mark.parametrize('headers', [{}, {'authorization': 'Bearer wrong'},
+                                     {'authorization': TOKEN}])
+def test_token_required(service, headers):
+    status, body = post(service, '/generate', {}, headers)
+    assert status == 401 and 'token' in body['error']
+
+
+def test_no_token_configured():
+    service = PasswordService(pool=PasswordPool(8))
+    try:
+        assert post(service, '/generate', {}, {})[0] == 200
+    finally:
+        service.close()
+
+
+@pytest.mark.parametrize('count', [1, 50])
+def test_generate(service, count):
+    status, body = post(service, '/generate', {'count': count, 'length': 20, 'symbols': False})
+    assert status == 200
+    assert len(body['passwords']) == count
+    assert all(len(p) == 20 and p.isalnum() for p in body['passwords'])
+    assert body['strength'] == 5
+
+
+def test_generate_policy(service):
+    status, body = post(service, '/generate', {'count': 20, 'policy': {'length': 10,
+                                                                     'min_numbers': 4}})
+    assert status == 200
+    assert all(sum(c.isdigit() for c in p) >= 4 for p in body['passwords'])
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'colour': 'blue'}, 'Unknown option'),
+    ({'length': '12'}, 'must be of type int'),
+    ({'count': -1}, "'count'"),
+    ({'count': 10 ** 9}, "'count'"),
+    ({'policy': {'length': 4, 'min_numbers': 5}}, 'more than the length'),
+    ({'policy': {}, 'length': 4}, 'cannot be combined'),
+    ({'passphrase': True}, 'no wordlist'),
+    ([1], None),
+])
+def test_generate_bad_requests(service, body, message):
+    status, payload = post(service, '/generate', body)
+    if isinstance(payload, list):
+        status, payload = 400, payload[0]
+    assert status == 400
+    if message:
+        assert message in payload['error']
+
+
+def test_strength(service):
+    status, body = post(service, '/strength', {'password': 'abc'})
+    assert status == 200 and body['score'] == 1 and body['length'] == 3
+    status, body = post(service, '/strength', {'passwords': ['a', 'Tr0ub4dor&3xyz!!'] * 50})
+    assert status == 200 and len(body['results']) == 100
+    assert post(service, '/strength', {'passwords': 'abc'})[0] == 400
+
+
+def test_batch(service):
+    status, body = post(service, '/strength', [{'password': 'a'}, {'password': 5}])
+    assert status == 200
+    assert body[0]['score'] == 1 and 'error' in body[1]
+    status, body = post(service, '/strength', [{}] * (MAX_BATCH_ITEMS + 1))
+    assert status == 400
+
+
+def test_routing_errors(service):
+    assert post(service, '/nowhere', {})[0] == 404
+    assert call(service, ('GET', '/generate', b'', AUTH))[0][0] == 405
+    assert post(service, '/generate', b'{not json')[0] == 400
+
+
+def test_history_disabled(service):
+    assert post(service, '/history', {'password': 'abc'})[0] == 503
+
+
+def test_history_save_and_reuse(history_service):
+    (status, first), (_, second), (_, batch) = call(
+        history_service,
+        ('POST', '/history', {'password': 'Secret-123', 'label': 'db'}, AUTH),
+        ('POST', '/history', {'password': 'Secret-123'}, AUTH),
+        ('POST', '/history', [{'password': 'other'}, {'password': 'other'}], AUTH),
+    )
+    assert status == 200 and first['saved']
+    assert second == {'saved': False, 'reason': 'reused'}
+    assert [item['saved'] for item in batch] == [True, False]
+    saved = list(history_service.history_store)
+    assert [e['password'] for e in saved] == ['Secret-123', 'other']
+    assert saved[0]['label'] == 'db'
+
+
+@pytest.mark.parametrize('body', [{'password': ''}, {'password': 5},
+                                  {'password': 'x', 'label': 3}])
+def test_history_bad_requests(history_service, body):
+    assert post(history_service, '/history', body)[0] == 400
+
+
+def test_failed_save_is_not_recorded_as_reused(history_service, monkeypatch):
+    store = history_service.history_store
+
+    def broken(entries):
+        raise HistoryError("disk full")
+
+    monkeypatch.setattr(store, 'append_many', broken)
+    status, body = post(history_service, '/history', {'password': 'Secret-123'})
+    assert status == 500 and 'disk full' in body['error']
+    assert 'Secret-123' not in history_service.reuse_index
+
+    monkeypatch.undo()
+    status, body = post(history_service, '/history', {'password': 'Secret-123'})
+    assert status == 200 and body['saved']
+    assert 'Secret-123' in history_service.reuse_index
+
+
+def test_generate_skips_saved_passwords(history_service):
+    for digit in '012345678':
+        history_service.reuse_index.add(digit)
+    digits_only = {'length': 1, 'lowercase': False, 'uppercase': False, 'symbols': False}
+    status, body = post(history_service, '/generate', {'count': 5, 'policy': digits_only})
+    assert status == 200 and body['passwords'] == ['9'] * 5
+
+
+def read(data):
+    """Parse a raw request with read_request()"""
+    async def parse():
+        reader = asyncio.StreamReader(limit=16384)
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(parse())
+
+
+def test_read_request():
+    request = read(b'POST /generate?x=1 HTTP/1.1\r\nContent-Length: 2\r\n'
+                   b'Authorization: Bearer t\r\n\r\n{}')
+    assert (request.method, request.path, request.body) == ('POST', '/generate', b'{}')
+    assert request.headers['authorization'] == 'Bearer t' and request.keep_alive
+    assert not read(b'GET /health HTTP/1.0\r\n\r\n').keep_alive
+    assert read(b'') is None
+
+
+@pytest.mark.parametrize('data, status', [
+    (b'BROKEN\r\n\r\n', 400),
+    (b'POST / HTTP/1.1\r\nContent-Length: x\r\n\r\n', 400),
+    (b'POST / HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % (MAX_BODY_SIZE + 1), 413),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n', 501),
+    (b'POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\n{}', 400),
+    (b'GET / HTTP/1.1\r\nX: ' + b'a' * 20000 + b'\r\n\r\n', 431),
+    (b'GET / HTTP/1.1\r\nHost', 400),
+])
+def test_malformed_requests(data, status):
+    from server import RequestError
+    with pytest.raises(RequestError) as caught:
+        read(data)
+    assert caught.value.status == status
+
+
+def test_unix_socket_pipelining(tmp_path):
+    socket_path = str(tmp_path / 'service.sock')
+    service = PasswordService(pool=PasswordPool(8))
+
+    async def scenario():
+        listening = asyncio.get_running_loop().create_future()
+        server = asyncio.ensure_future(service.serve(unix_path=socket_path,
+                                                     ready=listening.set_result))
+        await listening
+        mode = stat.S_IMODE(os.stat(socket_path).st_mode)
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        body = b'{"count": 3}'
+        request = (b'POST /generate HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % len(body)) + body
+        writer.write(request * 3 + b'GET /health HTTP/1.1\r\nConnection: close\r\n\r\n')
+        data = await reader.read()
+        writer.close()
+        server.cancel()
+        return mode, data
+
+    try:
+        mode, data = asyncio.run(scenario())
+    finally:
+        service.close()
+    assert mode == 0o600
+    responses = data.split(b'HTTP/1.1 ')[1:]
+    assert len(responses) == 4
+    assert all(response.startswith(b'200 OK') for response in responses)
+    assert responses[-1].endswith(b'{"status": "ok"}')
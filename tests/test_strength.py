@@ -0,0 +1,19 @@
+import pytest
+
+from generator import PasswordGenerator
+from strength import score_many, score_password
+
+
+@pytest.mark.parametrize('passwords', [
+    PasswordGenerator(length=16).generate_batch(500),
+    PasswordGenerator(length=12, pronounceable=True).generate_batch(500),
+    ['', 'a', 'abc', 'ABCdef123', '!!!', 'pass word', 'päss→wörd', 'x' * 300, 'tab\there'],
+])
+def test_score_many_matches_score_password(passwords):
+    assert list(score_many(passwords, chunk_size=64)) == list(map(score_password, passwords))
+
+
+def test_score_many_streams_mixed_chunks():
+    # An ASCII chunk, then one with non-ASCII text, then one with unknown ASCII
+    passwords = ['Abc123!?'] * 3 + ['naïve'] + ['a b c', 'Zz9']
+    assert list(score_many(iter(passwords), chunk_size=3)) == list(map(score_password, passwords))
@@ -0,0 +1,121 @@
+import base64
+import json
+
+import pytest
+
+from vault import (
+    TOKEN_PREFIX,
+    HistoryCipher,
+    VaultError,
+    _check_value,
+    _derive_keys,
+)
+
+ENCRYPTION_KEY = bytes(range(32))
+MAC_KEY = bytes(range(32, 64))
+# encrypt('correct horse', b'{"label":"db"}') with the keys above and nonce bytes 100..115
+KNOWN_TOKEN = 'v2.ZGVmZ2hpamtsbW5vcHFyczCi0sZX6n-8JeH7ysIcLXNsWpoqt3PSzTna7Fc0'
+
+
+def flip(token, position):
+    """The token with one bit of its decoded bytes flipped"""
+    raw = bytearray(base64.urlsafe_b64decode(token[len(TOKEN_PREFIX):]))
+    raw[position] ^= 1
+    return TOKEN_PREFIX + base64.urlsafe_b64encode(bytes(raw)).decode('ascii')
+
+
+def test_scrypt_known_answer():
+    # RFC 7914, section 12: scrypt("password", "NaCl", N=1024, r=8, p=16, dkLen=64)
+    encryption_key, mac_key = _derive_keys('password', b'NaCl', 1024, 8, 16)
+    assert (encryption_key + mac_key).hex() == (
+        'fdbabe1c9d3472007856e7190d01e9fe7c6ad7cbc8237830e77376634b373162'
+        '2eaf30d92e22a3886ff109279d9830dac727afb94a83ee6d8360cbdfa2cc0640')
+
+
+def test_known_token_decrypts():
+    cipher = HistoryCipher(ENCRYPTION_KEY, MAC_KEY)
+    assert cipher.decrypt(KNOWN_TOKEN, b'{"label":"db"}') == 'correct horse'
+
+
+def test_known_token_is_reproduced(monkeypatch):
+    monkeypatch.setattr('vault.os.urandom', lambda n: bytes(range(100, 100 + n)))
+    cipher = HistoryCipher(ENCRYPTION_KEY, MAC_KEY)
+    assert cipher.encrypt('correct horse', b'{"label":"db"}') == KNOWN_TOKEN
+
+
+@pytest.mark.parametrize('plaintext', ['', 'a', 'pässwörd 🔑', 'x' * 5000])
+def test_round_trip(cipher, plaintext):
+    token = cipher.encrypt(plaintext, b'metadata')
+    assert token.startswith(TOKEN_PREFIX)
+    assert cipher.decrypt(token, b'metadata') == plaintext
+
+
+def test_nonces_differ(cipher):
+    assert cipher.encrypt('same') != cipher.encrypt('same')
+
+
+@pytest.mark.parametrize('position', [0, 15, 16, -1])
+def test_tampered_token_is_rejected(cipher, position):
+    token = cipher.encrypt('hunter2', b'ad')
+    with pytest.raises(VaultError, match='authentication'):
+        cipher.decrypt(flip(token, position), b'ad')
+
+
+def test_other_associated_data_is_rejected(cipher):
+    token = cipher.encrypt('hunter2', b'{"label":"db"}')
+    with pytest.raises(VaultError, match='authentication'):
+        cipher.decrypt(token, b'{"label":"mail"}')
+
+
+@pytest.mark.parametrize('token', ['v2.', 'v2.!!!', 'v2.' + 'A' * 8])
+def test_malformed_token_is_rejected(cipher, token):
+    with pytest.raises(VaultError):
+        cipher.decrypt(token)
+
+
+def test_legacy_token_needs_permission():
+    cipher = HistoryCipher(ENCRYPTION_KEY, MAC_KEY)
+    sealed = bytes(16) + b'\x00'
+    legacy = base64.urlsafe_b64encode(sealed + cipher._legacy_tag(sealed)).decode('ascii')
+    assert HistoryCipher.is_legacy(legacy)
+    with pytest.raises(VaultError, match='old format'):
+        cipher.decrypt(legacy)
+    assert len(cipher.decrypt(legacy, allow_legacy=True)) == 1
+
+
+def test_unlock_with_right_passphrase(tmp_path, fast_scrypt):
+    path = str(tmp_path / 'key')
+    created = HistoryCipher.create('correct horse', path)
+    unlocked = HistoryCipher.unlock('correct horse', path)
+    assert unlocked.decrypt(created.encrypt('secret', b'x'), b'x') == 'secret'
+
+
+def test_unlock_with_wrong_passphrase(tmp_path, fast_scrypt):
+    path = str(tmp_path / 'key')
+    HistoryCipher.create('correct horse', path)
+    with pytest.raises(VaultError, match='Wrong passphrase'):
+        HistoryCipher.unlock('battery staple', path)
+
+
+def test_unlock_with_damaged_key_file(tmp_path, fast_scrypt):
+    path = tmp_path / 'key'
+    HistoryCipher.create('correct horse', str(path))
+    params = json.loads(path.read_text())
+    del params['salt']
+    path.write_text(json.dumps(params))
+    with pytest.raises(VaultError, match='Could not read key file'):
+        HistoryCipher.unlock('correct horse', str(path))
+
+
+def test_key_check_value_depends_on_key():
+    assert _check_value(b'a' * 32) != _check_value(b'b' * 32)
+
+
+def test_unset_passphrase_variable_is_reported(tmp_path, cipher, monkeypatch):
+    import cli
+    monkeypatch.delenv('HISTORY_PASSPHRASE', raising=False)
+    history = str(tmp_path / 'history.ndjson')
+    with pytest.raises(VaultError, match='HISTORY_PASSPHRASE is not set'):
+        cli.unlock_cipher(history, 'HISTORY_PASSPHRASE')
+    monkeypatch.setenv('HISTORY_PASSPHRASE', 'correct horse')
+    assert cli.unlock_cipher(history, 'HISTORY_PASSPHRASE') is not None
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+import worker
+from worker import PROGRESS_INTERVAL, BackgroundWorker
+
+
+@pytest.fixture
+def background():
+    background = BackgroundWorker()
+    yield background
+    background.close(timeout=5)
+
+
+def poll(background, until, timeout=5):
+    """Dispatch the way the GUI's root.after loop does, until `until()` holds"""
+    deadline = time.monotonic() + timeout
+    while not until():
+        assert time.monotonic() < deadline, "callbacks never arrived"
+        background.dispatch()
+        time.sleep(0.001)
+
+
+def test_results_arrive_in_order_only_through_dispatch(background):
+    done = []
+    finished = threading.Event()
+    for number in range(5):
+        background.submit(lambda job, number=number: number * number, on_done=done.append)
+    background.submit(lambda job: finished.set())
+    assert finished.wait(5)
+    assert done == []  # nothing runs on the worker thread's side
+    poll(background, lambda: len(done) == 5)
+    assert done == [0, 1, 4, 9, 16]
+
+
+def test_errors_go_to_on_error(background):
+    errors = []
+    background.submit(lambda job: 1 / 0, on_done=pytest.fail, on_error=errors.append)
+    poll(background, lambda: errors)
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
+def test_unhandled_errors_surface_in_dispatch(background):
+    background.submit(lambda job: {}['missing'])
+    with pytest.raises(KeyError):
+        poll(background, lambda: False)
+
+
+def test_cancelled_queued_job_never_runs(background):
+    release = threading.Event()
+    ran = []
+    background.submit(lambda job: release.wait(5))
+    queued = background.submit(lambda job: ran.append('queued'), on_done=ran.append)
+    queued.cancel()
+    release.set()
+    finished = []
+    background.submit(lambda job: 'after', on_done=finished.append)
+    poll(background, lambda: finished)
+    assert ran == []
+
+
+def test_running_job_sees_cancel(background):
+    started = threading.Event()
+    results = []
+
+    def task(job):
+        started.set()
+        deadline = time.monotonic() + 5
+        while not job.cancelled and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return job.cancelled
+
+    job = background.submit(task, on_done=results.append)
+    assert started.wait(5)
+    job.cancel()
+    poll(background, lambda: results)
+    assert results == [True]
+
+
+def test_progress_is_throttled_but_completion_always_reported(background, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(worker.time, 'monotonic', lambda: clock[0])
+    progress = []
+    done = []
+
+    def task(job):
+        for step in range(1, 101):
+            job.progress(step, 100)
+            if step == 50:
+                clock[0] += 2 * PROGRESS_INTERVAL  # the interval passes mid-run
+        return 'ok'
+
+    background.submit(task, on_done=done.append,
+                      on_progress=lambda step, total: progress.append(step))
+    deadline = time.perf_counter() + 5
+    while not done:
+        assert time.perf_counter() < deadline
+        background.dispatch()
+    assert progress == [1, 51, 100]
+
+
+def test_close_finishes_queued_jobs():
+    background = BackgroundWorker()
+    done = []
+    for number in range(3):
+        background.submit(lambda job, number=number: time.sleep(0.01) or number,
+                          on_done=done.append)
+    background.close(timeout=5)
+    background.dispatch()
+    assert done == [0, 1, 2]
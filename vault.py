@@ -0,0 +1,161 @@
+"""Passphrase-based encryption for history records (standard library only)
+
+The master passphrase is stretched once with scrypt; the derived keys then
+stay in memory for the session, so encrypting a record costs microseconds.
+Each record is encrypted with a SHAKE-256 keystream under a random nonce
+and authenticated with keyed BLAKE2b (encrypt-then-MAC). The tag also
+covers associated data: the history passes the record's other fields, so
+a secret cannot be moved to another record, nor its timestamp, length,
+strength or label changed, without failing authentication.
+
+Tokens are 'v2.' followed by URL-safe base64 of nonce, ciphertext and tag.
+Tokens from before associated data was bound (plain base64, tag over nonce
+and ciphertext only) are read only when explicitly allowed, so that an old
+history can be upgraded; see HistoryStore.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import struct
+
+from history import write_atomic
+
+KEY_FILE_SUFFIX = '.key'
+
+# scrypt cost parameters for new key files (~32 MiB, tens of milliseconds)
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+NONCE_SIZE = 16
+TAG_SIZE = 16
+TOKEN_PREFIX = 'v2.'
+# Personalizes the record MAC, separating it from the key check and subkeys
+_TAG_PERSON = b'record-v2'
+_CHECK_MESSAGE = b'password-history-key-check'
+
+
+class VaultError(ValueError):
+    """Raised for a wrong passphrase, a damaged key file or a tampered record"""
+
+
+def key_path(history_path):
+    """Location of the key file that belongs to a history file"""
+    return history_path + KEY_FILE_SUFFIX
+
+
+def _derive_keys(passphrase, salt, n, r, p):
+    """Stretch the passphrase into an encryption key and a MAC key"""
+    key = hashlib.scrypt(passphrase.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                         maxmem=256 * n * r + (1 << 20), dklen=64)
+    return key[:32], key[32:]
+
+
+def _check_value(mac_key):
+    """Value stored in the key file to recognise the right passphrase"""
+    return hashlib.blake2b(_CHECK_MESSAGE, key=mac_key, digest_size=TAG_SIZE).hexdigest()
+
+
+class HistoryCipher:
+    """Encrypts and decrypts individual history secrets with cached keys"""
+
+    def __init__(self, encryption_key, mac_key):
+        self._encryption_key = encryption_key
+        self._mac_key = mac_key
+
+    @classmethod
+    def create(cls, passphrase, path):
+        """Derive keys for a new passphrase and write the key file at `path`"""
+        salt = os.urandom(16)
+        encryption_key, mac_key = _derive_keys(passphrase, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        params = {
+            'version': 1,
+            'kdf': 'scrypt',
+            'salt': base64.b64encode(salt).decode('ascii'),
+            'n': SCRYPT_N,
+            'r': SCRYPT_R,
+            'p': SCRYPT_P,
+            'check': _check_value(mac_key),
+        }
+        write_atomic(path, [json.dumps(params).encode('utf-8')])
+        return cls(encryption_key, mac_key)
+
+    @classmethod
+    def unlock(cls, passphrase, path):
+        """Derive keys from the passphrase using the parameters in the key file"""
+        try:
+            with open(path, 'r') as f:
+                params = json.load(f)
+            salt = base64.b64decode(params['salt'])
+            n, r, p, check = params['n'], params['r'], params['p'], params['check']
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise VaultError(f"Could not read key file {path}: {e}") from e
+
+        encryption_key, mac_key = _derive_keys(passphrase, salt, n, r, p)
+        if not hmac.compare_digest(_check_value(mac_key), check):
+            raise VaultError("Wrong passphrase")
+        return cls(encryption_key, mac_key)
+
+    def derive_key(self, purpose):
+        """Derive a separate 32-byte key for another use (e.g. hashing indexes)"""
+        return hashlib.blake2b(purpose, key=self._mac_key, person=b'subkey').digest()[:32]
+
+    def _keystream(self, nonce, size):
+        """Keystream bytes for one record, as an integer"""
+        stream = hashlib.shake_256(self._encryption_key + nonce).digest(size)
+        return int.from_bytes(stream, 'big')
+
+    def _tag(self, sealed, associated_data):
+        """Authentication tag over associated data (length-prefixed), nonce and ciphertext"""
+        mac = hashlib.blake2b(key=self._mac_key, digest_size=TAG_SIZE, person=_TAG_PERSON)
+        mac.update(struct.pack('<Q', len(associated_data)))
+        mac.update(associated_data)
+        mac.update(sealed)
+        return mac.digest()
+
+    def _legacy_tag(self, sealed):
+        """Tag of tokens written before associated data was bound"""
+        return hashlib.blake2b(sealed, key=self._mac_key, digest_size=TAG_SIZE).digest()
+
+    def encrypt(self, plaintext, associated_data=b''):
+        """Encrypt a string into a token bound to `associated_data` (bytes)"""
+        data = plaintext.encode('utf-8')
+        nonce = os.urandom(NONCE_SIZE)
+        size = len(data)
+        ciphertext = (int.from_bytes(data, 'big') ^ self._keystream(nonce, size)).to_bytes(size, 'big')
+        sealed = nonce + ciphertext
+        tag = self._tag(sealed, associated_data)
+        return TOKEN_PREFIX + base64.urlsafe_b64encode(sealed + tag).decode('ascii')
+
+    @staticmethod
+    def is_legacy(token):
+        """Whether a token predates associated data"""
+        return not token.startswith(TOKEN_PREFIX)
+
+    def decrypt(self, token, associated_data=b'', allow_legacy=False):
+        """Decrypt a token produced by encrypt() with the same associated data, verifying it first
+
+        Legacy tokens, which cannot carry associated data, are rejected
+        unless `allow_legacy`.
+        """
+        legacy = self.is_legacy(token)
+        if legacy and not allow_legacy:
+            raise VaultError("Encrypted record uses the old format without associated data")
+        try:
+            raw = base64.urlsafe_b64decode(token if legacy else token[len(TOKEN_PREFIX):])
+        except ValueError as e:
+            raise VaultError("Malformed encrypted record") from e
+        if len(raw) < NONCE_SIZE + TAG_SIZE:
+            raise VaultError("Malformed encrypted record")
+
+        sealed, tag = raw[:-TAG_SIZE], raw[-TAG_SIZE:]
+        expected = self._legacy_tag(sealed) if legacy else self._tag(sealed, associated_data)
+        if not hmac.compare_digest(expected, tag):
+            raise VaultError("Encrypted record failed authentication")
+
+        nonce, ciphertext = sealed[:NONCE_SIZE], sealed[NONCE_SIZE:]
+        size = len(ciphertext)
+        data = (int.from_bytes(ciphertext, 'big') ^ self._keystream(nonce, size)).to_bytes(size, 'big')
+        return data.decode('utf-8')
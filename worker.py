@@ -0,0 +1,93 @@
+"""Background job runner that keeps slow work off the GUI thread
+
+Jobs run one at a time, in submission order, on a single daemon thread.
+Their results, errors and progress reports are queued rather than
+delivered directly; the owner drains the queue with dispatch() from its
+own thread (the GUI polls it with root.after), so callbacks never touch
+Tk from the worker thread.
+"""
+import queue
+import threading
+import time
+
+# Progress reports from one job are coalesced to at most one per interval
+PROGRESS_INTERVAL = 0.05
+
+
+def _reraise(error):
+    """Default error callback: surface the exception in the dispatching thread"""
+    raise error
+
+
+class Job:
+    """A unit of work; the task receives its Job to report progress and check cancel"""
+
+    def __init__(self, task, on_done=None, on_error=None, on_progress=None, results=None):
+        self.task = task
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancelled = False
+        self._results = results
+        self._last_progress = 0.0
+
+    def cancel(self):
+        """Ask the task to stop; it notices at its next check of `cancelled`"""
+        self.cancelled = True
+
+    def progress(self, done, total):
+        """Report progress from inside the task (throttled)"""
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if done < total and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self._results.put((self.on_progress, (done, total)))
+
+
+class BackgroundWorker:
+    """A single worker thread fed through a job queue"""
+
+    def __init__(self, name='background-worker'):
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, task, on_done=None, on_error=None, on_progress=None):
+        """Queue `task(job)`; its callbacks run later from dispatch()"""
+        job = Job(task, on_done, on_error, on_progress, self._results)
+        self._jobs.put(job)
+        return job
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            if job.cancelled:
+                continue
+            try:
+                result = job.task(job)
+            except Exception as e:
+                self._results.put((job.on_error or _reraise, (e,)))
+            else:
+                self._results.put((job.on_done, (result,)))
+
+    def dispatch(self):
+        """Run the callbacks for everything finished so far; returns how many ran"""
+        count = 0
+        while True:
+            try:
+                callback, args = self._results.get_nowait()
+            except queue.Empty:
+                return count
+            if callback is not None:
+                callback(*args)
+                count += 1
+
+    def close(self, timeout=None):
+        """Let queued jobs finish, then stop the thread"""
+        self._jobs.put(None)
+        self._thread.join(timeout)